@@ -4,6 +4,8 @@ IMG_LOGO_ALAIN = "logo_alain.png"
 from modules import data, ui, views, auth, views_tenders, views_finance, views_lean, views_compliance, views_quality, project_manager as projects
 
 # Initialize DB
+data.begin_run() # Identical reads in this rerun share one fetch
+data.start_change_feed() # Invalidates cached reads when any table changes elsewhere
 data.init_db()
 auth.init_admin_if_none()
 
@@ -0,0 +1,96 @@
+"""
+Benchmark: data.get_dashboard_alerts (windowed, vectorized) vs the previous full-table loop.
+
+Seeds a throwaway local database with --docs compliance documents (expiration dates spread
+over two years, so only a small share is inside the alert window), subcontractors, projects
+and purchase orders, then times both versions uncached and reports rows transferred.
+Run with: python bench_alerts.py --docs 50000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+# Importing the data layer opens a backend, use a throwaway local one
+_tmp = tempfile.mkdtemp(prefix="bench_alerts_")
+os.environ.setdefault("NOVENAPP_BACKEND", "sqlite")
+os.environ.setdefault("NOVENAPP_DB_PATH", os.path.join(_tmp, "bench.db"))
+os.environ.setdefault("NOVENAPP_MIRROR", "0")
+from modules import data, metrics
+
+
+def seed(docs, projects=200, subs=2000, orders=20000):
+    rng = random.Random(1)
+    today = date.today()
+    data.bulk_insert("projects", [{"name": f"P{i}", "budget_total": 1e6, "status": "Activo"} for i in range(projects)])
+    data.bulk_insert("subcontractors", [{"name": f"Sub {i}", "rut": f"{i}-k", "status": "Activo"} for i in range(subs)])
+    data.bulk_insert("compliance_documents", [{
+        "subcontractor_id": rng.randint(1, subs), "document_type": rng.choice(["F30", "F30-1", "Seguro"]),
+        "status": "Vigente", "expiration_date": (today + timedelta(days=rng.randint(-30, 700))).isoformat()
+    } for _ in range(docs)])
+    data.bulk_insert("purchase_orders", [{
+        "project_id": rng.randint(1, projects), "provider_name": "X", "date": today.isoformat(),
+        "total_amount": rng.uniform(0, 12e4), "status": rng.choice(["Pendiente", "Aprobada", "Pagada", "Rechazada"])
+    } for _ in range(orders)])
+
+
+def legacy_alerts():
+    """The previous implementation (budget block was a no-op loop over projects)."""
+    alerts = []
+    pending = data.supabase.table("purchase_orders").select("id, order_number, provider_name, total_amount").eq("status", "Pendiente").execute()
+    for po in pending.data:
+        identifier = po.get('order_number') or po['id']
+        alerts.append({"scope": "Finanzas", "message": f"OC #{identifier} pendiente de aprobación",
+                       "detail": f"Proveedor: {po['provider_name']} - ${po['total_amount']:,.0f}", "severity": "warning"})
+    docs = data.supabase.table("compliance_documents").select("document_type, expiration_date, subcontractor:subcontractors(name)").execute()
+    today = datetime.now().date()
+    for doc in docs.data:
+        if doc['expiration_date']:
+            exp_date = datetime.strptime(doc['expiration_date'], '%Y-%m-%d').date()
+            days_left = (exp_date - today).days
+            sub_name = doc['subcontractor']['name'] if doc.get('subcontractor') else "Desconocido"
+            if days_left < 0:
+                alerts.append({"scope": "Subcontratos", "message": f"Documento Vencido: {sub_name}",
+                               "detail": f"{doc['document_type']} venció el {exp_date}", "severity": "error"})
+            elif days_left <= 7:
+                alerts.append({"scope": "Subcontratos", "message": f"Por Vencer: {sub_name}",
+                               "detail": f"{doc['document_type']} vence en {days_left} días", "severity": "warning"})
+    for _ in data.get_projects().iterrows():
+        pass
+    return alerts
+
+
+def run(fn, repeat):
+    best, rows = float("inf"), 0
+    for _ in range(repeat):
+        data.invalidate_cache()
+        metrics.reset()
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+        rows = int(metrics.events("query")["rows"].fillna(0).sum())
+    return best, rows, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    seed(args.docs)
+
+    t_old, rows_old, old = run(legacy_alerts, args.repeat)
+    t_new, rows_new, new = run(data.get_dashboard_alerts, args.repeat)
+    doc_alerts = lambda alerts: sum(a["scope"] == "Subcontratos" for a in alerts)
+    print(f"{args.docs:,} documentos, mejor de {args.repeat} (sin caché)")
+    print("-" * 70)
+    print(f"anterior   {t_old * 1000:>8.1f} ms   {rows_old:>7,} filas leídas   {len(old):>5} alertas")
+    print(f"ventana    {t_new * 1000:>8.1f} ms   {rows_new:>7,} filas leídas   {len(new):>5} alertas   x{t_old / t_new:.1f}")
+    print(f"alertas de documentos iguales: {doc_alerts(old) == doc_alerts(new)} · "
+          f"sobrecostos detectados: {sum(a['scope'] == 'Presupuesto' for a in new)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Benchmark: data.delete_project (set-based / RPC) vs the previous nested-loop cascade.
+
+Seeds a throwaway project with tenders, contracts, guarantees and operational rows,
+deletes it with each strategy and reports wall time and number of HTTP requests.
+WARNING: writes to the configured database. Run with: python bench_delete_project.py --yes
+"""
+import argparse
+import time
+from datetime import date
+from modules import data
+
+
+class CountingClient:
+    """Wraps the data layer client and counts every executed request."""
+
+    def __init__(self, client):
+        self._client = client
+        self.requests = 0
+
+    def table(self, name):
+        return _CountingBuilder(self, self._client.table(name))
+
+    def rpc(self, fn, params=None):
+        return _CountingBuilder(self, self._client.rpc(fn, params or {}))
+
+
+class _CountingBuilder:
+    def __init__(self, counter, builder):
+        self._counter = counter
+        self._builder = builder
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if name == "execute":
+            def execute(*args, **kwargs):
+                self._counter.requests += 1
+                return attr(*args, **kwargs)
+            return execute
+        if callable(attr):
+            def call(*args, **kwargs):
+                out = attr(*args, **kwargs)
+                return _CountingBuilder(self._counter, out) if hasattr(out, "execute") else out
+            return call
+        return attr
+
+
+def legacy_delete_project(supabase, project_id):
+    """The cascade as it was before: one DELETE per tender/contract/guarantee."""
+    supabase.table("project_assignments").delete().eq("project_id", project_id).execute()
+    supabase.table("tasks").delete().eq("project_id", project_id).execute()
+    supabase.table("quality_logs").delete().eq("project_id", project_id).execute()
+    supabase.table("phases").delete().eq("project_id", project_id).execute()
+    subs_res = supabase.table("subcontractors").select("id").eq("project_id", project_id).execute()
+    sub_ids = [s['id'] for s in subs_res.data]
+    if sub_ids:
+        supabase.table("compliance_documents").delete().in_("subcontractor_id", sub_ids).execute()
+    supabase.table("subcontractors").delete().eq("project_id", project_id).execute()
+    supabase.table("lab_tests").delete().eq("project_id", project_id).execute()
+    supabase.table("expenses").delete().eq("project_id", project_id).execute()
+    supabase.table("faenas").delete().eq("project_id", project_id).execute()
+    supabase.table("purchase_orders").delete().eq("project_id", project_id).execute()
+    tenders_res = supabase.table("tenders").select("id").eq("project_id", project_id).execute()
+    for tender in tenders_res.data:
+        contracts_res = supabase.table("contracts").select("id").eq("tender_id", tender['id']).execute()
+        for contract in contracts_res.data:
+            supabase.table("guarantees").delete().eq("contract_id", contract['id']).execute()
+            supabase.table("contracts").delete().eq("id", contract['id']).execute()
+        supabase.table("tenders").delete().eq("id", tender['id']).execute()
+    supabase.table("budget_items").delete().eq("project_id", project_id).execute()
+    supabase.table("comments").delete().eq("project_id", project_id).execute()
+    supabase.table("projects").delete().eq("id", project_id).execute()
+
+
+def seed_project(supabase, tenders, contracts, guarantees, rows):
+    """Creates a synthetic project using bulk inserts. Returns its id."""
+    today = str(date.today())
+    stamp = int(time.time() * 1000)
+    pid = supabase.table("projects").insert({
+        "name": f"BENCH {stamp}", "budget_total": 0, "start_date": today, "end_date": today
+    }).execute().data[0]['id']
+
+    t_ids = [t['id'] for t in supabase.table("tenders").insert([
+        {"project_id": pid, "title": f"Tender {i}", "type": "L1"} for i in range(tenders)
+    ]).execute().data] if tenders else []
+    c_ids = [c['id'] for c in supabase.table("contracts").insert([
+        {"tender_id": t, "contractor_name": f"Contractor {j}"} for t in t_ids for j in range(contracts)
+    ]).execute().data] if t_ids and contracts else []
+    if c_ids and guarantees:
+        supabase.table("guarantees").insert([
+            {"contract_id": c, "type": "Fiel Cumplimiento", "amount": 1} for c in c_ids for _ in range(guarantees)
+        ]).execute()
+
+    if rows:
+        supabase.table("tasks").insert([{"project_id": pid, "name": f"Task {i}"} for i in range(rows)]).execute()
+        supabase.table("purchase_orders").insert([
+            {"project_id": pid, "provider_name": "Bench", "date": today, "total_amount": 1} for _ in range(rows)
+        ]).execute()
+        supabase.table("expenses").insert([
+            {"project_id": pid, "date": today, "amount": 1} for _ in range(rows)
+        ]).execute()
+        subs = supabase.table("subcontractors").insert([
+            {"project_id": pid, "name": f"Sub {i}", "rut": f"B{stamp}-{i}"} for i in range(rows)
+        ]).execute().data
+        supabase.table("compliance_documents").insert([
+            {"subcontractor_id": s['id'], "document_type": "F30"} for s in subs
+        ]).execute()
+    return pid
+
+
+def run(label, delete_fn, args):
+    client = data.supabase
+    pid = seed_project(client, args.tenders, args.contracts, args.guarantees, args.rows)
+    counting = CountingClient(client)
+    data.supabase = counting
+    try:
+        start = time.perf_counter()
+        result = delete_fn(counting, pid)
+        elapsed = time.perf_counter() - start
+    finally:
+        data.supabase = client
+    print(f"{label:<28} {elapsed * 1000:>10.1f} ms {counting.requests:>8} requests")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenders", type=int, default=20)
+    parser.add_argument("--contracts", type=int, default=5, help="contracts per tender")
+    parser.add_argument("--guarantees", type=int, default=2, help="guarantees per contract")
+    parser.add_argument("--rows", type=int, default=200, help="rows per operational table")
+    parser.add_argument("--yes", action="store_true", help="confirm writes to the configured database")
+    args = parser.parse_args()
+    if not args.yes:
+        parser.error("this benchmark writes to the database, pass --yes to run it")
+
+    print(f"Project size: {args.tenders} tenders x {args.contracts} contracts x {args.guarantees} guarantees, "
+          f"{args.rows} rows per table")
+    print("-" * 60)
+    run("Legacy nested loop", legacy_delete_project, args)
+    run("Batch in_() fallback", lambda _client, pid: data._delete_project_batched(pid), args)
+    counts = run("delete_project_cascade RPC", lambda _client, pid: data.delete_project_cascade(pid), args)
+    print("-" * 60)
+    print("Rows deleted by the RPC:", {t: n for t, n in counts.items() if n})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Memory and parse cost of the canonical dtypes (schema.TABLES) vs raw API frames.
+
+Builds synthetic rows shaped like the API responses of the largest tables and compares
+- memory of the raw frame (strings as objects) vs the typed one (data.apply_dtypes),
+- the per-rerun cost views paid before: pd.to_datetime on every date column, every time.
+CPU only, no database access. Run with: python bench_dtypes.py --rows 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+import pandas as pd
+
+# Importing the data layer opens a backend, use a throwaway local one
+os.environ.setdefault("NOVENAPP_BACKEND", "sqlite")
+os.environ.setdefault("NOVENAPP_DB_PATH", os.path.join(tempfile.gettempdir(), "bench_dtypes.db"))
+from modules import data, schema
+
+STATUSES = ["Pendiente", "Aprobada", "Pagada", "Rechazada"]
+CATEGORIES = ["Materiales", "Mano de Obra", "Subcontratos", "Equipos", "General"]
+
+
+def payload(table, n):
+    sample = {
+        "int": lambda i: i, "float": lambda i: i * 1.5, "str": lambda i: f"texto {i % 1000}",
+        "category": lambda i: (STATUSES if i % 2 else CATEGORIES)[i % 4],
+        "date": lambda i: f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+        "datetime": lambda i: f"2024-{i % 12 + 1:02d}-01T12:{i % 60:02d}:00.123456+00:00",
+    }
+    cols = schema.TABLES[table]
+    return [{c: sample[kind](i) for c, kind in cols.items()} for i in range(n)]
+
+
+def mb(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{args.rows:,} rows per table")
+    print("-" * 78)
+    for table in ["purchase_orders", "expenses", "tasks", "projects"]:
+        raw = pd.DataFrame(payload(table, args.rows))
+        start = time.perf_counter()
+        typed = data.apply_dtypes(raw.copy(), table)
+        t_type = time.perf_counter() - start
+        dates = [c for c, k in schema.TABLES[table].items() if k in ("date", "datetime")]
+        start = time.perf_counter()
+        for c in dates:
+            pd.to_datetime(raw[c], format="ISO8601")
+        t_reparse = time.perf_counter() - start
+        print(f"{table:<16} raw {mb(raw):>7.1f} MB   typed {mb(typed):>7.1f} MB   "
+              f"-{(1 - mb(typed) / mb(raw)) * 100:>3.0f}%   typing once {t_type * 1000:>6.1f} ms   "
+              f"re-parse per rerun {t_reparse * 1000:>6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
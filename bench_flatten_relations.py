@@ -0,0 +1,110 @@
+"""
+Micro-benchmark: data.flatten_relations vs the per-row loops it replaced.
+
+Builds synthetic PostgREST payloads with embedded relations (same shape as the
+get_expenses_df and get_all_project_assignments responses) and times both strategies.
+CPU only, no database access. Run with: python bench_flatten_relations.py --rows 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+import pandas as pd
+
+# Importing the data layer opens a backend, use a throwaway local one
+os.environ.setdefault("NOVENAPP_BACKEND", "sqlite")
+os.environ.setdefault("NOVENAPP_DB_PATH", os.path.join(tempfile.gettempdir(), "bench_flatten.db"))
+from modules import data
+
+
+def expense_payload(n):
+    return [{
+        "id": i, "date": "2024-01-01", "amount": float(i), "category": "Materiales",
+        "description": None, "project_id": i % 40,
+        "project": {"name": f"Proyecto {i % 40}"} if i % 17 else None,
+        "faena": {"name": f"Faena {i % 9}"} if i % 3 else None,
+        "unit": {"name": "m3"} if i % 5 else None
+    } for i in range(n)]
+
+
+def assignment_payload(n):
+    return [{
+        "id": i, "role": "Jefe de Terreno", "assigned_at": "2024-01-01",
+        "user": {"full_name": f"Usuario {i % 300}", "username": f"u{i % 300}"} if i % 11 else None,
+        "project": {"name": f"Proyecto {i % 40}"} if i % 13 else None
+    } for i in range(n)]
+
+
+def legacy_expenses(rows):
+    flat_data = []
+    for row in rows:
+        new_row = row.copy()
+        new_row['project'] = row['project']['name'] if row.get('project') else None
+        new_row['faena'] = row['faena']['name'] if row.get('faena') else None
+        new_row['unit'] = row['unit']['name'] if row.get('unit') else None
+        flat_data.append(new_row)
+    return pd.DataFrame(flat_data)
+
+
+def vectorized_expenses(rows):
+    return data.flatten_relations(pd.DataFrame(rows), {
+        "project": {"name": "project"}, "faena": {"name": "faena"}, "unit": {"name": "unit"}
+    })
+
+
+def legacy_assignments(rows):
+    flat = []
+    for row in rows:
+        user_data = row.get('user') or {}
+        flat.append({
+            'id': row['id'],
+            'role': row['role'],
+            'assigned_at': row['assigned_at'],
+            'full_name': user_data.get('full_name', 'Unknown'),
+            'username': user_data.get('username', ''),
+            'project_name': row['project']['name'] if row.get('project') else 'Unknown'
+        })
+    return pd.DataFrame(flat)
+
+
+def vectorized_assignments(rows):
+    return data.flatten_relations(
+        rows,
+        {"user": {"full_name": "full_name", "username": "username"}, "project": {"name": "project_name"}},
+        {"full_name": "Unknown", "username": "", "project_name": "Unknown"}
+    )
+
+
+def timed(fn, rows, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(rows)
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    cases = [
+        ("expenses", expense_payload, legacy_expenses, vectorized_expenses),
+        ("assignments", assignment_payload, legacy_assignments, vectorized_assignments),
+    ]
+    print(f"{args.rows:,} rows, best of {args.repeat}")
+    print("-" * 60)
+    for name, payload, legacy, vectorized in cases:
+        rows = payload(args.rows)
+        t_old, old = timed(legacy, rows, args.repeat)
+        t_new, new = timed(vectorized, rows, args.repeat)
+        # Same values, column order aside
+        same = old[sorted(old.columns)].astype(object).fillna("").equals(new[sorted(new.columns)].astype(object).fillna(""))
+        print(f"{name:<12} loop {t_old * 1000:>8.1f} ms   vectorized {t_new * 1000:>8.1f} ms   "
+              f"x{t_old / t_new:>4.1f}   identical={same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark: the reads that migration 1 (FK and expiry indexes) speeds up, before vs after.
+
+SQLite (default): seeds a throwaway database with --projects projects and --rows child rows per
+table, times each query without the indexes, applies the migration and times them again.
+Postgres: --postgres times the same queries with EXPLAIN ANALYZE on DATABASE_URL as it is now;
+run it before and after `python migrate.py up` to compare. Read-only, needs psycopg.
+Run with: python bench_indexes.py --rows 200000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+from modules import migrations, schema
+
+TODAY = date.today()
+SOON = TODAY + timedelta(days=15)
+
+# (label, sql, params) with the same filters the accessors send
+QUERIES = [
+    ("tasks por proyecto", "SELECT * FROM tasks WHERE project_id = ?", (7,)),
+    ("órdenes por proyecto", "SELECT * FROM purchase_orders WHERE project_id = ?", (7,)),
+    ("gastos por proyecto", "SELECT * FROM expenses WHERE project_id = ?", (7,)),
+    ("garantías por contrato", "SELECT * FROM guarantees WHERE contract_id = ?", (42,)),
+    ("proyectos por vencer",
+     "SELECT * FROM projects WHERE status <> 'Completado' AND status <> 'En Cierre' AND end_date >= ? AND end_date <= ?",
+     (TODAY.isoformat(), SOON.isoformat())),
+    ("contratos por vencer",
+     "SELECT * FROM contracts WHERE status <> 'Terminado' AND end_date >= ? AND end_date <= ?",
+     (TODAY.isoformat(), SOON.isoformat())),
+    ("garantías por vencer",
+     "SELECT * FROM guarantees WHERE status = 'Vigente' AND expiration_date >= ? AND expiration_date <= ?",
+     (TODAY.isoformat(), SOON.isoformat())),
+]
+
+
+def some_date(rng):
+    return (TODAY + timedelta(days=rng.randint(-700, 700))).isoformat()
+
+
+def seed(path, projects, rows):
+    schema.init_schema(path) # Base schema only, no migrations
+    rng = random.Random(1)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO projects (name, end_date, status) VALUES (?, ?, ?)",
+            [(f"P{i}", some_date(rng), rng.choice(["Activo", "Completado", "Pausado"])) for i in range(projects)]
+        )
+        conn.executemany(
+            "INSERT INTO tenders (project_id, title, type) VALUES (?, ?, 'LP')",
+            [(rng.randint(1, projects), f"L{i}") for i in range(rows // 10)]
+        )
+        conn.executemany(
+            "INSERT INTO contracts (tender_id, end_date, status) VALUES (?, ?, ?)",
+            [(rng.randint(1, rows // 10), some_date(rng), rng.choice(["Activo", "Terminado"])) for _ in range(rows)]
+        )
+        conn.executemany(
+            "INSERT INTO guarantees (contract_id, expiration_date, status) VALUES (?, ?, ?)",
+            [(rng.randint(1, rows), some_date(rng), rng.choice(["Vigente", "Devuelta", "Cobrada"])) for _ in range(rows)]
+        )
+        for table, extra in (("tasks", "name"), ("purchase_orders", "provider_name"), ("expenses", "description")):
+            date_col = ", date, amount" if table == "expenses" else ""
+            marks = ", ?, ?" if table == "expenses" else ""
+            conn.executemany(
+                f"INSERT INTO {table} (project_id, {extra}{date_col}) VALUES (?, ?{marks})",
+                [(rng.randint(1, projects), "x", *((some_date(rng), 1.0) if table == "expenses" else ())) for _ in range(rows)]
+            )
+    conn.execute("ANALYZE")
+    return conn
+
+
+def time_queries(conn, repeat):
+    out = {}
+    for label, sql, params in QUERIES:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            best = min(best, time.perf_counter() - start)
+        plan = " / ".join(r[-1] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+        out[label] = (best, plan)
+    return out
+
+
+def bench_sqlite(args):
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_indexes_"), "bench.db")
+    conn = seed(path, args.projects, args.rows)
+    before = time_queries(conn, args.repeat)
+    conn.close()
+    migrations.migrate_sqlite(path)
+    conn = sqlite3.connect(path)
+    conn.execute("ANALYZE")
+    after = time_queries(conn, args.repeat)
+    print(f"SQLite, {args.projects:,} proyectos, {args.rows:,} filas por tabla, mejor de {args.repeat}")
+    print("-" * 78)
+    for label, _, _ in QUERIES:
+        (t0, _), (t1, plan) = before[label], after[label]
+        print(f"{label:<24} sin índices {t0 * 1000:>8.2f} ms   con índices {t1 * 1000:>8.2f} ms   x{t0 / t1:>6.1f}")
+        print(f"{'':<24} {plan}")
+
+
+def bench_postgres(args):
+    import psycopg
+    conn = psycopg.connect(os.environ["DATABASE_URL"], autocommit=True)
+    print("Postgres (EXPLAIN ANALYZE, tiempo de ejecución del servidor)")
+    print("-" * 78)
+    with conn.cursor() as cur:
+        for label, sql, params in QUERIES:
+            cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql.replace("?", "%s"), params)
+            plan = cur.fetchone()[0][0]
+            print(f"{label:<24} {plan['Execution Time']:>8.2f} ms   {plan['Plan']['Node Type']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--projects", type=int, default=500)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--postgres", action="store_true")
+    args = parser.parse_args()
+    bench_postgres(args) if args.postgres else bench_sqlite(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark: cost of moving a task on the Lean Kanban board (views_lean), before vs now.
+
+Seeds a throwaway local database with one project and --tasks active tasks, then moves one task
+with streamlit's AppTest and reports time and backend queries of the run the move triggers:
+- antes: update + st.rerun() of the whole page, tasks cache invalidated (what a move cost before),
+- ahora: the board fragment rerun, which patches its working copy and sends only the update.
+The change feed runs as in app.py and each move waits past its poll interval (not timed), so a
+move's own event reaching the board would show up as a tasks.select on the next one.
+Run with: python bench_kanban.py --tasks 1200
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date
+
+# Importing the data layer opens a backend, use a throwaway local one
+_tmp = tempfile.mkdtemp(prefix="bench_kanban_")
+os.environ.setdefault("NOVENAPP_BACKEND", "sqlite")
+os.environ.setdefault("NOVENAPP_DB_PATH", os.path.join(_tmp, "bench.db"))
+os.environ.setdefault("NOVENAPP_MIRROR", "0")
+from streamlit.testing.v1 import AppTest
+from modules import backend, data, metrics
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SETUP = f"import sys; sys.path.insert(0, {ROOT!r})\nfrom modules import views_lean\n"
+PAGE = SETUP + "views_lean.render_lean()\n"
+BOARD = SETUP + "views_lean._active_plan(1)\n" # What a fragment rerun executes
+STATUSES = ["Por Hacer", "En Curso", "Bloqueado", "Completado"]
+
+
+def seed(tasks):
+    today = date.today().isoformat()
+    data.bulk_insert("projects", [{"name": "Obra Bench", "budget_total": 1e9, "status": "Activo"}])
+    data.bulk_insert("tasks", [{
+        "project_id": 1, "name": f"Partida {i}", "status": STATUSES[i % 4], "start_date": today, "end_date": today
+    } for i in range(tasks)])
+
+
+def timed_move(script, moves, before, first=0):
+    """Best time of the run that follows a move, over `moves` moves from task #first on, and the most queries one made."""
+    at = AppTest.from_string(script, default_timeout=300).run()
+    best, queries = float("inf"), []
+    for i in range(moves):
+        task_id = 1 + 4 * (first + i) # "Por Hacer" cards, first page of the column
+        if before:
+            def move():
+                data.update_task_status(task_id, "En Curso")
+                data.invalidate_cache("tasks") # Writes patch the cache now, before they dropped it
+                at.run()
+        else:
+            move = at.selectbox(key=f"mv_{task_id}").set_value("En Curso").run
+        time.sleep(2 * backend.PollingChangeFeed.POLL_SECONDS) # Let the previous move's event arrive
+        metrics.reset()
+        start = time.perf_counter()
+        move()
+        elapsed = time.perf_counter() - start
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+        best = min(best, elapsed)
+        queries = max(queries, list(metrics.events("query")["name"]), key=len)
+    return best, queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1200)
+    parser.add_argument("--moves", type=int, default=3)
+    args = parser.parse_args()
+    seed(args.tasks)
+    data.start_change_feed()
+
+    t_old, q_old = timed_move(PAGE, args.moves, before=True)
+    t_new, q_new = timed_move(BOARD, args.moves, before=False, first=args.moves)
+    print(f"Tablero con {args.tasks:,} tareas activas, mejor de {args.moves} movimientos")
+    print("-" * 70)
+    print(f"antes  {t_old * 1000:>7.1f} ms   consultas: {', '.join(q_old) or '-'}")
+    print(f"ahora  {t_new * 1000:>7.1f} ms   consultas: {', '.join(q_new) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: reading purchase_orders from the local Arrow mirror vs a full paged query.
+
+Seeds a throwaway local database with --rows purchase orders, then times:
+- a full paged read (what every cache miss cost before the mirror),
+- a mirror read (memory-mapped, no sync needed),
+- a delta sync after --changes rows were updated and as many inserted.
+Against Supabase the query side also pays the network; run with NOVENAPP_BACKEND=supabase
+and --no-seed to measure a real project. Run with: python bench_mirror.py --rows 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+# Importing the data layer opens a backend, default to a throwaway local one
+_tmp = tempfile.mkdtemp(prefix="bench_mirror_")
+os.environ.setdefault("NOVENAPP_BACKEND", "sqlite")
+os.environ.setdefault("NOVENAPP_DB_PATH", os.path.join(_tmp, "bench.db"))
+os.environ.setdefault("NOVENAPP_MIRROR_DIR", os.path.join(_tmp, "mirror"))
+from modules import data, mirror
+
+
+def seed(rows):
+    data.supabase.table("projects").insert({"name": "Bench", "status": "Activo"}).execute()
+    pid = data.supabase.table("projects").select("id").limit(1).execute().data[0]["id"]
+    # Written over time up to an hour ago, one row a second, as a real table would be, so the delta
+    # sync's overlap window (mirror.WATERMARK_MARGIN_SECONDS) holds a minute of rows, not all of them
+    last = datetime.now(timezone.utc) - timedelta(hours=1)
+    written = lambda i: (last - timedelta(seconds=rows - i)).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
+    data.bulk_insert("purchase_orders", [{
+        "project_id": pid, "provider_name": f"Proveedor {i % 200}", "date": f"2024-{i % 12 + 1:02d}-01",
+        "total_amount": float(i), "status": "Pendiente", "description": "x" * 40, "order_number": f"OC-{i}",
+        "updated_at": written(i)
+    } for i in range(rows)])
+    return pid
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--changes", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-seed", action="store_true")
+    args = parser.parse_args()
+
+    pid = None if args.no_seed else seed(args.rows)
+    m = mirror.TableMirror("purchase_orders")
+
+    t_full_sync, pulled = best_of(lambda: m.sync(force_full=True), 1)
+    t_query, df = best_of(lambda: data.read_paged("purchase_orders"), args.repeat)
+    t_mirror, mdf = best_of(m.read_unlocked, args.repeat)
+    print(f"{len(df):,} rows, best of {args.repeat}")
+    print("-" * 60)
+    print(f"initial full sync   {t_full_sync * 1000:>9.1f} ms   ({pulled:,} rows)")
+    print(f"paged query         {t_query * 1000:>9.1f} ms")
+    print(f"mirror read         {t_mirror * 1000:>9.1f} ms   x{t_query / t_mirror:.0f}   same rows={len(mdf) == len(df)}")
+
+    if pid is not None:
+        first = int(df["id"].min())
+        for i in range(first, first + args.changes):
+            data.supabase.table("purchase_orders").update({"status": "Aprobada"}).eq("id", i).execute()
+        seed_more = [{"project_id": pid, "provider_name": "Nuevo", "date": "2025-01-01", "total_amount": 1.0,
+                      "status": "Pendiente"} for _ in range(args.changes)]
+        data.bulk_insert("purchase_orders", seed_more)
+        t_delta, pulled = best_of(m.sync, 1)
+        print(f"delta sync          {t_delta * 1000:>9.1f} ms   ({pulled:,} rows pulled, {m.meta['rows']:,} mirrored)")
+
+
+if __name__ == "__main__":
+    main()
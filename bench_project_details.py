@@ -0,0 +1,97 @@
+"""
+Benchmark: backend queries and time to open a project (project_manager.render_project_details).
+
+Seeds a throwaway local database with one project and --rows phases, purchase orders, comments,
+faenas and budget items, then renders the page with streamlit's AppTest, cache cleared:
+- lazy: the page as it is now, header plus the open tab (one run per tab),
+- eager: header, the default tab and every other tab's body in one run (what opening a
+  project cost before, when every tab ran on each rerun).
+Run with: python bench_project_details.py --rows 2000
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+# Importing the data layer opens a backend, use a throwaway local one
+_tmp = tempfile.mkdtemp(prefix="bench_project_details_")
+os.environ.setdefault("NOVENAPP_BACKEND", "sqlite")
+os.environ.setdefault("NOVENAPP_DB_PATH", os.path.join(_tmp, "bench.db"))
+os.environ.setdefault("NOVENAPP_MIRROR", "0")
+from streamlit.testing.v1 import AppTest
+from modules import data, metrics
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SETUP = (
+    f"import sys; sys.path.insert(0, {ROOT!r})\n"
+    "import streamlit as st\n"
+    "st.session_state['user_role'] = 'Administrador'\n"
+    "st.session_state['user_id'] = 1\n"
+    "from modules import project_manager\n"
+)
+LAZY = SETUP + "project_manager.render_project_details(1)\n"
+EAGER = SETUP + (
+    "project_manager.render_project_details(1)\n"
+    "for render_tab, args in [(project_manager._expenses_tab, (1,)), (project_manager._comments_tab, (1,)),\n"
+    "                         (project_manager._faenas_tab, (1, True)), (project_manager._config_tab, (1, True))]:\n"
+    "    render_tab(*args)\n"
+)
+TABS = ["📊 Cronograma", "💰 Gastos", "💬 Bitácora", "🏗️ Faenas", "⚙️ Configuración"]
+
+
+def seed(rows):
+    today = date.today()
+    data.bulk_insert("users", [{"username": "bench", "password_hash": "x", "role": "Administrador"}])
+    data.bulk_insert("projects", [{
+        "name": "Obra Bench", "budget_total": 1e9, "status": "Activo",
+        "start_date": today.isoformat(), "end_date": (today + timedelta(days=365)).isoformat()
+    }])
+    data.bulk_insert("phases", [{
+        "project_id": 1, "name": f"Fase {i}", "status": "Pendiente",
+        "start_date": (today + timedelta(days=i)).isoformat(), "end_date": (today + timedelta(days=i + 7)).isoformat()
+    } for i in range(rows // 20)])
+    data.bulk_insert("purchase_orders", [{
+        "project_id": 1, "provider_name": f"Prov {i % 50}", "date": today.isoformat(),
+        "total_amount": 1000.0 * (i % 90), "status": "Aprobada", "description": "x"
+    } for i in range(rows)])
+    data.bulk_insert("comments", [{"project_id": 1, "user_id": 1, "content": f"Nota {i}"} for i in range(rows // 20)])
+    data.bulk_insert("faenas", [{"project_id": 1, "name": f"Faena {i}", "supervisor": "S"} for i in range(rows // 20)])
+    data.bulk_insert("budget_items", [{
+        "project_id": 1, "item_name": f"Ítem {i}", "category": "General", "estimated_amount": 1e5
+    } for i in range(rows // 20)])
+
+
+def run(script, tab=None):
+    at = AppTest.from_string(script, default_timeout=120)
+    if tab:
+        at.session_state["project_detail_tab"] = tab
+    data.invalidate_cache()
+    metrics.reset()
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    queries = metrics.events("query")
+    return elapsed, len(queries), int(queries["rows"].fillna(0).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+    seed(args.rows)
+    run(LAZY) # Warm up imports and plotly so the first timing is comparable
+
+    t_eager, q_eager, r_eager = run(EAGER)
+    print(f"Proyecto con {args.rows:,} OC (sin caché)")
+    print("-" * 70)
+    print(f"{'antes: todas las pestañas':<28} {q_eager:>3} consultas {r_eager:>7,} filas {t_eager * 1000:>8.1f} ms")
+    for tab in TABS:
+        t, q, r = run(LAZY, tab)
+        print(f"{'ahora: ' + tab:<28} {q:>3} consultas {r:>7,} filas {t * 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
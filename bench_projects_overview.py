@@ -0,0 +1,77 @@
+"""
+Benchmark: render time of the project list (project_manager.render_projects_overview) vs portfolio size.
+
+For each size in --sizes, seeds a throwaway local database and renders with streamlit's AppTest:
+- todas: a card for every project in one run (what the overview did before),
+- página: the paginated list as it is now (first page, cards and table mode).
+Run with: python bench_projects_overview.py --sizes 100 250 500
+"""
+import argparse
+import os
+import tempfile
+import time
+
+# Importing the data layer opens a backend, use a throwaway local one
+_tmp = tempfile.mkdtemp(prefix="bench_projects_overview_")
+os.environ.setdefault("NOVENAPP_BACKEND", "sqlite")
+os.environ.setdefault("NOVENAPP_DB_PATH", os.path.join(_tmp, "bench.db"))
+os.environ.setdefault("NOVENAPP_MIRROR", "0")
+from streamlit.testing.v1 import AppTest
+from modules import data, metrics
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SETUP = (
+    f"import sys; sys.path.insert(0, {ROOT!r})\n"
+    "import streamlit as st\n"
+    "st.session_state['user_role'] = 'Administrador'\n"
+    "from modules import data, project_manager\n"
+)
+ALL_CARDS = SETUP + (
+    "for _, row in data.get_projects().iterrows():\n"
+    "    project_manager._project_card(row, True, True)\n"
+)
+PAGED = SETUP + "project_manager.render_projects_overview()\n"
+
+
+def seed(total):
+    have = len(data.get_projects(("id",)))
+    data.bulk_insert("projects", [{
+        "name": f"Obra {i:05d}", "budget_total": 1e6 + i, "status": "Activo", "description": "Edificio habitacional",
+        "start_date": "2025-01-01", "end_date": "2026-06-30"
+    } for i in range(have, total)])
+
+
+def run(script, mode=None):
+    at = AppTest.from_string(script, default_timeout=600)
+    if mode:
+        at.session_state["projects_mode"] = mode
+    data.invalidate_cache()
+    metrics.reset()
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return elapsed, int(metrics.events("query")["rows"].fillna(0).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 250, 500])
+    args = parser.parse_args()
+
+    seed(1)
+    run(PAGED) # Warm up imports so the first timing is comparable
+    print("Render de la lista de proyectos (sin caché)")
+    print("-" * 78)
+    for size in sorted(args.sizes):
+        seed(size)
+        t_all, r_all = run(ALL_CARDS)
+        t_cards, r_cards = run(PAGED, "Tarjetas")
+        t_table, _ = run(PAGED, "Tabla")
+        print(f"{size:>6,} proyectos   todas {t_all * 1000:>8.0f} ms ({r_all:>5,} filas)   "
+              f"página {t_cards * 1000:>6.0f} ms ({r_cards} filas)   tabla {t_table * 1000:>6.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
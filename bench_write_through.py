@@ -0,0 +1,119 @@
+"""
+Benchmark: the read that follows a form write, cached frames patched (write-through) vs refetched.
+
+Seeds a throwaway local database with one project and --rows purchase orders, comments, faenas,
+budget items, lab tests and tasks, warms the reads a project page makes, then for each writer
+times the write plus the re-read and counts backend queries and rows read:
+- refetch: the table is invalidated after the write (what every write did before),
+- patch: the write's returned rows are merged into the cached frames,
+- patch + feed: the same with the change feed running (as app.py does), re-reading after the
+  write's own event has been polled (the wait is not timed), so an echo would show as queries.
+Run with: python bench_write_through.py --rows 5000
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date
+
+# Importing the data layer opens a backend, use a throwaway local one
+_tmp = tempfile.mkdtemp(prefix="bench_write_through_")
+os.environ.setdefault("NOVENAPP_BACKEND", "sqlite")
+os.environ.setdefault("NOVENAPP_DB_PATH", os.path.join(_tmp, "bench.db"))
+os.environ.setdefault("NOVENAPP_MIRROR", "0")
+from modules import backend, data, metrics
+
+TODAY = date.today().isoformat()
+# (label, table, reads after the write, write(i) -> performs the i-th write)
+CASES = [
+    ("OC: cambio de estado", "purchase_orders", [lambda: data.get_purchase_orders(), lambda: data.get_purchase_orders(1)],
+     lambda i: data.update_po_status(1 + i, "Aprobada")),
+    ("OC: nueva", "purchase_orders", [lambda: data.get_purchase_orders(), lambda: data.get_purchase_orders(1)],
+     lambda i: data.create_purchase_order(1, "Proveedor", TODAY, 1000.0, f"OC-B{i}", "x")),
+    ("Bitácora: comentario", "comments", [lambda: data.get_comments(1)],
+     lambda i: data.add_comment(1, 1, f"Nota {i}")),
+    ("Faenas: edición", "faenas", [lambda: data.get_faenas(), lambda: data.get_faenas(1)],
+     lambda i: data.update_faena(1 + i, f"Faena {i}*", "S")),
+    ("Presupuesto: ítem", "budget_items", [lambda: data.get_budget_items(1)],
+     lambda i: data.create_budget_item(1, f"Ítem B{i}", "General", 1e5)),
+    ("Laboratorio: ensayo", "lab_tests", [lambda: data.get_lab_tests(), lambda: data.get_lab_tests(1)],
+     lambda i: data.create_lab_test(1, "Hormigón", TODAY, "Aprobado", "x")),
+    ("Tareas: mover", "tasks", [lambda: data.get_tasks(1), lambda: data.get_tasks()],
+     lambda i: data.update_task_status(1 + i, "En Curso")),
+]
+
+
+def seed(rows):
+    data.bulk_insert("users", [{"username": "bench", "password_hash": "x", "role": "Administrador"}])
+    data.bulk_insert("projects", [{"name": "Obra Bench", "budget_total": 1e9, "status": "Activo"}])
+    data.bulk_insert("purchase_orders", [{
+        "project_id": 1, "provider_name": f"Prov {i % 50}", "date": TODAY,
+        "total_amount": 1000.0 * (i % 90), "status": "Pendiente", "description": "x"
+    } for i in range(rows)])
+    data.bulk_insert("comments", [{"project_id": 1, "user_id": 1, "content": f"Nota {i}"} for i in range(rows)])
+    data.bulk_insert("faenas", [{"project_id": 1, "name": f"Faena {i}", "supervisor": "S"} for i in range(rows)])
+    data.bulk_insert("budget_items", [{
+        "project_id": 1, "item_name": f"Ítem {i}", "category": "General", "estimated_amount": 1e5
+    } for i in range(rows)])
+    data.bulk_insert("lab_tests", [{
+        "project_id": 1, "test_type": "Hormigón", "test_date": TODAY, "result": "Aprobado", "observation": "x"
+    } for i in range(rows)])
+    data.bulk_insert("tasks", [{
+        "project_id": 1, "name": f"Partida {i}", "status": "Por Hacer", "start_date": TODAY, "end_date": TODAY
+    } for i in range(rows)])
+
+
+def run(table, reads, write, writes, first, refetch, settle=0.0):
+    """
+    Best time of write + re-read over `writes` writes, with the queries and rows of the re-read.
+    settle: seconds to wait between the write and the re-read (not timed).
+    """
+    for read in reads:
+        read()
+    best, queries, rows = float("inf"), 0, 0
+    for i in range(first, first + writes):
+        start = time.perf_counter()
+        write(i)
+        if refetch:
+            data.invalidate_cache(table)
+        elapsed = time.perf_counter() - start
+        time.sleep(settle)
+        metrics.reset()
+        start = time.perf_counter()
+        for read in reads:
+            read()
+        elapsed += time.perf_counter() - start
+        if elapsed < best:
+            events = metrics.events("query")
+            best, queries, rows = elapsed, len(events), int(events["rows"].fillna(0).sum())
+    return best, queries, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--writes", type=int, default=3)
+    args = parser.parse_args()
+    seed(args.rows)
+
+    print(f"{args.rows:,} filas por tabla, mejor de {args.writes} escrituras (escritura + relectura)")
+    print("-" * 104)
+    results = {}
+    for label, table, reads, write in CASES:
+        results[label] = (
+            run(table, reads, write, args.writes, 0, refetch=True),
+            run(table, reads, write, args.writes, args.writes, refetch=False)
+        )
+    # Second pass with the feed polling, as in the app: own writes must not come back as events
+    feed = data.start_change_feed()
+    settle = 2 * backend.PollingChangeFeed.POLL_SECONDS
+    for label, table, reads, write in CASES:
+        (t_old, q_old, r_old), (t_new, q_new, _) = results[label]
+        t_feed, q_feed, _ = run(table, reads, write, args.writes, 2 * args.writes, refetch=False, settle=settle)
+        print(f"{label:<22} refetch {t_old * 1000:>7.1f} ms {q_old:>2} consultas {r_old:>6,} filas   "
+              f"patch {t_new * 1000:>6.1f} ms {q_new:>2} consultas   + feed {t_feed * 1000:>6.1f} ms {q_feed:>2} consultas")
+    print(f"feed: {feed.stats()['events']} eventos, {feed.stats()['echoes']} propios ignorados")
+
+
+if __name__ == "__main__":
+    main()
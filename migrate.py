@@ -0,0 +1,102 @@
+"""
+Schema migration runner (see modules/migrations.py).
+
+  python migrate.py status            applied / pending versions of the configured database
+  python migrate.py up [--to N]       applies the pending migrations
+  python migrate.py sql               prints the pending Postgres SQL for the Supabase SQL editor
+
+The database is the one the app uses (env NOVENAPP_BACKEND / secrets [backend]). For SQLite
+it is the local file. For Supabase, `up` needs a direct Postgres connection: env DATABASE_URL
+or secrets [postgres] URL (Settings > Database > Connection string) and `pip install psycopg`.
+Without it, `status` reads schema_migrations through the API and `sql` prints what to run.
+"""
+import argparse
+import os
+import sys
+from modules import backend, migrations, schema
+
+
+def _sqlite_path():
+    engine = os.environ.get("NOVENAPP_BACKEND") or backend._secret("backend", "ENGINE", "supabase")
+    if engine.lower() in ("sqlite", "local"):
+        return os.environ.get("NOVENAPP_DB_PATH") or backend._secret("backend", "SQLITE_PATH", schema.DB_NAME)
+    return None
+
+
+def _postgres_connection():
+    url = os.environ.get("DATABASE_URL") or backend._secret("postgres", "URL")
+    if not url:
+        return None
+    try:
+        import psycopg
+    except ImportError:
+        sys.exit("psycopg no está instalado: pip install 'psycopg[binary]' (o usa: python migrate.py sql)")
+    return psycopg.connect(url, autocommit=True)
+
+
+def _postgres_applied_via_api():
+    """Applied versions read through PostgREST (no direct connection needed)."""
+    from modules import data
+    try:
+        rows = data.supabase.table(migrations.MIGRATIONS_TABLE).select("version").execute().data
+    except Exception as e:
+        if data.is_network_error(e):
+            raise
+        return set() # Table not created yet: nothing applied
+    return {r["version"] for r in rows}
+
+
+def applied_versions():
+    path = _sqlite_path()
+    if path:
+        import sqlite3
+        conn = sqlite3.connect(path)
+        try:
+            return migrations.sqlite_applied(conn)
+        finally:
+            conn.close()
+    conn = _postgres_connection()
+    if conn is not None:
+        with conn:
+            return migrations.postgres_applied(conn)
+    return _postgres_applied_via_api()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["status", "up", "sql"])
+    parser.add_argument("--to", type=int, default=None, help="Aplicar sólo hasta esta versión")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        applied = applied_versions()
+        for m in sorted(migrations.MIGRATIONS, key=lambda m: m["version"]):
+            mark = "✔ aplicada " if m["version"] in applied else "· pendiente"
+            print(f"{mark}  {m['version']:>4}  {m['name']}")
+        return
+
+    if args.command == "sql":
+        todo = [m for m in migrations.pending(applied_versions()) if args.to is None or m["version"] <= args.to]
+        if not todo:
+            print("Sin migraciones pendientes.")
+            return
+        print("COPIA Y EJECUTA EL SIGUIENTE SQL EN EL EDITOR SQL DE SUPABASE:")
+        print("-" * 50)
+        print(migrations.postgres_script(todo))
+        print("-" * 50)
+        return
+
+    path = _sqlite_path()
+    if path:
+        done = migrations.migrate_sqlite(path, args.to)
+    else:
+        conn = _postgres_connection()
+        if conn is None:
+            sys.exit("Falta DATABASE_URL (o secrets [postgres] URL). Alternativa: python migrate.py sql")
+        with conn:
+            done = migrations.migrate_postgres(conn, args.to)
+    print(f"Migraciones aplicadas: {done}" if done else "Sin migraciones pendientes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ import streamlit as st
 import pandas as pd
 import base64
 import os
-from modules import data
+from modules import data, metrics
 
 def hash_password(password):
     """Hashes a password for storage."""
@@ -48,6 +48,7 @@ def logout_user():
     st.session_state['username'] = None
     st.rerun()
 
+@metrics.timed_view
 def render_login():
     """Renders the Premium Login UI."""
     
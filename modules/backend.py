@@ -0,0 +1,855 @@
+"""
+Storage backends for modules/data.py.
+
+Both backends expose the same small query builder API used by the data layer
+(`table(name).select(...).eq(...).order(...).execute()`, insert/update/upsert/delete
+and `rpc(fn, params)`), and every `execute()` returns an object with `.data` (list of
+dicts) and `.count`. The accessors therefore build identical DataFrames on either one.
+
+- SupabaseBackend: the hosted PostgREST API (default).
+- LocalBackend: an embedded SQLite file using the schema in modules/schema.py, for
+  offline use, benchmarks, tests and fast local analytics.
+
+Selection: env NOVENAPP_BACKEND=sqlite|supabase, or secrets [backend] ENGINE.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timezone
+import httpx
+import streamlit as st
+from modules import metrics, migrations, schema
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_EMBED = re.compile(r"^(?:(\w+):)?(\w+)\((.*)\)$")
+
+
+def _secret(section, key, default=None):
+    """Reads st.secrets[section][key] without failing when no secrets file exists."""
+    try:
+        return st.secrets[section][key]
+    except Exception:
+        return default
+
+
+class Response:
+    """Minimal stand-in for postgrest's APIResponse."""
+
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+# --- HTTP Connection Pool ---
+# One keep-alive pool shared by every session of the process. Tunable from secrets:
+#   [http]
+#   MAX_CONNECTIONS = 20      KEEPALIVE_EXPIRY = 30   HTTP2 = true
+#   MAX_KEEPALIVE = 10        CONNECT_TIMEOUT = 5     READ_TIMEOUT = 15
+#   WRITE_TIMEOUT = 15        POOL_TIMEOUT = 5
+HTTP_DEFAULTS = {
+    "MAX_CONNECTIONS": 20,
+    "MAX_KEEPALIVE": 10,
+    "KEEPALIVE_EXPIRY": 30.0,
+    "HTTP2": True,
+    "CONNECT_TIMEOUT": 5.0,
+    "READ_TIMEOUT": 15.0,
+    "WRITE_TIMEOUT": 15.0,
+    "POOL_TIMEOUT": 5.0,
+}
+
+def http_settings():
+    settings = dict(HTTP_DEFAULTS)
+    for key, default in HTTP_DEFAULTS.items():
+        value = _secret("http", key, default)
+        settings[key] = type(default)(value) if not isinstance(default, bool) else str(value).lower() in ("1", "true", "yes")
+    if settings["HTTP2"]:
+        try:
+            import h2 # noqa: F401, optional dependency of httpx[http2]
+        except ImportError:
+            print("HTTP/2 requested but the h2 package is not installed. Using HTTP/1.1.")
+            settings["HTTP2"] = False
+    return settings
+
+
+class _MeteredStream(httpx.SyncByteStream):
+    """Response body wrapper that reports the bytes read to metrics (per thread)."""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def __iter__(self):
+        for chunk in self._stream:
+            metrics.add_payload_bytes(len(chunk))
+            yield chunk
+
+    def close(self):
+        self._stream.close()
+
+
+class CountingTransport(httpx.HTTPTransport):
+    """HTTPTransport that keeps request counters for the admin panel."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_seconds = 0.0
+
+    def handle_request(self, request):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        start = time.perf_counter()
+        try:
+            response = super().handle_request(request)
+            response.stream = _MeteredStream(response.stream)
+            return response
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.total_seconds += time.perf_counter() - start
+
+    def stats(self):
+        connections = list(self._pool.connections)
+        idle = sum(1 for c in connections if c.is_idle())
+        http2 = sum(1 for c in connections if "HTTP/2" in repr(c))
+        with self._lock:
+            return {
+                "connections": len(connections),
+                "idle": idle,
+                "active": len(connections) - idle,
+                "http2_connections": http2,
+                "requests": self.requests,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "avg_ms": (self.total_seconds / self.requests * 1000) if self.requests else 0.0,
+            }
+
+
+def create_http_client(settings=None):
+    settings = settings or http_settings()
+    transport = CountingTransport(
+        http2=settings["HTTP2"],
+        limits=httpx.Limits(
+            max_connections=settings["MAX_CONNECTIONS"],
+            max_keepalive_connections=settings["MAX_KEEPALIVE"],
+            keepalive_expiry=settings["KEEPALIVE_EXPIRY"],
+        ),
+        retries=0, # Retries are handled by the data layer policy
+    )
+    timeout = httpx.Timeout(
+        connect=settings["CONNECT_TIMEOUT"], read=settings["READ_TIMEOUT"],
+        write=settings["WRITE_TIMEOUT"], pool=settings["POOL_TIMEOUT"],
+    )
+    return httpx.Client(transport=transport, timeout=timeout, follow_redirects=True)
+
+
+# --- Supabase ---
+
+def _metered(name, execute):
+    """Runs one request and records it in metrics with its row count and response bytes."""
+    metrics.take_payload_bytes()
+    with metrics.track("query", name) as t:
+        res = execute()
+        t.rows = len(res.data) if isinstance(res.data, list) else None
+        t.nbytes = metrics.take_payload_bytes() or None
+    return res
+
+
+class _MeteredBuilder:
+    """
+    Wraps a postgrest request builder so execute() is timed; every other call passes through.
+    on_write(rows) is called with the rows an insert/update/upsert/delete returned.
+    """
+    _OPERATIONS = ("select", "insert", "update", "upsert", "delete")
+
+    def __init__(self, builder, name, op=None, on_write=None):
+        self._builder = builder
+        self._name = name
+        self._op = op
+        self._on_write = on_write
+
+    def _execute(self, execute):
+        res = _metered(f"{self._name}.{self._op}" if self._op else self._name, execute)
+        if self._on_write and self._op not in (None, "select") and isinstance(res.data, list):
+            self._on_write(res.data)
+        return res
+
+    def __getattr__(self, attr):
+        value = getattr(self._builder, attr)
+        if attr == "execute":
+            return lambda: self._execute(value)
+        if hasattr(value, "execute"): # Properties such as .not_ return a builder
+            return _MeteredBuilder(value, self._name, self._op, self._on_write)
+        if not callable(value):
+            return value
+
+        def call(*args, **kwargs):
+            result = value(*args, **kwargs)
+            if hasattr(result, "execute"):
+                op = attr if attr in self._OPERATIONS else self._op
+                return _MeteredBuilder(result, self._name, op, self._on_write)
+            return result
+        return call
+
+
+class SupabaseBackend:
+    name = "supabase"
+
+    def __init__(self, url, key, http_client=None):
+        from supabase import create_client
+        from supabase.lib.client_options import SyncClientOptions
+        self.url, self.key = url, key
+        self.settings = http_settings()
+        self.http = http_client or create_http_client(self.settings)
+        self.client = create_client(url, key, SyncClientOptions(httpx_client=self.http))
+        self.feed = None
+
+    def subscribe_changes(self, on_change, on_state=None):
+        self.feed = RealtimeChangeFeed(self.url, self.key, on_change, on_state)
+        return self.feed
+
+    def _own_write(self, table, rows):
+        # Realtime sends one event per row: expected by row id (writes with returning="minimal"
+        # return no rows and are reported back as usual)
+        if self.feed is not None:
+            self.feed.expect(table, [r["id"] for r in rows if isinstance(r, dict) and r.get("id") is not None])
+
+    def table(self, name):
+        return _MeteredBuilder(self.client.table(name), name, on_write=lambda rows: self._own_write(name, rows))
+
+    def rpc(self, fn, params=None):
+        return _MeteredBuilder(self.client.rpc(fn, params or {}), f"rpc:{fn}")
+
+    def pool_stats(self):
+        stats = {"engine": self.name}
+        transport = self.http._transport
+        if isinstance(transport, CountingTransport):
+            stats.update(transport.stats())
+        stats.update({f"setting_{k.lower()}": v for k, v in self.settings.items()})
+        return stats
+
+
+# --- Change Feeds ---
+# A feed calls on_change(table) for every committed write to a watched table, from any process
+# or server, so the data layer can drop just the cached reads of that table. on_state(live)
+# reports whether the feed is currently delivering events (so callers know when to fall
+# back to TTL expiry). Both implementations run on a daemon thread.
+# Writes made by this process were already applied to its cache by the writer (bumped or
+# patched), so their events are not reported back: the backend marks them with expect() as it
+# writes and the feed drops the matching events. Only the written table is marked, the events of
+# cascades and triggers on other tables are still reported.
+ECHO_WINDOW_SECONDS = 10 # How long a write's events are waited for, then reported as usual
+
+class ChangeFeed:
+    def __init__(self, on_change, on_state=None):
+        self.on_change = on_change
+        self.on_state = on_state or (lambda live: None)
+        self.events = 0
+        self.echoes = 0
+        self.last_event_at = None
+        self.live = False
+        self.error = None
+        self._stop = threading.Event()
+        self._echo_lock = threading.Lock()
+        self._expected = {} # (table, key) -> [events still expected, deadline]
+        self._unclaimed = {} # (table, key) -> deadline, events that arrived before their expect()
+
+    def _prune(self, now):
+        self._expected = {k: v for k, v in self._expected.items() if v[1] >= now}
+        self._unclaimed = {k: v for k, v in self._unclaimed.items() if v >= now}
+
+    def expect(self, table, keys):
+        """Marks the events of a write made by this process (keys identify them, see subclasses)."""
+        now = time.monotonic()
+        with self._echo_lock:
+            self._prune(now)
+            for key in keys:
+                if self._unclaimed.pop((table, key), None):
+                    continue # Its event came first and was already reported
+                entry = self._expected.setdefault((table, key), [0, 0.0])
+                entry[0] += 1
+                entry[1] = now + ECHO_WINDOW_SECONDS
+
+    def _is_echo(self, table, key):
+        """True (and consumed) if the event is one of this process' own writes."""
+        now = time.monotonic()
+        with self._echo_lock:
+            entry = self._expected.get((table, key))
+            if entry is None or entry[1] < now:
+                if len(self._unclaimed) > 1024:
+                    self._prune(now)
+                self._unclaimed[(table, key)] = now + ECHO_WINDOW_SECONDS
+                return False
+            entry[0] -= 1
+            if not entry[0]:
+                del self._expected[(table, key)]
+            self.echoes += 1
+            return True
+
+    def _emit(self, table):
+        self.events += 1
+        self.last_event_at = time.time()
+        try:
+            self.on_change(table)
+        except Exception as e:
+            print(f"Change feed callback failed for {table}: {e}")
+
+    def _set_live(self, live, error=None):
+        self.error = str(error) if error else None
+        if live != self.live:
+            self.live = live
+            self.on_state(live)
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "live": self.live,
+            "events": self.events,
+            "echoes": self.echoes,
+            "last_event_at": self.last_event_at,
+            "error": self.error
+        }
+
+
+class RealtimeChangeFeed(ChangeFeed):
+    """Supabase Realtime postgres_changes on the public schema (tables must be in the publication)."""
+    kind = "realtime"
+
+    def __init__(self, url, key, on_change, on_state=None):
+        super().__init__(on_change, on_state)
+        self.url = f"{url.rstrip('/')}/realtime/v1"
+        self.key = key
+        threading.Thread(target=self._run, name="novenapp-realtime", daemon=True).start()
+
+    def _run(self):
+        import asyncio
+        while not self._stop.is_set():
+            try:
+                asyncio.run(self._listen())
+            except Exception as e:
+                self._set_live(False, e)
+                print(f"Realtime feed disconnected ({e}). Reconnecting in 10s.")
+            self._stop.wait(10)
+
+    async def _listen(self):
+        import asyncio
+        from realtime import AsyncRealtimeClient, RealtimeSubscribeStates
+        client = AsyncRealtimeClient(self.url, self.key, auto_reconnect=True)
+        channel = client.channel("novenapp-cache")
+
+        def on_payload(payload):
+            change = payload.get("data") or payload
+            table = change.get("table")
+            row = change.get("record") or change.get("old_record") or {}
+            if table and not self._is_echo(table, row.get("id")):
+                self._emit(table)
+
+        def on_subscribe(status, err):
+            self._set_live(status == RealtimeSubscribeStates.SUBSCRIBED, err)
+
+        channel.on_postgres_changes("*", on_payload, schema="public")
+        await channel.subscribe(on_subscribe)
+        try:
+            while not self._stop.is_set():
+                await asyncio.sleep(1)
+                if not client.is_connected:
+                    raise ConnectionError("Realtime socket closed")
+        finally:
+            self._set_live(False, self.error)
+            await client.close()
+
+
+class PollingChangeFeed(ChangeFeed):
+    """
+    SQLite stand-in for Realtime: triggers append to change_log (see schema.init_schema) and
+    this thread reads the rows past its id watermark. The watermark starts at the current
+    max(id), so only writes made after startup are reported. Own writes are expected by
+    change_log id (see LocalBackend.own_changes).
+    """
+    kind = "polling"
+    POLL_SECONDS = 1.0
+    RETENTION_HOURS = 1
+
+    def __init__(self, db_path, on_change, on_state=None, poll_seconds=POLL_SECONDS):
+        super().__init__(on_change, on_state)
+        self.db_path = db_path
+        self.poll_seconds = poll_seconds
+        self.watermark = 0
+        conn = sqlite3.connect(db_path, timeout=5)
+        try:
+            self.watermark = conn.execute("SELECT coalesce(max(id), 0) FROM change_log").fetchone()[0]
+        finally:
+            conn.close()
+        threading.Thread(target=self._run, name="novenapp-change-poll", daemon=True).start()
+
+    def poll_once(self, conn):
+        """Emits each table changed past the watermark once, however many rows changed."""
+        rows = conn.execute("SELECT id, table_name FROM change_log WHERE id > ? ORDER BY id", (self.watermark,)).fetchall()
+        changed = []
+        for change_id, table in rows:
+            if not self._is_echo(table, change_id) and table not in changed:
+                changed.append(table)
+            self.watermark = change_id
+        for table in changed:
+            self._emit(table)
+        return len(changed)
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+        polls = 0
+        try:
+            while not self._stop.wait(self.poll_seconds):
+                try:
+                    self.poll_once(conn)
+                    polls += 1
+                    if polls % 600 == 0:
+                        with conn:
+                            conn.execute(
+                                "DELETE FROM change_log WHERE changed_at < datetime('now', ?)",
+                                (f"-{self.RETENTION_HOURS} hours",)
+                            )
+                    self._set_live(True)
+                except sqlite3.Error as e:
+                    self._set_live(False, e)
+        finally:
+            conn.close()
+
+
+# --- Local SQLite ---
+
+LOCAL_RPC = {}
+
+def local_rpc(name):
+    """Registers the local implementation of a Postgres function callable via rpc()."""
+    def decorator(func):
+        LOCAL_RPC[name] = func
+        return func
+    return decorator
+
+
+def _quote(identifier):
+    if not _IDENTIFIER.match(identifier):
+        raise ValueError(f"Invalid identifier: {identifier!r}")
+    return f'"{identifier}"'
+
+
+def _to_sql_value(value):
+    """Converts numpy scalars, dates and friends to values sqlite3 can bind."""
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+        value = value.item() # numpy / pandas scalars
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def _split_columns(columns):
+    """Splits a PostgREST select string on top level commas."""
+    parts, depth, current = [], 0, ""
+    for ch in ",".join(columns):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += ch
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def _fk_column(relation):
+    """Foreign key that points to `relation` (projects -> project_id, users -> user_id)."""
+    return f"{relation[:-1] if relation.endswith('s') else relation}_id"
+
+
+class LocalQuery:
+    """Subset of the postgrest request builder implemented on SQLite."""
+
+    def __init__(self, backend, table):
+        self.backend = backend
+        _quote(table) # Validates the identifier
+        self.table = table
+        self.op = "select"
+        self.columns = ["*"]
+        self.embeds = [] # (alias, relation, [columns])
+        self.filters = [] # (sql, params)
+        self.orders = []
+        self.limit_n = None
+        self.offset_n = None
+        self.count = None
+        self.head = False
+        self.payload = None
+        self.returning = "representation"
+        self.on_conflict = ""
+        self.ignore_duplicates = False
+
+    # --- Operations ---
+    def select(self, *columns, count=None, head=None):
+        self.op = "select"
+        self.count = count
+        self.head = bool(head)
+        self.columns, self.embeds = [], []
+        for part in _split_columns(columns or ("*",)):
+            m = _EMBED.match(part)
+            if m:
+                alias, relation, inner = m.group(1) or m.group(2), m.group(2), m.group(3)
+                self.embeds.append((alias, relation, _split_columns([inner]) or ["*"]))
+            else:
+                self.columns.append(part)
+        if not self.columns and self.embeds:
+            self.columns = ["*"]
+        return self
+
+    def insert(self, json, count=None, returning="representation", upsert=False, default_to_null=True):
+        self.op = "upsert" if upsert else "insert"
+        self.payload = json if isinstance(json, list) else [json]
+        self.count = count
+        self.returning = str(getattr(returning, "value", returning))
+        return self
+
+    def upsert(self, json, count=None, returning="representation", ignore_duplicates=False, on_conflict="", default_to_null=True):
+        self.insert(json, count=count, returning=returning, upsert=True)
+        self.ignore_duplicates = ignore_duplicates
+        self.on_conflict = on_conflict
+        return self
+
+    def update(self, json, count=None, returning="representation"):
+        self.op = "update"
+        self.payload = json
+        self.count = count
+        self.returning = str(getattr(returning, "value", returning))
+        return self
+
+    def delete(self, count=None, returning="representation"):
+        self.op = "delete"
+        self.count = count
+        self.returning = str(getattr(returning, "value", returning))
+        return self
+
+    # --- Filters ---
+    def _filter(self, column, sql_op, value, suffix=""):
+        self.filters.append((f"{_quote(column)} {sql_op} ? {suffix}".rstrip(), [_to_sql_value(value)]))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, "=", value)
+
+    def neq(self, column, value):
+        return self._filter(column, "<>", value)
+
+    def gt(self, column, value):
+        return self._filter(column, ">", value)
+
+    def gte(self, column, value):
+        return self._filter(column, ">=", value)
+
+    def lt(self, column, value):
+        return self._filter(column, "<", value)
+
+    def lte(self, column, value):
+        return self._filter(column, "<=", value)
+
+    def like(self, column, pattern):
+        # Backslash escapes % and _ as in Postgres, where it is the default escape character
+        return self._filter(column, "LIKE", pattern, "ESCAPE '\\'")
+
+    def ilike(self, column, pattern):
+        # SQLite LIKE is already case insensitive for ASCII
+        return self.like(column, pattern)
+
+    def is_(self, column, value):
+        value = None if value in (None, "null") else value
+        if value is None:
+            self.filters.append((f"{_quote(column)} IS NULL", []))
+            return self
+        return self._filter(column, "IS", value)
+
+    def in_(self, column, values):
+        values = [_to_sql_value(v) for v in values]
+        if not values:
+            self.filters.append(("0", []))
+            return self
+        placeholders = ", ".join("?" for _ in values)
+        self.filters.append((f"{_quote(column)} IN ({placeholders})", values))
+        return self
+
+    # --- Modifiers ---
+    def order(self, column, desc=False, nullsfirst=None):
+        # PostgREST default: NULLS LAST ascending, NULLS FIRST descending
+        nulls_first = desc if nullsfirst is None else nullsfirst
+        direction = "DESC" if desc else "ASC"
+        self.orders.append(f"{_quote(column)} {direction} NULLS {'FIRST' if nulls_first else 'LAST'}")
+        return self
+
+    def limit(self, size):
+        self.limit_n = int(size)
+        return self
+
+    def range(self, start, end):
+        self.offset_n = int(start)
+        self.limit_n = int(end) - int(start) + 1
+        return self
+
+    # --- Execution ---
+    def _where(self):
+        if not self.filters:
+            return "", []
+        sql = " WHERE " + " AND ".join(f for f, _ in self.filters)
+        params = [p for _, ps in self.filters for p in ps]
+        return sql, params
+
+    def execute(self):
+        return _metered(f"{self.table}.{self.op}", self._execute)
+
+    def _execute(self):
+        with self.backend.lock:
+            if self.op == "select":
+                return self._execute_select()
+            with self.backend.conn:
+                self.backend.own_changes(None) # Drop leftovers of writes not made through here (rpc)
+                res = getattr(self, f"_execute_{self.op}")()
+                # Before the commit, so the polling thread can't see the rows before they're expected
+                self.backend.own_changes(self.table)
+                return res
+
+    def _execute_select(self):
+        conn = self.backend.conn
+        where, params = self._where()
+        total = None
+        if self.count:
+            total = conn.execute(f"SELECT count(*) FROM {_quote(self.table)}{where}", params).fetchone()[0]
+        if self.head:
+            return Response([], total)
+
+        columns = list(self.columns)
+        hidden = []
+        if "*" not in columns:
+            for _, relation, _ in self.embeds:
+                fk = _fk_column(relation)
+                if fk not in columns:
+                    columns.append(fk)
+                    hidden.append(fk)
+        col_sql = ", ".join("*" if c == "*" else _quote(c) for c in columns)
+        sql = f"SELECT {col_sql} FROM {_quote(self.table)}{where}"
+        if self.orders:
+            sql += " ORDER BY " + ", ".join(self.orders)
+        if self.limit_n is not None:
+            sql += f" LIMIT {self.limit_n}"
+            if self.offset_n:
+                sql += f" OFFSET {self.offset_n}"
+        rows = [dict(r) for r in conn.execute(sql, params).fetchall()]
+
+        for alias, relation, rel_columns in self.embeds:
+            fk = _fk_column(relation)
+            ids = list({r[fk] for r in rows if r.get(fk) is not None})
+            related = {}
+            if ids:
+                rel_sql = "*" if "*" in rel_columns else ", ".join(_quote(c) for c in ["id"] + rel_columns)
+                placeholders = ", ".join("?" for _ in ids)
+                for r in conn.execute(f"SELECT {rel_sql} FROM {_quote(relation)} WHERE id IN ({placeholders})", ids):
+                    r = dict(r)
+                    related[r["id"]] = r if "*" in rel_columns else {c: r[c] for c in rel_columns}
+            for row in rows:
+                row[alias] = related.get(row.get(fk))
+        for row in rows:
+            for fk in hidden:
+                row.pop(fk, None)
+        return Response(rows, total if total is not None else None)
+
+    def _stamped(self, record):
+        """
+        Adds updated_at like Postgres' default / BEFORE UPDATE trigger does. The SQLite triggers
+        stamp it after the write, too late for RETURNING, so returned rows would carry the old value.
+        """
+        if self.table in schema.UPDATED_AT_TABLES and "updated_at" not in record:
+            record = {**record, "updated_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]}
+        return record
+
+    def _returning(self, rows):
+        count = len(rows) if self.count else None
+        return Response(rows if self.returning == "representation" else [], count)
+
+    def _execute_insert(self):
+        conn = self.backend.conn
+        rows = []
+        for record in self.payload:
+            record = self._stamped(record)
+            cols = list(record.keys())
+            col_sql = ", ".join(_quote(c) for c in cols)
+            placeholders = ", ".join("?" for _ in cols)
+            sql = f"INSERT INTO {_quote(self.table)} ({col_sql}) VALUES ({placeholders})"
+            if self.op == "upsert":
+                target = f"({', '.join(_quote(c.strip()) for c in self.on_conflict.split(','))})" if self.on_conflict else ""
+                if self.ignore_duplicates:
+                    sql += f" ON CONFLICT {target} DO NOTHING"
+                else:
+                    updates = ", ".join(f"{_quote(c)} = excluded.{_quote(c)}" for c in cols)
+                    sql += f" ON CONFLICT {target} DO UPDATE SET {updates}"
+            cur = conn.execute(sql + " RETURNING *", [_to_sql_value(record[c]) for c in cols])
+            rows.extend(dict(r) for r in cur.fetchall())
+        return self._returning(rows)
+
+    _execute_upsert = _execute_insert
+
+    def _execute_update(self):
+        where, params = self._where()
+        payload = self._stamped(self.payload)
+        cols = list(payload.keys())
+        set_sql = ", ".join(f"{_quote(c)} = ?" for c in cols)
+        values = [_to_sql_value(payload[c]) for c in cols]
+        cur = self.backend.conn.execute(
+            f"UPDATE {_quote(self.table)} SET {set_sql}{where} RETURNING *", values + params
+        )
+        return self._returning([dict(r) for r in cur.fetchall()])
+
+    def _execute_delete(self):
+        where, params = self._where()
+        cur = self.backend.conn.execute(f"DELETE FROM {_quote(self.table)}{where} RETURNING *", params)
+        return self._returning([dict(r) for r in cur.fetchall()])
+
+
+class LocalRPC:
+    def __init__(self, backend, fn, params):
+        self.backend = backend
+        self.fn = fn
+        self.params = params
+
+    def execute(self):
+        return _metered(f"rpc:{self.fn}", self._execute)
+
+    def _execute(self):
+        if self.fn not in LOCAL_RPC:
+            raise LookupError(f"Could not find the function {self.fn} in the local backend")
+        with self.backend.lock:
+            return Response(LOCAL_RPC[self.fn](self.backend.conn, **self.params))
+
+
+class LocalBackend:
+    name = "sqlite"
+
+    def __init__(self, db_path=schema.DB_NAME):
+        self.db_path = db_path
+        schema.init_schema(db_path)
+        migrations.migrate_sqlite(db_path)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.RLock()
+        self.feed = None
+        # change_log rows written through this connection (TEMP objects are per connection),
+        # so the change feed can tell this process' own writes apart
+        self.conn.executescript("""
+            CREATE TEMP TABLE own_changes (id INTEGER, table_name TEXT);
+            CREATE TEMP TRIGGER own_changes_log AFTER INSERT ON main.change_log
+            BEGIN INSERT INTO own_changes VALUES (NEW.id, NEW.table_name); END;
+        """)
+
+    def own_changes(self, table):
+        """Takes the change_log ids logged by this connection; those of `table` are expected by the feed."""
+        rows = self.conn.execute("DELETE FROM temp.own_changes RETURNING id, table_name").fetchall()
+        if table and self.feed is not None:
+            self.feed.expect(table, [change_id for change_id, name in rows if name == table])
+
+    def table(self, name):
+        return LocalQuery(self, name)
+
+    def pool_stats(self):
+        return {"engine": self.name, "database": self.db_path}
+
+    def subscribe_changes(self, on_change, on_state=None):
+        self.feed = PollingChangeFeed(self.db_path, on_change, on_state)
+        return self.feed
+
+    def rpc(self, fn, params=None):
+        return LocalRPC(self, fn, params or {})
+
+    def execute_sql(self, query, params=None):
+        """Runs raw SQL (legacy run_query callers). Returns rows for SELECT, else lastrowid."""
+        with self.lock, self.conn:
+            cur = self.conn.execute(query, [_to_sql_value(p) for p in (params or ())])
+            if cur.description:
+                return [dict(r) for r in cur.fetchall()]
+            return cur.lastrowid
+
+
+# --- Local implementations of the Postgres functions in supabase_setup.sql ---
+
+@local_rpc("get_kpi_summary")
+def _rpc_get_kpi_summary(conn):
+    return [dict(r) for r in conn.execute("SELECT * FROM kpi_summary")]
+
+
+@local_rpc("increment_counter")
+def _rpc_increment_counter(conn, p_key, p_amount=1, p_limit=None):
+    amount = int(p_amount)
+    with conn: # The INSERT takes the write lock, so the read and the update can't interleave
+        conn.execute("INSERT INTO usage_counters (key, value) VALUES (?, 0) ON CONFLICT (key) DO NOTHING", (p_key,))
+        current = conn.execute("SELECT value FROM usage_counters WHERE key = ?", (p_key,)).fetchone()[0]
+        granted = amount if p_limit is None else min(amount, max(int(p_limit) - current, 0))
+        conn.execute(
+            "UPDATE usage_counters SET value = value + ?, updated_at = CURRENT_TIMESTAMP WHERE key = ?",
+            (granted, p_key)
+        )
+    return [{"value": current + granted, "granted": granted}]
+
+
+@local_rpc("delete_project_cascade")
+def _rpc_delete_project_cascade(conn, p_project_id):
+    pid = int(p_project_id)
+    subs = "SELECT id FROM subcontractors WHERE project_id = ?"
+    tenders = "SELECT id FROM tenders WHERE project_id = ?"
+    contracts = f"SELECT id FROM contracts WHERE tender_id IN ({tenders})"
+    steps = [
+        ("project_assignments", "project_id = ?"),
+        ("tasks", "project_id = ?"),
+        ("quality_logs", "project_id = ?"),
+        ("phases", "project_id = ?"),
+        ("compliance_documents", f"subcontractor_id IN ({subs})"),
+        ("subcontractors", "project_id = ?"),
+        ("lab_tests", "project_id = ?"),
+        ("expenses", "project_id = ?"),
+        ("faenas", "project_id = ?"),
+        ("purchase_orders", "project_id = ?"),
+        ("guarantees", f"contract_id IN ({contracts})"),
+        ("contracts", f"tender_id IN ({tenders})"),
+        ("tenders", "project_id = ?"),
+        ("budget_items", "project_id = ?"),
+        ("comments", "project_id = ?"),
+        ("projects", "id = ?"),
+    ]
+    result = []
+    with conn: # Single transaction, rolled back on any error
+        for table, condition in steps:
+            cur = conn.execute(f"DELETE FROM {table} WHERE {condition}", (pid,))
+            result.append({"table_name": table, "deleted_count": cur.rowcount})
+    return result
+
+
+# --- Factory ---
+
+def create_backend():
+    """Builds the backend selected by env NOVENAPP_BACKEND or secrets [backend] ENGINE."""
+    engine = os.environ.get("NOVENAPP_BACKEND") or _secret("backend", "ENGINE", "supabase")
+    if engine.lower() in ("sqlite", "local"):
+        db_path = os.environ.get("NOVENAPP_DB_PATH") or _secret("backend", "SQLITE_PATH", schema.DB_NAME)
+        return LocalBackend(db_path)
+    return SupabaseBackend(st.secrets["supabase"]["URL"], st.secrets["supabase"]["KEY"])
@@ -63,9 +63,9 @@ def get_compliance_stats(project_id=None):
                      is_vencido = True
                  elif d['status'] == 'Vigente':
                      # Check date
-                     if d['expiration_date']:
+                     if pd.notna(d['expiration_date']):
                          try:
-                             exp = datetime.strptime(d['expiration_date'], '%Y-%m-%d').date()
+                             exp = d['expiration_date'].date()
                              days = (exp - today).days
                              if days < 0:
                                  is_vencido = True
@@ -1,48 +1,844 @@
 import streamlit as st
-from supabase import create_client, Client
 import pandas as pd
 from datetime import datetime
 import time
+import copy
+import functools
+import inspect
+import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import httpx
 import httpcore
+from modules import backend, metrics, schema
 
-# Initialize Supabase Client
+# Initialize the storage backend (Supabase by default, SQLite when NOVENAPP_BACKEND=sqlite).
+# The module level name stays `supabase` because every accessor and a few scripts use it.
 @st.cache_resource
 def init_supabase():
-    url = st.secrets["supabase"]["URL"]
-    key = st.secrets["supabase"]["KEY"]
-    return create_client(url, key)
+    return backend.create_backend()
+
+supabase = init_supabase()
+
+# Transport level failures: the request never got an answer (refused, reset, timed out, cut off
+# mid response). Classified by type, httpx wraps socket errors such as EAGAIN in these.
+NETWORK_ERRORS = (
+    httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError,
+    httpcore.TimeoutException, httpcore.NetworkError, httpcore.RemoteProtocolError,
+)
+# Failures before the request was sent (no connection, no free pool slot)
+CONNECT_ERRORS = (
+    httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout,
+    httpcore.ConnectError, httpcore.ConnectTimeout, httpcore.PoolTimeout,
+)
+
+def is_network_error(e):
+    """True for connection level errors, timeouts included: the server gave no answer."""
+    return isinstance(e, NETWORK_ERRORS)
+
+def is_connect_error(e):
+    """True when the request never reached the server (safe to retry even for inserts)."""
+    return isinstance(e, (CircuitOpenError,) + CONNECT_ERRORS)
+
+# --- Retry Policy ---
+# Network errors are retried with exponential backoff and full jitter (sleep a random time
+# in [0, min(cap, base * 2^attempt)]), within a total time budget per call so a page never
+# hangs for long. A process-wide circuit breaker fails fast while the database is down
+# instead of letting every session wait out its own retries.
+# The deadline bounds the retries: no backoff sleep or new attempt starts past it. An attempt
+# already running is bounded by the HTTP timeouts (backend.http_settings) instead, since one
+# call may be a paged read of many requests that is healthy however long it takes.
+RETRY_MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 0.25 # seconds
+RETRY_MAX_DELAY = 2.0
+RETRY_DEADLINE_SECONDS = 8.0
+BREAKER_FAILURE_THRESHOLD = 5 # Consecutive failed calls (retries exhausted) that open the circuit
+BREAKER_RESET_SECONDS = 30 # Time open before letting one trial call through
+BREAKER_PROBE_TIMEOUT_SECONDS = 2 * RETRY_DEADLINE_SECONDS # A trial call silent for longer is presumed lost
+
+class CircuitOpenError(ConnectionError):
+    """Raised without touching the network while the circuit breaker is open."""
+
+class CircuitBreaker:
+    """
+    Closed -> open after N consecutive failures -> half open (one trial) after a cooldown.
+    The trial call must settle() its outcome; one that never does is replaced after probe_timeout.
+    """
 
-supabase: Client = init_supabase()
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_SECONDS,
+                 probe_timeout=BREAKER_PROBE_TIMEOUT_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+
+    def before_call(self):
+        """Raises CircuitOpenError to fail fast. Returns True when this call is the half open trial."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "open":
+                if now - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    remaining = self.reset_timeout - (now - self.opened_at)
+                    raise CircuitOpenError(f"Database unavailable, retrying in {remaining:.0f}s (circuit open)")
+                self.state = "half_open" # Let this call probe the database
+                self.probe_started_at = now
+                return True
+            if self.state == "half_open":
+                if now - self.probe_started_at < self.probe_timeout:
+                    self.rejected += 1
+                    raise CircuitOpenError("Database unavailable (circuit half open, probe in progress)")
+                self.probe_started_at = now # The trial never reported back, this call takes over
+                return True
+            return False
+
+    def settle(self, probe, reached):
+        """
+        Records a call's outcome: reached True (the server answered), False (network failure) or
+        None (unknown, e.g. interrupted). An unknown trial reopens the circuit without a new
+        cooldown, so the next call probes again.
+        """
+        if reached is True:
+            self.record_success()
+        elif reached is False:
+            self.record_failure()
+        elif probe:
+            with self._lock:
+                if self.state == "half_open":
+                    self.state = "open"
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.trips += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "trips": self.trips,
+                "rejected_calls": self.rejected
+            }
+
+_breaker = CircuitBreaker()
+# Calls made inside a guarded call (an accessor calling another, a write reading a lookup) run
+# under the outer call's retry loop and breaker trial, so they skip both
+_breaker_local = threading.local()
+
+def _guarded_depth():
+    return getattr(_breaker_local, "depth", 0)
+
+def get_breaker_stats():
+    return _breaker.stats()
+
+def get_pool_stats():
+    """HTTP connection pool counters of the active backend (see backend.create_http_client)."""
+    return supabase.pool_stats()
+
+def call_with_retry(func, *args, idempotent=True, deadline=RETRY_DEADLINE_SECONDS, attempts=RETRY_MAX_ATTEMPTS, **kwargs):
+    """
+    Calls func(*args, **kwargs) under the retry policy and the circuit breaker.
+    Non idempotent calls (inserts) are only retried when the connection was never
+    established, since a read error or timeout after sending may mean the row was written.
+    The breaker sees one outcome per call: a failure once the retries are given up, so a
+    blip that a retry gets through doesn't count. The half open trial isn't retried.
+    """
+    if _guarded_depth():
+        return func(*args, **kwargs)
+    start = time.monotonic()
+    for attempt in range(attempts):
+        probe = _breaker.before_call()
+        reached, error, retry = None, None, False
+        _breaker_local.depth = 1
+        try:
+            result = func(*args, **kwargs)
+            reached = True
+        except CircuitOpenError:
+            raise # From a pool thread's call, says nothing about this one
+        except Exception as e:
+            reached = not is_network_error(e) # The server answered, the link is fine
+            if reached:
+                raise
+            error = e
+            delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+            retry = (
+                not probe and (idempotent or is_connect_error(e))
+                and attempt < attempts - 1 and time.monotonic() - start + delay <= deadline
+            )
+            if retry:
+                reached = None # Not an outcome yet
+        finally:
+            _breaker_local.depth = 0
+            _breaker.settle(probe, reached)
+        if error is None:
+            return result
+        if not retry:
+            raise error
+        name = getattr(func, "__name__", "query")
+        print(f"Database connection error in {name}: {error}. Retrying in {delay:.2f}s... (Attempt {attempt+1}/{attempts})")
+        time.sleep(delay)
+
+def retry_db(func=None, *, idempotent=True, deadline=RETRY_DEADLINE_SECONDS, attempts=RETRY_MAX_ATTEMPTS):
+    """
+    Decorator form of call_with_retry.
+    Use bare (@retry_db) for reads and idempotent writes (update/delete by key, upsert),
+    and @retry_db(idempotent=False) for inserts.
+    """
+    if func is None:
+        return lambda f: retry_db(f, idempotent=idempotent, deadline=deadline, attempts=attempts)
 
-def retry_db(func):
-    """Decorator to retry Supabase queries on connection error."""
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        retries = 5
-        base_delay = 2
-        for attempt in range(retries):
+        return call_with_retry(func, *args, idempotent=idempotent, deadline=deadline, attempts=attempts, **kwargs)
+    return wrapper
+
+# --- Query Cache ---
+# Process-wide read-through cache shared by every session. Entries are keyed by
+# accessor name + arguments + the current version of each table the accessor reads.
+# Writers bump the version of the tables they touch, so stale results are never served
+# and only the entries that depend on the written table are dropped.
+CACHE_MAX_ENTRIES = 256
+CACHE_TTL_SECONDS = 300 # Safety net for writes made outside this process
+
+class QueryCache:
+    """Bounded LRU cache with per-table versions and hit/miss counters."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict() # key -> (stored_at, tables, value)
+        self._versions = {}
+        self._generation = 0 # Advanced by clear(), covers tables with no recorded version
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.patches = 0
+
+    def make_key(self, name, tables, args, kwargs):
+        with self._lock:
+            versions = (self._generation,) + tuple(self._versions.get(t, 0) for t in tables)
+        return (name, versions, args, tuple(sorted(kwargs.items())))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[2]
+
+    def put(self, key, tables, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), tables, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def bump(self, *tables):
+        """Advances the version of each table and drops the entries that read from it."""
+        with self._lock:
+            for t in tables:
+                self._versions[t] = self._versions.get(t, 0) + 1
+            stale = [k for k, (_, deps, _) in self._entries.items() if set(deps) & set(tables)]
+            for k in stale:
+                del self._entries[k]
+            self.invalidations += len(stale)
+
+    def entries_for(self, table):
+        """(key, value) of the entries that read from table."""
+        with self._lock:
+            return [(k, v) for k, (_, deps, v) in self._entries.items() if table in deps]
+
+    def patch(self, table, patched):
+        """
+        Like bump(table), but the entries in patched ({key: new value}) are kept under the new
+        version instead of dropped. Keys are the ones read with entries_for; an entry that changed
+        in between (another write) is no longer under that key and is dropped as usual, and so is
+        one stored under an older version (a read that was in flight across a bump).
+        """
+        with self._lock:
+            old = self._versions.get(table, 0)
+            self._versions[table] = old + 1
+            for key in [k for k, (_, deps, _) in self._entries.items() if table in deps]:
+                stored_at, deps, _ = self._entries.pop(key)
+                name, versions, args, kwargs = key
+                if key not in patched or versions[0] != self._generation or versions[1 + deps.index(table)] != old:
+                    self.invalidations += 1
+                    continue
+                versions = list(versions)
+                versions[1 + deps.index(table)] = old + 1 # versions[0] is the generation
+                self._entries[(name, tuple(versions), args, kwargs)] = (stored_at, deps, patched[key])
+                self.patches += 1
+
+    def clear(self):
+        with self._lock:
+            self.bump(*self._versions.keys())
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total * 100) if total else 0,
+                "evictions": self.evictions,
+                "ttl": self.ttl,
+                "invalidations": self.invalidations,
+                "patches": self.patches,
+                "table_versions": dict(self._versions)
+            }
+
+    def memory(self):
+        """(accessor, rows, bytes) of each cached DataFrame, measured deep (string contents included)."""
+        with self._lock:
+            entries = [(key[0], value) for key, (_, _, value) in self._entries.items()]
+        return [(name, len(v), int(v.memory_usage(deep=True).sum())) for name, v in entries if isinstance(v, pd.DataFrame)]
+
+_query_cache = QueryCache()
+
+def _read_through(key, tables, func, args, kwargs):
+    found, value = _query_cache.get(key)
+    if found:
+        # Callers mutate the frames they receive (e.g. parsing dates in place)
+        return copy.deepcopy(value)
+    value = func(*args, **kwargs)
+    _query_cache.put(key, tables, copy.deepcopy(value))
+    return value
+
+def cached_query(*tables):
+    """Decorator: serves a get_* accessor from the shared cache until one of `tables` changes."""
+    def decorator(func):
+        @functools.wraps(func)
+        @metrics.timed("data", func.__name__)
+        def wrapper(*args, **kwargs):
+            key = _query_cache.make_key(func.__qualname__, tables, args, kwargs)
             try:
+                hash(key)
+            except TypeError:
+                # Unhashable argument, skip the cache
                 return func(*args, **kwargs)
-            except Exception as e:
-                # Check for ReadError, Resource unavailable, or Network errors
-                error_msg = str(e)
-                # Catch specific network related errors or string matches
-                is_network_error = (
-                    "Resource temporarily unavailable" in error_msg or 
-                    "ReadError" in error_msg or 
-                    "ConnectError" in error_msg or
-                    isinstance(e, (httpx.ReadError, httpx.ConnectError, httpcore.ReadError, httpcore.ConnectError))
-                )
-                
-                if is_network_error:
-                    if attempt < retries - 1:
-                        sleep_time = base_delay * (attempt + 1)
-                        print(f"Database connection error: {e}. Retrying in {sleep_time}s... (Attempt {attempt+1}/{retries})")
-                        time.sleep(sleep_time)
-                        continue
-                raise e
-        return func(*args, **kwargs)
-    return wrapper
+            scope = current_run()
+            if scope is not None:
+                return scope.do(key, lambda: _read_through(key, tables, func, args, kwargs))
+            return _read_through(key, tables, func, args, kwargs)
+        return wrapper
+    return decorator
+
+def invalidates(*tables):
+    """Decorator: bumps the cache version of `tables` after a write (even a failed one)."""
+    def decorator(func):
+        @functools.wraps(func)
+        @metrics.timed("data", func.__name__)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _query_cache.bump(*tables)
+        return wrapper
+    return decorator
+
+def invalidate_cache(*tables):
+    """Drops cached results for the given tables, or everything if none are given."""
+    if tables:
+        _query_cache.bump(*tables)
+    else:
+        _query_cache.clear()
+    if not tables or "system_config" in tables:
+        _config_store.invalidate()
+
+def get_cache_stats():
+    return _query_cache.stats()
+
+def get_cache_memory():
+    """Memory held by cached DataFrames per accessor, largest first."""
+    df = pd.DataFrame(_query_cache.memory(), columns=["accessor", "rows", "bytes"])
+    out = df.groupby("accessor").agg(entries=("rows", "size"), rows=("rows", "sum"), kb=("bytes", "sum"))
+    out["kb"] = out["kb"] / 1024
+    return out.sort_values("kb", ascending=False).reset_index().round(1)
+
+def table_version(table):
+    """Current cache version of a table; it changes on every write seen by this process."""
+    return _query_cache.make_key("", (table,), (), {})[1]
+
+# --- Write-Through ---
+# A form write used to bump its table, which dropped every cached read of it, so the rerun
+# right after the write refetched whole tables. Writers marked @writes_through return the
+# rows the database wrote (Prefer: return=representation) and those rows are merged into
+# the cached frames of the @patchable accessors instead: upserted by id (or dropped for a
+# delete), filtered by the accessor's arguments, typed, re-sorted, and kept under the new
+# table version. Anything else that reads the table (joins, aggregates, projections the
+# rows can't fill) is dropped as before.
+# The change feed doesn't report our own writes back (backend.ChangeFeed.expect), so the
+# patched entries stay until another process writes the table.
+_PATCHABLE = {} # accessor name -> how to patch its frames
+
+def patchable(table, order_by=None, desc=False, derived=None):
+    """
+    Decorator (above @cached_query): writers of `table` patch this accessor's cached frames.
+    Arguments named like a column of the table filter the rows (falsy means all), page_size
+    and columns don't change which rows are read. order_by/desc repeat the accessor's sort.
+    derived: {column: (key_column, lookup, default)} for joined columns, lookup() returns a
+    Series indexed by id, e.g. the project name of project_id.
+    """
+    def decorator(func):
+        _PATCHABLE[func.__qualname__] = {
+            "table": table, "signature": inspect.signature(func),
+            "order_by": order_by, "desc": desc, "derived": derived or {}
+        }
+        return func
+    return decorator
+
+def _same_id(a, b):
+    try:
+        return int(a) == int(b)
+    except (TypeError, ValueError):
+        return str(a) == str(b)
+
+def _patch_frame(df, spec, key, rows, delete):
+    """The cached frame with the written rows merged in, or None if it can't be patched."""
+    if not isinstance(df, pd.DataFrame) or df.empty or "id" not in df.columns:
+        return None # Empty results are placeholder frames, not the columns a read returns
+    table = spec["table"]
+    bound = spec["signature"].bind(*key[2], **dict(key[3]))
+    bound.apply_defaults()
+    filters = {}
+    for name, value in bound.arguments.items():
+        if name in ("page_size", "columns"):
+            continue
+        if name in schema.TABLES[table]:
+            if value:
+                filters[name] = value
+        elif value != spec["signature"].parameters[name].default:
+            return None # An argument we don't know how to apply
+
+    written = [r for r in rows if r.get("id") is not None]
+    out = df[~df["id"].isin([r["id"] for r in written])]
+    keep = [] if delete else [r for r in written if all(_same_id(r.get(c), v) for c, v in filters.items())]
+    if keep:
+        new = pd.DataFrame(keep)
+        for column, (key_column, lookup, default) in spec["derived"].items():
+            if column in df.columns:
+                new[column] = new[key_column].map(lookup()).fillna(default)
+                if not isinstance(df[column].dtype, pd.CategoricalDtype):
+                    new[column] = new[column].astype(df[column].dtype)
+        if not set(df.columns) <= set(new.columns):
+            return None
+        new = apply_dtypes(new, table)[list(df.columns)]
+        out = pd.concat([out, new], ignore_index=True) if not out.empty else new
+        # A categorical can't take a new label through concat (it falls back to object):
+        # re-cast, the categories become the union like a fresh read would have
+        for column in df.columns:
+            if isinstance(df[column].dtype, pd.CategoricalDtype) and not isinstance(out[column].dtype, pd.CategoricalDtype):
+                out[column] = out[column].astype("category")
+    # The written rows may have taken the last row of a label with them
+    for column in out.columns:
+        if isinstance(out[column].dtype, pd.CategoricalDtype):
+            out[column] = out[column].cat.remove_unused_categories()
+    if out.empty:
+        return None # A read with no rows returns the placeholder frame, refetch it
+    # Same order as a fresh read: id order, then the accessor's stable sort
+    out = out.sort_values("id", kind="stable")
+    return _sort_like_postgrest(out, spec["order_by"], spec["desc"]).reset_index(drop=True)
+
+def _apply_write(table, rows, delete=False):
+    if rows is None:
+        _query_cache.bump(table)
+        return
+    patched = {}
+    for key, value in _query_cache.entries_for(table):
+        spec = _PATCHABLE.get(key[0])
+        if spec is None or spec["table"] != table:
+            continue
+        try:
+            new = _patch_frame(value, spec, key, rows, delete)
+        except Exception as e:
+            print(f"Write-through of {key[0]} failed, it will be refetched: {e}")
+            new = None
+        if new is not None:
+            patched[key] = new
+    _query_cache.patch(table, patched)
+
+def writes_through(table, delete=False):
+    """
+    Decorator for a writer of `table` that returns the rows written (or deleted, delete=True):
+    patches the cached reads with them. A failed write bumps the table like @invalidates.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        @metrics.timed("data", func.__name__)
+        def wrapper(*args, **kwargs):
+            try:
+                rows = func(*args, **kwargs)
+            except BaseException:
+                _query_cache.bump(table)
+                raise
+            _apply_write(table, rows, delete)
+            return rows
+        return wrapper
+    return decorator
+
+def _project_names():
+    return get_projects(("name",)).set_index("id")["name"]
+
+def _usernames():
+    users = get_all_users()
+    return users.set_index("id")["username"] if not users.empty else pd.Series(dtype=object)
+
+# --- Change Feed ---
+# Writes from other sessions' processes, other servers or the SQL editor reach this process
+# through the backend's change feed (Supabase Realtime, or change_log polling on SQLite).
+# Each event bumps the version of one table, so only the cached reads of that table are
+# refetched. While the feed is live the TTL is only a long backstop for missed events.
+# Events of this process' own writes are dropped by the feed (see backend.ChangeFeed.expect):
+# the writer already bumped or patched the cache, a second bump would only refetch.
+CACHE_TTL_WITH_FEED_SECONDS = 1800
+
+def _on_table_changed(table):
+    _query_cache.bump(table)
+    if table == "system_config":
+        _config_store.invalidate()
+
+def _on_feed_state(live):
+    _query_cache.ttl = CACHE_TTL_WITH_FEED_SECONDS if live else CACHE_TTL_SECONDS
+    print(f"Change feed {'live' if live else 'down'}, cache TTL {_query_cache.ttl}s.")
+
+@st.cache_resource
+def start_change_feed():
+    """Subscribes this process to the backend's change feed (once, shared by all sessions)."""
+    try:
+        return supabase.subscribe_changes(_on_table_changed, _on_feed_state)
+    except Exception as e:
+        print(f"Change feed unavailable ({e}). Relying on cache TTL.")
+        return None
+
+def get_change_feed_stats():
+    feed = start_change_feed()
+    return feed.stats() if feed is not None else None
+
+# --- Single-Flight Reads ---
+# Within one script run, identical reads share one result: the first caller fetches, callers
+# that arrive while it is in flight wait for it, and later callers get a copy of it. This
+# covers what the TTL cache can't: concurrent misses on the same key (dashboard widgets on the
+# pool threads) and entries evicted or expired halfway through a page. Keys are the cache keys,
+# so a write made during the run bumps the table version and the next read fetches again.
+class SingleFlight:
+    """Per-run registry of reads, keyed like the query cache."""
+
+    def __init__(self):
+        self._calls = {} # key -> [done Event, value, error]
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.shared = 0
+        self.waited = 0
+
+    def do(self, key, fetch):
+        with self._lock:
+            call = self._calls.get(key)
+            owner = call is None
+            if owner:
+                call = self._calls[key] = [threading.Event(), None, None]
+                self.fetches += 1
+            else:
+                self.shared += 1
+                if not call[0].is_set():
+                    self.waited += 1
+        if owner:
+            try:
+                value = fetch()
+                call[1] = copy.deepcopy(value)
+                return value
+            except BaseException as e:
+                # Don't keep the failure, a later call in the run may retry
+                call[2] = e
+                with self._lock:
+                    self._calls.pop(key, None)
+                raise
+            finally:
+                call[0].set()
+                _flight_totals.add(fetches=1)
+        call[0].wait()
+        _flight_totals.add(duplicates_avoided=1)
+        if call[2] is not None:
+            raise call[2]
+        return copy.deepcopy(call[1])
+
+    def stats(self):
+        with self._lock:
+            return {"fetches": self.fetches, "duplicates_avoided": self.shared, "waited_in_flight": self.waited}
+
+class _FlightTotals:
+    """Process-wide counters across all runs, for the admin panel."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"runs": 0, "fetches": 0, "duplicates_avoided": 0}
+
+    def add(self, **deltas):
+        with self._lock:
+            for k, v in deltas.items():
+                self.counts[k] += v
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+_flight_totals = _FlightTotals()
+_run_local = threading.local()
+
+def begin_run():
+    """Opens a fresh single-flight scope for the current script run (call at the top of app.py)."""
+    _run_local.scope = SingleFlight()
+    _flight_totals.add(runs=1)
+    return _run_local.scope
+
+def current_run():
+    """The single-flight scope of this thread's script run, or None outside a run."""
+    return getattr(_run_local, "scope", None)
+
+def get_single_flight_stats():
+    scope = current_run()
+    return {
+        "run": scope.stats() if scope is not None else {"fetches": 0, "duplicates_avoided": 0, "waited_in_flight": 0},
+        "totals": _flight_totals.stats()
+    }
+
+# --- Paged Reads ---
+# PostgREST caps every response at its max-rows setting (1000 by default), so a plain
+# select().execute() silently truncates large tables. These readers walk the table with
+# keyset pagination on id (WHERE id > last_id ORDER BY id LIMIT n), which stays fast at any
+# depth, unlike offset paging, and never skips or repeats rows.
+POSTGREST_MAX_ROWS = 1000 # Must match the max-rows setting of the API (Settings > API)
+DEFAULT_PAGE_SIZE = POSTGREST_MAX_ROWS
+
+def iter_records(table, columns="*", page_size=DEFAULT_PAGE_SIZE, keyset="id", after=None, where=None, **eq_filters):
+    """
+    Yields lists of row dicts, one page at a time. Filters with a None value are skipped.
+    keyset is the unique column the walk is ordered by (e.g. 'key' for system_config).
+    after starts the walk past a known key; where(query) adds any other filter.
+    """
+    # A page larger than max-rows would come back short and end the walk early
+    page_size = max(1, min(int(page_size), POSTGREST_MAX_ROWS))
+    last_id = after
+    while True:
+        query = supabase.table(table).select(columns)
+        for col, val in eq_filters.items():
+            if val is not None:
+                query = query.eq(col, val)
+        if where is not None:
+            query = where(query)
+        if last_id is not None:
+            query = query.gt(keyset, last_id)
+        rows = query.order(keyset).limit(page_size).execute().data
+        if not rows:
+            return
+        yield rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1][keyset]
+
+def iter_pages(table, columns="*", page_size=DEFAULT_PAGE_SIZE, **eq_filters):
+    """Same as iter_records but yields a DataFrame per page."""
+    for rows in iter_records(table, columns, page_size, **eq_filters):
+        yield pd.DataFrame(rows)
+
+def read_paged(table, columns="*", page_size=DEFAULT_PAGE_SIZE, order_by=None, desc=False, **eq_filters):
+    """
+    Reads every matching row page by page and returns one DataFrame.
+    order_by is applied after the read (pages come in id order) with PostgREST null ordering.
+    """
+    pages = [df for df in iter_pages(table, columns, page_size, **eq_filters) if not df.empty]
+    if not pages:
+        return pd.DataFrame()
+    df = pd.concat(pages, ignore_index=True) if len(pages) > 1 else pages[0]
+    return _sort_like_postgrest(df, order_by, desc)
+
+def flatten_relations(data, relations, defaults=None):
+    """
+    Turns PostgREST embedded relations (columns holding a dict or None) into flat columns.
+    data: DataFrame or list of row dicts.
+    relations: {embedded_column: {field: flat_column}}, e.g. {"project": {"name": "project_name"}}.
+    defaults: {flat_column: value} used where the relation is null (otherwise None).
+    Each field is extracted with one vectorized Series.str.get pass and the embedded
+    columns are dropped, so no per-row Python dicts are built.
+    """
+    df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+    defaults = defaults or {}
+    flat = {}
+    for source, fields in relations.items():
+        nested = df[source] if source in df.columns else None
+        for field, target in fields.items():
+            if nested is not None and nested.dtype == object:
+                values = nested.str.get(field)
+            else:
+                # Missing or all-null relation
+                values = pd.Series(None, index=df.index, dtype=object)
+            if target in defaults:
+                values = values.where(values.notna(), defaults[target])
+            flat[target] = values
+    df = df.drop(columns=[c for c in relations if c in df.columns])
+    return df.assign(**flat)
+
+def _sort_like_postgrest(df, order_by, desc=False):
+    if not order_by or order_by not in df.columns:
+        return df
+    # Stable sort keeps id order between ties. NULLS LAST ascending, NULLS FIRST descending
+    return df.sort_values(
+        order_by, ascending=not desc, kind="stable", na_position="first" if desc else "last"
+    ).reset_index(drop=True)
+
+# --- Typed Schema ---
+# Column projection and dtypes come from schema.TABLES (see modules/schema.py).
+def select_columns(table, columns=None, required=("id",)):
+    """
+    Builds the select string for a projection (a tuple or comma separated names). None selects "*",
+    which also works on databases missing a newer column. `required` columns (keyset, sort keys)
+    are always included. Unknown names raise ValueError.
+    """
+    registered = schema.TABLES[table]
+    if columns is None:
+        return "*"
+    if isinstance(columns, str):
+        columns = [c.strip() for c in columns.split(",")]
+    unknown = [c for c in columns if c not in registered]
+    if unknown:
+        raise ValueError(f"Unknown columns for {table}: {unknown}")
+    wanted = list(dict.fromkeys([*required, *columns]))
+    return ", ".join(wanted)
+
+def apply_dtypes(df, table):
+    """Converts the registered columns of `table` present in df to their pandas dtype, in place."""
+    for col, kind in schema.TABLES[table].items():
+        if col not in df.columns:
+            continue
+        if kind == "date":
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+        elif kind == "datetime":
+            df[col] = pd.to_datetime(df[col], errors="coerce", utc=True, format="ISO8601").dt.tz_localize(None)
+        elif kind in ("int", "float"):
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+            if kind == "float":
+                df[col] = df[col].astype("float64")
+        elif kind == "category":
+            # Only the labels present: a frame cut from a larger one (mirror rows deleted) would
+            # otherwise list the dropped labels with 0 in value_counts()
+            df[col] = df[col].astype("category").cat.remove_unused_categories()
+    return df
+
+_EMPTY_DTYPES = {
+    "int": "int64", "float": "float64", "str": "object", "category": "category",
+    "date": "datetime64[ns]", "datetime": "datetime64[ns]"
+}
+
+def empty_frame(table, columns=None):
+    """Typed empty DataFrame with the table's columns (or a projection), so views never KeyError."""
+    registered = schema.TABLES[table]
+    names = list(registered) if columns is None else [c.strip() for c in select_columns(table, columns, required=()).split(",")]
+    return pd.DataFrame({c: pd.Series(dtype=_EMPTY_DTYPES[registered[c]]) for c in names})
+
+# --- Concurrent Reads ---
+# Independent reads (e.g. the dashboard widgets) run on a small shared thread pool, so a page
+# waits for its slowest query instead of the sum of all of them. The pool is bounded to stay
+# well inside the HTTP connection pool and the API rate limits.
+QUERY_POOL_SIZE = 6
+_query_pool = ThreadPoolExecutor(max_workers=QUERY_POOL_SIZE, thread_name_prefix="novenapp-query")
+
+def _run_timed(func, args, scope=None, depth=0):
+    # Pool threads outlive runs, so the caller's single-flight scope (and whether it runs inside
+    # a guarded call, see call_with_retry) is set per task
+    _run_local.scope = scope
+    _breaker_local.depth = depth
+    try:
+        start = time.perf_counter()
+        return func(*args), time.perf_counter() - start
+    finally:
+        _run_local.scope = None
+        _breaker_local.depth = 0
+
+def fetch_concurrently(calls):
+    """
+    Runs independent reads in parallel and returns (results, timings).
+    calls: {name: func} or {name: (func, arg1, ...)}.
+    results is {name: value}. timings is {name: seconds} plus 'total', the wall time of the batch.
+    The calls run in worker threads, so they must not use st.* (data accessors don't).
+    The first exception raised by a call propagates.
+    """
+    start = time.perf_counter()
+    scope = current_run()
+    futures = {}
+    for name, call in calls.items():
+        func, *args = call if isinstance(call, tuple) else (call,)
+        futures[name] = _query_pool.submit(_run_timed, func, args, scope, _guarded_depth())
+
+    results, timings = {}, {}
+    for name, future in futures.items():
+        results[name], timings[name] = future.result()
+    timings['total'] = time.perf_counter() - start
+    return results, timings
+
+# --- Bulk Writes ---
+# Imports send many rows per request instead of one HTTP call per row. Chunks stay well under
+# the API request size limit, and each chunk is one INSERT, so it lands or fails as a whole.
+BULK_INSERT_CHUNK_SIZE = 500
+
+def bulk_insert(table, records, chunk_size=BULK_INSERT_CHUNK_SIZE):
+    """
+    Inserts a list of row dicts in chunks and returns how many rows were written.
+    Chunks are not retried after they reach the server (no duplicate rows on a timeout).
+    The rows aren't sent back (returning="minimal"): callers only need the count.
+    """
+    inserted = 0
+    try:
+        for start in range(0, len(records), chunk_size):
+            chunk = records[start:start + chunk_size]
+            call_with_retry(supabase.table(table).insert(chunk, returning="minimal").execute, idempotent=False)
+            inserted += len(chunk)
+    finally:
+        _query_cache.bump(table)
+    return inserted
+
+# --- Local Mirror ---
+# The largest tables are read from a memory-mapped Arrow copy on disk that is delta-synced
+# (see modules/mirror.py). Any mirror failure falls back to the network query.
+def read_mirrored(table, columns=None):
+    """The whole table from the local mirror (typed), or None when the mirror is off or failed."""
+    from modules import mirror
+    if not mirror.enabled():
+        return None
+    try:
+        wanted = [c.strip() for c in select_columns(table, columns).split(",")] if columns else None
+        return mirror.read(table, wanted)
+    except Exception as e:
+        print(f"Mirror read of {table} failed, querying instead: {e}")
+        return None
 
 def init_db():
     """Checks if connection works. Logic moved to Supabase Management via SQL Editor."""
@@ -51,6 +847,8 @@ def init_db():
 # --- CRUD Functions ---
 
 # Projects
+@invalidates("projects")
+@retry_db(idempotent=False)
 def add_project(name, description, budget, start_date, end_date):
     data = {
         "name": name,
@@ -61,18 +859,61 @@ def add_project(name, description, budget, start_date, end_date):
     }
     supabase.table("projects").insert(data).execute()
 
+@cached_query("projects")
 @retry_db
-def get_projects():
-    response = supabase.table("projects").select("*").execute()
+def get_projects(columns=None):
+    df = read_mirrored("projects", columns)
+    if df is not None:
+        return df if not df.empty else empty_frame("projects", columns)
+    response = supabase.table("projects").select(select_columns("projects", columns)).execute()
     df = pd.DataFrame(response.data)
     if df.empty:
         # Return with expected columns to prevent KeyError in views
-        return pd.DataFrame(columns=[
-            'id', 'name', 'description', 'budget_total', 
-            'start_date', 'end_date', 'status', 'latitude', 'longitude'
-        ])
-    return df
+        return empty_frame("projects", columns)
+    return apply_dtypes(df, "projects")
+
+def _like_literal(text):
+    """text escaped to match itself inside a LIKE pattern (% and _ are wildcards, backslash escapes)."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
 
+# Project list: one page at a time, searched and sorted by the database, so the
+# overview costs the same with 20 projects or 2000
+PROJECT_SORT_COLUMNS = ("name", "budget_total", "start_date", "end_date", "status")
+PROJECTS_PAGE_SIZE = 20
+
+@cached_query("projects")
+@retry_db
+def get_projects_page(search="", order_by="name", desc=False, page=0, page_size=PROJECTS_PAGE_SIZE, columns=None):
+    """
+    Returns (DataFrame with one page of projects, total matching rows).
+    search matches the name (case insensitive); id breaks sort ties so pages never overlap.
+    With the local mirror on, the same filter/sort/slice runs on the mirrored table.
+    """
+    if order_by not in PROJECT_SORT_COLUMNS:
+        order_by = "name"
+    search = (search or "").strip()
+    start = max(int(page), 0) * page_size
+
+    df = read_mirrored("projects", columns)
+    if df is not None:
+        if search and not df.empty:
+            df = df[df["name"].str.contains(search, case=False, regex=False, na=False)]
+        df = _sort_like_postgrest(df.sort_values("id"), order_by, desc)
+        page_df = df.iloc[start:start + page_size].reset_index(drop=True)
+        return (page_df if not page_df.empty else empty_frame("projects", columns)), len(df)
+
+    query = supabase.table("projects").select(select_columns("projects", columns), count="exact")
+    if search:
+        query = query.ilike("name", f"%{_like_literal(search)}%")
+    response = query.order(order_by, desc=desc).order("id").range(start, start + page_size - 1).execute()
+    total = response.count or 0
+    df = pd.DataFrame(response.data)
+    if df.empty:
+        return empty_frame("projects", columns), total
+    return apply_dtypes(df, "projects"), total
+
+@invalidates("projects")
+@retry_db
 def update_project(project_id, name, description, budget, start_date, end_date, status="Activo", lat=-33.4489, lon=-70.6693):
     data = {
         "name": name, 
@@ -86,69 +927,100 @@ def update_project(project_id, name, description, budget, start_date, end_date,
     }
     supabase.table("projects").update(data).eq("id", project_id).execute()
 
+# Tables cleared when a project is deleted, in foreign key order (children first)
+PROJECT_CHILD_TABLES = (
+    "project_assignments", "tasks", "quality_logs", "phases", "compliance_documents",
+    "subcontractors", "lab_tests", "expenses", "faenas", "purchase_orders",
+    "guarantees", "contracts", "tenders", "budget_items", "comments"
+)
+# Tables created by later migrations that may not exist on older databases
+OPTIONAL_PROJECT_TABLES = ("compliance_documents", "lab_tests")
+IN_FILTER_CHUNK = 500 # Keeps in_() filters well below URL length limits
+
 def delete_project(project_id):
-    # Manual Cascade Deletion to handle Foreign Keys
+    """Deletes a project and everything linked to it. Returns True on success."""
     try:
-        # 1. Assignments
-        supabase.table("project_assignments").delete().eq("project_id", project_id).execute()
-        
-        # 2. Operational Data (Tasks, Quality)
-        supabase.table("tasks").delete().eq("project_id", project_id).execute()
-        supabase.table("quality_logs").delete().eq("project_id", project_id).execute()
-        supabase.table("phases").delete().eq("project_id", project_id).execute()
-        
-        # 2a. More Ops Data (Subcontractors & Lab Tests)
-        # Handle Compliance Docs before Subcontractors
-        try:
-             subs_res = supabase.table("subcontractors").select("id").eq("project_id", project_id).execute()
-             sub_ids = [s['id'] for s in subs_res.data]
-             if sub_ids:
-                 # Try to delete documents if table exists
-                 try: supabase.table("compliance_documents").delete().in_("subcontractor_id", sub_ids).execute()
-                 except: pass
-        except:
-             pass
-        
-        # Always attempt to delete subcontractors
-        supabase.table("subcontractors").delete().eq("project_id", project_id).execute() 
-             
-        try:
-             supabase.table("lab_tests").delete().eq("project_id", project_id).execute()
-        except:
-             pass # Lab tests might not exist or schema diff
-        
-        # 3. Resources/Expenses (Delete Expenses first as they link to Faenas)
-        supabase.table("expenses").delete().eq("project_id", project_id).execute()
-        supabase.table("faenas").delete().eq("project_id", project_id).execute()
-        
-        # 4. Purchase Orders
-        supabase.table("purchase_orders").delete().eq("project_id", project_id).execute()
-        
-        # 5. Tenders, Contracts & Guarantees (Deep Clean)
-        tenders_res = supabase.table("tenders").select("id").eq("project_id", project_id).execute()
-        for tender in tenders_res.data:
-            # Delete Contracts for this tender
-            contracts_res = supabase.table("contracts").select("id").eq("tender_id", tender['id']).execute()
-            for contract in contracts_res.data:
-                # Delete Guarantees
-                supabase.table("guarantees").delete().eq("contract_id", contract['id']).execute()
-                # Delete Contract
-                supabase.table("contracts").delete().eq("id", contract['id']).execute()
-            
-            # Delete Tender
-            supabase.table("tenders").delete().eq("id", tender['id']).execute()
-            
-        # 6. Budget Items & Comments (New)
-        supabase.table("budget_items").delete().eq("project_id", project_id).execute()
-        supabase.table("comments").delete().eq("project_id", project_id).execute()
-        
-        # Finally delete Project
-        supabase.table("projects").delete().eq("id", project_id).execute()
+        counts = delete_project_cascade(project_id)
+        print(f"Project {project_id} deleted: {counts}")
         return True
     except Exception as e:
         print(f"Error deleting project: {e}")
         return False
 
+@invalidates(*PROJECT_CHILD_TABLES, "projects")
+@retry_db
+def delete_project_cascade(project_id):
+    """
+    Deletes a project with all its dependent rows and returns {table: rows_deleted}.
+    Uses the delete_project_cascade RPC, which runs as a single transaction (all or nothing).
+    If the function is not installed, falls back to set-based deletes keyed by collected ids.
+    """
+    try:
+        res = supabase.rpc("delete_project_cascade", {"p_project_id": int(project_id)}).execute()
+        return {row['table_name']: int(row['deleted_count']) for row in res.data}
+    except Exception as e:
+        if is_network_error(e):
+            raise
+        print(f"Cascade RPC unavailable ({e}). Using batch delete fallback.")
+        return _delete_project_batched(project_id)
+
+def _chunks(ids, size=IN_FILTER_CHUNK):
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+def _delete_where(table, column, values):
+    """DELETE ... WHERE column IN (values) without returning the rows. Returns the row count."""
+    values = list(values)
+    deleted = 0
+    for chunk in _chunks(values):
+        res = supabase.table(table).delete(count="exact", returning="minimal").in_(column, chunk).execute()
+        deleted += res.count or 0
+    return deleted
+
+def _select_ids(table, column, values):
+    values = list(values)
+    ids = []
+    for chunk in _chunks(values):
+        res = supabase.table(table).select("id").in_(column, chunk).execute()
+        ids.extend(r['id'] for r in res.data)
+    return ids
+
+def _delete_project_batched(project_id):
+    """
+    Fallback for delete_project_cascade: a fixed number of requests regardless of project size
+    (3 id lookups + one DELETE per table). Not transactional, but stops at the first error
+    so no parent is removed while its children still exist.
+    """
+    pid = [project_id]
+    sub_ids = _select_ids("subcontractors", "project_id", pid)
+    tender_ids = _select_ids("tenders", "project_id", pid)
+    contract_ids = _select_ids("contracts", "tender_id", tender_ids) if tender_ids else []
+
+    # Child tables keyed by something other than project_id
+    keyed_by = {
+        "compliance_documents": ("subcontractor_id", sub_ids),
+        "guarantees": ("contract_id", contract_ids),
+        "contracts": ("id", contract_ids),
+        "tenders": ("id", tender_ids)
+    }
+
+    counts = {}
+    for table in PROJECT_CHILD_TABLES:
+        column, values = keyed_by.get(table, ("project_id", pid))
+        if not values:
+            counts[table] = 0
+            continue
+        try:
+            counts[table] = _delete_where(table, column, values)
+        except Exception as e:
+            if table in OPTIONAL_PROJECT_TABLES and not is_network_error(e):
+                counts[table] = 0 # Table not created on this database
+                continue
+            raise
+    counts["projects"] = _delete_where("projects", "id", pid)
+    return counts
+
+@cached_query("projects")
 @retry_db
 def get_projects_expiring_soon(days_threshold):
     """Returns active projects ending within the next X days."""
@@ -171,12 +1043,15 @@ def get_projects_expiring_soon(days_threshold):
             .lte("end_date", target_str)\
             .execute()
             
-        return pd.DataFrame(response.data)
+        return apply_dtypes(pd.DataFrame(response.data), "projects")
     except Exception as e:
+        if is_network_error(e):
+            raise
         print(f"Error checking project deadlines: {e}")
         return pd.DataFrame()
 
 # Contracts & Guarantees Expiration
+@cached_query("contracts")
 @retry_db
 def get_contracts_expiring_soon(days_threshold):
     try:
@@ -191,11 +1066,14 @@ def get_contracts_expiring_soon(days_threshold):
             .gte("end_date", today_str)\
             .lte("end_date", target_str)\
             .execute()
-        return pd.DataFrame(response.data)
+        return apply_dtypes(pd.DataFrame(response.data), "contracts")
     except Exception as e:
+        if is_network_error(e):
+            raise
         print(f"Error checking contracts: {e}")
         return pd.DataFrame()
 
+@cached_query("guarantees")
 @retry_db
 def get_guarantees_expiring_soon(days_threshold):
     try:
@@ -210,44 +1088,56 @@ def get_guarantees_expiring_soon(days_threshold):
             .gte("expiration_date", today_str)\
             .lte("expiration_date", target_str)\
             .execute()
-        return pd.DataFrame(response.data)
+        return apply_dtypes(pd.DataFrame(response.data), "guarantees")
     except Exception as e:
+        if is_network_error(e):
+            raise
         print(f"Error checking guarantees: {e}")
         return pd.DataFrame()
 
 # Faenas
+@writes_through("faenas")
+@retry_db(idempotent=False)
 def add_faena(project_id, name, supervisor):
     data = {
         "project_id": project_id,
         "name": name,
         "supervisor": supervisor
     }
-    supabase.table("faenas").insert(data).execute()
+    return supabase.table("faenas").insert(data, returning="representation").execute().data
 
+@patchable("faenas")
+@cached_query("faenas")
+@retry_db
 def get_faenas(project_id=None):
     query = supabase.table("faenas").select("*")
     if project_id:
         query = query.eq("project_id", project_id)
     response = query.execute()
-    return pd.DataFrame(response.data)
+    return apply_dtypes(pd.DataFrame(response.data), "faenas")
 
+@writes_through("faenas")
+@retry_db
 def update_faena(faena_id, name, supervisor):
     data = {"name": name, "supervisor": supervisor}
-    supabase.table("faenas").update(data).eq("id", faena_id).execute()
+    return supabase.table("faenas").update(data, returning="representation").eq("id", faena_id).execute().data
 
+@invalidates("expenses", "faenas")
 def delete_faena(faena_id):
     # Unlink expenses first to preserve financial record but remove faena tag
     # or Delete them? User deleted project implies deleting expenses, but deleting only Faena 
     # usually means just removing the operational front. We'll set to NULL to keep the expense in the project.
     try:
-        supabase.table("expenses").update({"faena_id": None}).eq("faena_id", faena_id).execute()
-        supabase.table("faenas").delete().eq("id", faena_id).execute()
+        call_with_retry(supabase.table("expenses").update({"faena_id": None}).eq("faena_id", faena_id).execute)
+        call_with_retry(supabase.table("faenas").delete().eq("id", faena_id).execute)
         return True
     except Exception as e:
         print(f"Error deleting faena: {e}")
         return False
 
 # Units
+@invalidates("units")
+@retry_db(idempotent=False)
 def add_unit(name, type, details):
     data = {
         "name": name,
@@ -256,10 +1146,14 @@ def add_unit(name, type, details):
     }
     supabase.table("units").insert(data).execute()
 
+@cached_query("units")
+@retry_db
 def get_units():
     response = supabase.table("units").select("*").execute()
-    return pd.DataFrame(response.data)
+    return apply_dtypes(pd.DataFrame(response.data), "units")
 
+@invalidates("units")
+@retry_db
 def update_unit(unit_id, name, type, details):
     data = {
         "name": name,
@@ -268,10 +1162,14 @@ def update_unit(unit_id, name, type, details):
     }
     supabase.table("units").update(data).eq("id", unit_id).execute()
 
+@invalidates("units")
+@retry_db
 def delete_unit(unit_id):
     supabase.table("units").delete().eq("id", unit_id).execute()
 
 # Expenses
+@invalidates("expenses")
+@retry_db(idempotent=False)
 def add_expense(date, project_id, faena_id, unit_id, category, amount, description):
     data = {
         "date": str(date),
@@ -284,143 +1182,193 @@ def add_expense(date, project_id, faena_id, unit_id, category, amount, descripti
     }
     supabase.table("expenses").insert(data).execute()
 
+@cached_query("expenses", "projects", "faenas", "units")
 @retry_db
-def get_expenses_df(project_id=None):
+def get_expenses_df(project_id=None, page_size=DEFAULT_PAGE_SIZE):
     # Supabase join syntax is: "col, relation(col)"
-    query = supabase.table("expenses").select(
-        "id, date, amount, category, description, project_id, project:projects(name), faena:faenas(name), unit:units(name)"
-    ).order("date", desc=True)
-    
-    if project_id:
-        query = query.eq("project_id", project_id)
-        
-    response = query.execute()
-    data = response.data
-    
-    # Flatten JSON structure for DataFrame
-    flat_data = []
-    for row in data:
-        new_row = row.copy()
-        new_row['project'] = row['project']['name'] if row.get('project') else None
-        new_row['faena'] = row['faena']['name'] if row.get('faena') else None
-        new_row['unit'] = row['unit']['name'] if row.get('unit') else None
-        flat_data.append(new_row)
-        
-    if not flat_data:
+    columns = "id, date, amount, category, description, project_id, project:projects(name), faena:faenas(name), unit:units(name)"
+
+    df = read_paged("expenses", columns, page_size, order_by="date", desc=True, project_id=project_id or None)
+    if df.empty:
         return pd.DataFrame(columns=[
             'id', 'date', 'amount', 'category', 'description', 
             'project_id', 'project', 'faena', 'unit'
         ])
-        
-    return pd.DataFrame(flat_data)
 
+    # Flatten JSON structure for DataFrame
+    df = flatten_relations(df, {
+        "project": {"name": "project"},
+        "faena": {"name": "faena"},
+        "unit": {"name": "unit"}
+    })
+    return apply_dtypes(df, "expenses")
+
+@cached_query("projects", "purchase_orders", "tasks", "subcontractors", "tenders")
 @retry_db
 def get_kpis():
-    # --- 1. Finance ---
-    projs = get_projects()
-    total_budget = projs['budget_total'].sum() if not projs.empty else 0
-    
-    # Calculate Total Spent using Purchase Orders (OC) for consistency
-    po_res = supabase.table("purchase_orders").select("total_amount, status").execute()
-    po_df = pd.DataFrame(po_res.data)
-    if not po_df.empty:
-        # Filter out Rejected
-        total_spent = po_df[po_df['status'] != 'Rechazada']['total_amount'].sum()
-        # Also sum 'Pendiente'? Yes, usually 'Ejecutado' includes pending commitments in construction (Comprometido).
-        # Or strictly 'Aprobada'? The Project Manager view used: status != 'Rechazada' (meaning Pending + Approved).
-        # We will match that logic.
-    else:
-        total_spent = 0
-
-    # --- 2. Lean (Global Average PPC) ---
-    # Fetch all tasks to calc global PPC (Week-based approximation)
-    tasks_res = supabase.table("tasks").select("status").execute()
-    tasks_df = pd.DataFrame(tasks_res.data)
-    if not tasks_df.empty:
-        total_tasks = len(tasks_df)
-        completed_tasks = len(tasks_df[tasks_df['status'] == 'Completado'])
-        global_ppc = int((completed_tasks / total_tasks) * 100) if total_tasks > 0 else 0
-    else:
-        global_ppc = 0
+    """
+    Global KPIs for the dashboard.
+    Uses the get_kpi_summary RPC (one small response, aggregated in Postgres) and
+    falls back to lightweight queries on the base tables if the function is missing.
+    """
+    try:
+        res = supabase.rpc("get_kpi_summary", {}).execute()
+        summary = res.data[0] if res.data else {}
+    except Exception as e:
+        if is_network_error(e):
+            raise # Let retry_db handle it
+        print(f"KPI RPC unavailable ({e}). Using table fallback.")
+        summary = _get_kpi_summary_fallback()
+
+    # --- Lean (Global Average PPC) ---
+    total_tasks = int(summary.get('total_tasks') or 0)
+    completed_tasks = int(summary.get('completed_tasks') or 0)
+    global_ppc = int((completed_tasks / total_tasks) * 100) if total_tasks > 0 else 0
+
+    return {
+        "total_spent": float(summary.get('total_spent') or 0),
+        "total_budget": float(summary.get('total_budget') or 0),
+        "pending_po_amount": float(summary.get('pending_po_amount') or 0),
+        "global_ppc": global_ppc,
+        "active_subs": int(summary.get('active_subs') or 0),
+        "total_subs": int(summary.get('total_subs') or 0),
+        "open_tenders": int(summary.get('open_tenders') or 0)
+    }
 
-    # --- 3. Compliance (Subcontractors) ---
-    subs_res = supabase.table("subcontractors").select("status").execute()
-    subs_df = pd.DataFrame(subs_res.data)
-    active_subs = len(subs_df[subs_df['status'] == 'Activo']) if not subs_df.empty else 0
-    total_subs = len(subs_df) if not subs_df.empty else 0
+def _count_rows(table, **eq_filters):
+    """Exact row count without downloading the rows (HEAD request)."""
+    query = supabase.table(table).select("id", count="exact", head=True)
+    for col, val in eq_filters.items():
+        query = query.eq(col, val)
+    return query.execute().count or 0
+
+def _get_kpi_summary_fallback():
+    """Same numbers as get_kpi_summary, computed from the existing tables."""
+    # --- 1. Finance ---
+    # Same read as the dashboard's project list, so the run fetches it only once
+    total_budget = float(get_projects()['budget_total'].fillna(0).sum())
 
-    # --- 4. Tenders (Open) ---
-    tenders_res = supabase.table("tenders").select("status").eq("status", "Publicada").execute()
-    open_tenders = len(tenders_res.data)
+    # Calculate Total Spent using Purchase Orders (OC) for consistency
+    # 'Ejecutado' includes pending commitments (Comprometido): status != 'Rechazada',
+    # same rule as the Project Manager view.
+    # Paged (one select would stop at PostgREST's max-rows) and summed page by page
+    total_spent = pending_po_amount = 0.0
+    for rows in iter_records("purchase_orders", "id, total_amount, status"):
+        po_df = pd.DataFrame(rows, columns=['id', 'total_amount', 'status'])
+        total_spent += float(po_df[po_df['status'] != 'Rechazada']['total_amount'].sum())
+        pending_po_amount += float(po_df[po_df['status'] == 'Pendiente']['total_amount'].sum())
 
     return {
-        "total_spent": total_spent,
         "total_budget": total_budget,
-        "global_ppc": global_ppc,
-        "active_subs": active_subs,
-        "total_subs": total_subs,
-        "open_tenders": open_tenders
+        "total_spent": total_spent,
+        "pending_po_amount": pending_po_amount,
+        # --- 2. Lean ---
+        "total_tasks": _count_rows("tasks"),
+        "completed_tasks": _count_rows("tasks", status="Completado"),
+        # --- 3. Compliance (Subcontractors) ---
+        "active_subs": _count_rows("subcontractors", status="Activo"),
+        "total_subs": _count_rows("subcontractors"),
+        # --- 4. Tenders (Open) ---
+        "open_tenders": _count_rows("tenders", status="Publicada")
     }
 
+# --- Alerts ---
+# Only rows that can raise an alert leave the server: pending POs, and documents expiring
+# within DOC_ALERT_DAYS (or already expired). Budget overrun is one grouped sum over the
+# (cached) purchase orders. Alerts come back errors first, then warnings, then info.
+DOC_ALERT_DAYS = 7
+BUDGET_WARNING_PCT = 90 # Spent/budget at or above this is a warning, above 100 an error
+SEVERITY_ORDER = {"error": 0, "warning": 1, "info": 2}
+
+def _pending_po_alerts():
+    rows = [r for page in iter_records(
+        "purchase_orders", "id, order_number, provider_name, total_amount", status="Pendiente"
+    ) for r in page]
+    if not rows:
+        return pd.DataFrame()
+    po = pd.DataFrame(rows)
+    identifier = po["order_number"].where(po["order_number"].notna() & (po["order_number"] != ""), po["id"].astype(str))
+    amount = pd.to_numeric(po["total_amount"], errors="coerce").fillna(0)
+    return pd.DataFrame({
+        "scope": "Finanzas",
+        "message": "OC #" + identifier.astype(str) + " pendiente de aprobación",
+        "detail": "Proveedor: " + po["provider_name"].fillna("").astype(str) + " - " + amount.map("${:,.0f}".format),
+        "severity": "warning",
+    })
+
+def _document_alerts(today):
+    horizon = (today + pd.Timedelta(days=DOC_ALERT_DAYS)).strftime("%Y-%m-%d")
+    try:
+        rows = [r for page in iter_records(
+            "compliance_documents", "id, document_type, expiration_date, subcontractor:subcontractors(name)",
+            where=lambda q: q.lte("expiration_date", horizon)
+        ) for r in page]
+    except Exception as e:
+        if is_network_error(e):
+            raise
+        print(f"Error fetching compliance alerts: {e}") # Table missing on older databases
+        return pd.DataFrame()
+    if not rows:
+        return pd.DataFrame()
+    docs = flatten_relations(rows, {"subcontractor": {"name": "sub_name"}}, {"sub_name": "Desconocido"})
+    docs = apply_dtypes(docs, "compliance_documents").dropna(subset=["expiration_date"])
+    days_left = (docs["expiration_date"] - today).dt.days
+    expired = days_left < 0
+    doc_type = docs["document_type"].astype(str)
+    return pd.DataFrame({
+        "scope": "Subcontratos",
+        "message": expired.map({True: "Documento Vencido: ", False: "Por Vencer: "}) + docs["sub_name"].astype(str),
+        "detail": doc_type + expired.map({True: " venció el ", False: " vence en "}) + docs["expiration_date"].dt.strftime("%Y-%m-%d").where(expired, days_left.astype(str) + " días"),
+        "severity": expired.map({True: "error", False: "warning"}),
+        "_days": days_left,
+    }).sort_values("_days").drop(columns="_days")
+
+def _budget_alerts():
+    projects = get_projects(("name", "budget_total"))
+    # Only the three columns the sum needs, not the full PO rows
+    orders = read_paged("purchase_orders", "id, project_id, total_amount, status")
+    if projects.empty or orders.empty:
+        return pd.DataFrame()
+    orders = apply_dtypes(orders, "purchase_orders")
+    spent = orders.loc[orders["status"] != "Rechazada"].groupby("project_id")["total_amount"].sum()
+    budget = projects.set_index("id")
+    budget = budget[budget["budget_total"] > 0]
+    pct = (spent.reindex(budget.index).fillna(0) / budget["budget_total"] * 100)
+    flagged = pct[pct >= BUDGET_WARNING_PCT].sort_values(ascending=False)
+    if flagged.empty:
+        return pd.DataFrame()
+    names = budget.loc[flagged.index, "name"].astype(str)
+    over = flagged > 100
+    return pd.DataFrame({
+        "scope": "Presupuesto",
+        "message": over.map({True: "Sobrecosto: ", False: "Presupuesto casi agotado: "}) + names,
+        "detail": "Gastado " + spent.reindex(flagged.index).map("${:,.0f}".format) + " de "
+                  + budget.loc[flagged.index, "budget_total"].map("${:,.0f}".format) + " (" + flagged.map("{:.0f}%".format) + ")",
+        "severity": over.map({True: "error", False: "warning"}),
+    })
+
+@cached_query("purchase_orders", "compliance_documents", "subcontractors", "projects")
 @retry_db
 def get_dashboard_alerts():
-    alerts = []
-    
-    # 1. Pending Purchase Orders (Approvals)
-    pending_pos_res = supabase.table("purchase_orders").select("id, order_number, provider_name, total_amount").eq("status", "Pendiente").execute()
-    for po in pending_pos_res.data:
-        identifier = po.get('order_number') or po['id']
-        alerts.append({
-            "scope": "Finanzas",
-            "message": f"OC #{identifier} pendiente de aprobación",
-            "detail": f"Proveedor: {po['provider_name']} - ${po['total_amount']:,.0f}",
-            "severity": "warning"
-        })
-        
-    # 2. Expiring/Expired Documents (Compliance)
-    # Simple check on all docs, ideally filtered by date. Fetching all for now as dataset is small-ish
-    docs_res = supabase.table("compliance_documents").select("document_type, expiration_date, subcontractor:subcontractors(name)").execute()
-    today = datetime.now().date()
-    for doc in docs_res.data:
-        if doc['expiration_date']:
-            exp_date = datetime.strptime(doc['expiration_date'], '%Y-%m-%d').date()
-            days_left = (exp_date - today).days
-            
-            sub_name = doc['subcontractor']['name'] if doc.get('subcontractor') else "Desconocido"
-            
-            if days_left < 0:
-                alerts.append({
-                    "scope": "Subcontratos",
-                    "message": f"Documento Vencido: {sub_name}",
-                    "detail": f"{doc['document_type']} venció el {exp_date}",
-                    "severity": "error"
-                })
-            elif days_left <= 7:
-                 alerts.append({
-                    "scope": "Subcontratos",
-                    "message": f"Por Vencer: {sub_name}",
-                    "detail": f"{doc['document_type']} vence en {days_left} días",
-                    "severity": "warning"
-                })
-
-    # 3. Budget Overrun (Simple check: Spent > Budget per project)
-    # Requires fetching both. We reuse get_kpis logic partly
-    projs = get_projects()
-    for _, prow in projs.iterrows():
-         # Get expenses for this project
-         # This is expensive in loop, but OK for small app. Optimization: aggregate in SQL/KPIs function
-         # We'll skip complex one for now or do a quick check if we had expense metrics
-         pass 
-
-    return alerts
-
+    """List of {scope, message, detail, severity} dicts, errors first."""
+    today = pd.Timestamp(datetime.now().date())
+    frames = [f for f in (_budget_alerts(), _document_alerts(today), _pending_po_alerts()) if not f.empty]
+    if not frames:
+        return []
+    alerts = pd.concat(frames, ignore_index=True)
+    # Stable sort: within a severity, budget first, then documents by due date, then POs
+    alerts = alerts.sort_values("severity", key=lambda s: s.map(SEVERITY_ORDER), kind="stable")
+    return alerts.to_dict("records")
+
+@cached_query("expenses")
+@retry_db
 def get_recent_expenses(limit=5):
     # Select relations 
     response = supabase.table("expenses").select("date,description,category,amount").order("date", desc=True).limit(limit).execute()
     df = pd.DataFrame(response.data)
     if df.empty:
         return pd.DataFrame(columns=['date', 'description', 'category', 'amount'])
-    return df
+    return apply_dtypes(df, "expenses")
 
 # --- Generic Helper to replace old run_query for complex selects ---
 def run_query(query_str, params=None, return_df=True):
@@ -429,6 +1377,14 @@ def run_query(query_str, params=None, return_df=True):
     It is extremely hard to parse generic SQL to Supabase API calls.
     We will now log a warning and try to return empty or handle specific known queries.
     """
+    # The local backend speaks SQL natively, no translation needed
+    if isinstance(supabase, backend.LocalBackend):
+        result = supabase.execute_sql(query_str, params)
+        if isinstance(result, list):
+            return pd.DataFrame(result) if return_df else result
+        invalidate_cache()
+        return result
+
     print(f"WARNING: RAW SQL ATTEMPTED: {query_str}")
     
     # Naive handlers for specific known queries used in other modules
@@ -449,6 +1405,7 @@ def run_query(query_str, params=None, return_df=True):
             "role": params[3]
         }
         supabase.table("users").insert(data).execute()
+        invalidate_cache("users")
         return True
 
     # 3. Teams / Project Assignments
@@ -469,10 +1426,14 @@ def run_query(query_str, params=None, return_df=True):
     return pd.DataFrame() # Return empty to avoid crash
 
 # --- Auth & Users Support ---
+@cached_query("users")
+@retry_db
 def get_user_by_username(username):
     response = supabase.table("users").select("*").eq("username", username).execute()
     return pd.DataFrame(response.data)
 
+@invalidates("users")
+@retry_db(idempotent=False)
 def create_user_record(username, password_hash, full_name, role, email=None):
     data = {
         "username": username,
@@ -484,11 +1445,15 @@ def create_user_record(username, password_hash, full_name, role, email=None):
     supabase.table("users").insert(data).execute()
 
 # --- Teams / Utils ---
+@cached_query("users")
+@retry_db
 def get_all_users():
     try:
         response = supabase.table("users").select("id, full_name, role, username, email").execute()
         return pd.DataFrame(response.data)
     except Exception as e:
+        if is_network_error(e):
+            raise
         # Fallback if email column missing (SQL not run yet)
         response = supabase.table("users").select("id, full_name, role, username").execute()
         df = pd.DataFrame(response.data)
@@ -496,25 +1461,35 @@ def get_all_users():
             df['email'] = None
         return df
 
+@cached_query("users")
+@retry_db
 def get_users_full():
     response = supabase.table("users").select("*").order("id").execute()
     return pd.DataFrame(response.data)
 
+@invalidates("users")
+@retry_db
 def update_user(user_id, username, full_name, role, password_hash=None, email=None):
     data = {"username": username, "full_name": full_name, "role": role, "email": email}
     if password_hash:
         data["password_hash"] = password_hash
     supabase.table("users").update(data).eq("id", user_id).execute()
 
+@invalidates("users")
+@retry_db
 def delete_user(user_id):
     supabase.table("users").delete().eq("id", user_id).execute()
 
 # --- Roles Management ---
+@cached_query("roles")
+@retry_db
 def get_roles():
     try:
         response = supabase.table("roles").select("*").order("id").execute()
         return pd.DataFrame(response.data)
-    except Exception:
+    except Exception as e:
+        if is_network_error(e):
+            raise
         # Fallback if table doesn't exist yet
         return pd.DataFrame({
             'id': range(1, 7),
@@ -522,42 +1497,43 @@ def get_roles():
             'description': ["Acceso Total", "Gestión", "Proyectos", "Cuadrillas", "Recursos", "Seguridad"]
         })
 
+@invalidates("roles")
+@retry_db(idempotent=False)
 def add_role(name, description=""):
     data = {"name": name, "description": description}
     supabase.table("roles").insert(data).execute()
 
+@invalidates("roles")
+@retry_db
 def delete_role(role_id):
     supabase.table("roles").delete().eq("id", role_id).execute()
 
+@cached_query("project_assignments", "users")
+@retry_db
 def get_project_assignments(project_id):
     # Join with users to get names
     # select *, users(full_name)
     response = supabase.table("project_assignments").select("id, role, assigned_at, user:users(full_name)").eq("project_id", project_id).execute()
-    data = response.data
-    flat = []
-    for row in data:
-         new = row.copy()
-         new['full_name'] = row['user']['full_name'] if row.get('user') else 'Unknown'
-         flat.append(new)
-    return pd.DataFrame(flat)
+    if not response.data:
+        return pd.DataFrame()
+    df = flatten_relations(response.data, {"user": {"full_name": "full_name"}}, {"full_name": "Unknown"})
+    return apply_dtypes(df, "project_assignments")
 
+@cached_query("project_assignments", "users", "projects")
+@retry_db
 def get_all_project_assignments():
     response = supabase.table("project_assignments").select("id, role, assigned_at, user:users(full_name, username), project:projects(name)").execute()
-    data = response.data
-    flat = []
-    for row in data:
-         user_data = row.get('user') or {}
-         new = {
-             'id': row['id'],
-             'role': row['role'],
-             'assigned_at': row['assigned_at'],
-             'full_name': user_data.get('full_name', 'Unknown'),
-             'username': user_data.get('username', ''),
-             'project_name': row['project']['name'] if row.get('project') else 'Unknown'
-         }
-         flat.append(new)
-    return pd.DataFrame(flat)
-
+    if not response.data:
+        return pd.DataFrame()
+    df = flatten_relations(
+        response.data,
+        {"user": {"full_name": "full_name", "username": "username"}, "project": {"name": "project_name"}},
+        {"full_name": "Unknown", "username": "", "project_name": "Unknown"}
+    )
+    return apply_dtypes(df, "project_assignments")
+
+@invalidates("project_assignments")
+@retry_db
 def assign_user_to_project(project_id, user_id, role, assigned_at=None):
     data = {"project_id": project_id, "user_id": user_id, "role": role}
     if assigned_at:
@@ -576,14 +1552,21 @@ def assign_user_to_project(project_id, user_id, role, assigned_at=None):
     else:
          supabase.table("project_assignments").insert(data).execute()
 
+@invalidates("project_assignments")
+@retry_db
 def remove_project_assignment(assignment_id):
     supabase.table("project_assignments").delete().eq("id", assignment_id).execute()
 
 # --- Budget ---
+@patchable("budget_items")
+@cached_query("budget_items")
+@retry_db
 def get_budget_items(project_id):
     response = supabase.table("budget_items").select("*").eq("project_id", project_id).execute()
-    return pd.DataFrame(response.data)
+    return apply_dtypes(pd.DataFrame(response.data), "budget_items")
 
+@writes_through("budget_items")
+@retry_db(idempotent=False)
 def create_budget_item(project_id, name, category, amount):
     data = {
         "project_id": project_id,
@@ -591,19 +1574,25 @@ def create_budget_item(project_id, name, category, amount):
         "category": category,
         "estimated_amount": amount
     }
-    supabase.table("budget_items").insert(data).execute()
+    return supabase.table("budget_items").insert(data, returning="representation").execute().data
 
+@writes_through("budget_items")
+@retry_db
 def update_budget_item(item_id, name, category, amount):
-    supabase.table("budget_items").update({
+    return supabase.table("budget_items").update({
         "item_name": name,
         "category": category,
         "estimated_amount": amount
-    }).eq("id", item_id).execute()
+    }, returning="representation").eq("id", item_id).execute().data
 
+@writes_through("budget_items", delete=True)
+@retry_db
 def delete_budget_item(item_id):
-    supabase.table("budget_items").delete().eq("id", item_id).execute()
+    return supabase.table("budget_items").delete(returning="representation").eq("id", item_id).execute().data
 
 # --- Finance Support ---
+@writes_through("purchase_orders")
+@retry_db(idempotent=False)
 def create_purchase_order(project_id, provider_name, date, total_amount, order_number, description=""):
     data = {
         "project_id": int(project_id), 
@@ -614,54 +1603,50 @@ def create_purchase_order(project_id, provider_name, date, total_amount, order_n
         "status": 'Pendiente',
         "order_number": order_number
     }
-    supabase.table("purchase_orders").insert(data).execute()
-
-def get_purchase_orders(project_id=None):
-    # Select with project name
-    query = supabase.table("purchase_orders").select("*, projects(name)").order("date", desc=True)
-    if project_id:
-        query = query.eq("project_id", project_id)
-    response = query.execute()
-    
-    data = response.data
-    # Flatten
-    for row in data:
-        if row.get('projects'):
-            row['project_name'] = row['projects']['name']
-        else:
-            row['project_name'] = 'N/A'
-            
-    return pd.DataFrame(data)
+    return supabase.table("purchase_orders").insert(data, returning="representation").execute().data
 
+@writes_through("purchase_orders")
+@retry_db
 def update_purchase_order_full(po_id, project_id, provider, amount, date, order_number, desc):
-     supabase.table("purchase_orders").update({
+     return supabase.table("purchase_orders").update({
          "project_id": project_id,
          "provider_name": provider,
          "total_amount": amount,
          "date": str(date),
          "order_number": order_number,
          "description": desc
-     }).eq("id", po_id).execute()
+     }, returning="representation").eq("id", po_id).execute().data
 
+@writes_through("purchase_orders")
+@retry_db
 def update_po_status(po_id, status):
-    supabase.table("purchase_orders").update({"status": status}).eq("id", po_id).execute()
+    return supabase.table("purchase_orders").update({"status": status}, returning="representation").eq("id", po_id).execute().data
 
 
+@writes_through("purchase_orders", delete=True)
+@retry_db
 def delete_purchase_order(po_id):
-    supabase.table("purchase_orders").delete().eq("id", po_id).execute()
+    return supabase.table("purchase_orders").delete(returning="representation").eq("id", po_id).execute().data
 
 # --- Compliance (Subcontractors) ---
+@cached_query("subcontractors")
 @retry_db
-def get_subcontractors(project_id=None):
-    query = supabase.table("subcontractors").select("*")
+def get_subcontractors(project_id=None, columns=None):
+    if not project_id:
+        df = read_mirrored("subcontractors", columns)
+        if df is not None:
+            return df if not df.empty else empty_frame("subcontractors", columns)
+    query = supabase.table("subcontractors").select(select_columns("subcontractors", columns))
     if project_id:
         query = query.eq("project_id", project_id)
     response = query.execute()
     df = pd.DataFrame(response.data)
     if df.empty:
-        return pd.DataFrame(columns=['id', 'project_id', 'name', 'rut', 'contact_email', 'contact_phone', 'specialty', 'representative', 'status'])
-    return df
+        return empty_frame("subcontractors", columns)
+    return apply_dtypes(df, "subcontractors")
 
+@invalidates("subcontractors")
+@retry_db(idempotent=False)
 def create_subcontractor(project_id, name, rut, email, phone, specialty, rep):
     data = {
         "project_id": project_id,
@@ -675,6 +1660,8 @@ def create_subcontractor(project_id, name, rut, email, phone, specialty, rep):
     }
     supabase.table("subcontractors").insert(data).execute()
 
+@invalidates("subcontractors")
+@retry_db
 def update_subcontractor_full(sub_id, name, rut, email, phone, specialty, rep):
     supabase.table("subcontractors").update({
         "name": name, 
@@ -685,21 +1672,28 @@ def update_subcontractor_full(sub_id, name, rut, email, phone, specialty, rep):
         "representative": rep
     }).eq("id", sub_id).execute()
 
+@invalidates("subcontractors")
+@retry_db
 def update_sub_status(sub_id, status):
     supabase.table("subcontractors").update({"status": status}).eq("id", sub_id).execute()
 
+@invalidates("subcontractors")
+@retry_db
 def delete_subcontractor(sub_id):
     supabase.table("subcontractors").delete().eq("id", sub_id).execute()
 
 # --- Compliance Documents ---
+@cached_query("compliance_documents")
 @retry_db
 def get_compliance_documents(sub_id):
     response = supabase.table("compliance_documents").select("*").eq("subcontractor_id", sub_id).order("last_updated", desc=True).execute()
     df = pd.DataFrame(response.data)
     if df.empty:
         return pd.DataFrame(columns=['id', 'subcontractor_id', 'document_type', 'status', 'expiration_date', 'last_updated'])
-    return df
+    return apply_dtypes(df, "compliance_documents")
 
+@invalidates("compliance_documents")
+@retry_db(idempotent=False)
 def create_compliance_document(sub_id, doc_type, status, expiration):
     data = {
         "subcontractor_id": sub_id,
@@ -709,21 +1703,25 @@ def create_compliance_document(sub_id, doc_type, status, expiration):
     }
     supabase.table("compliance_documents").insert(data).execute()
 
+@invalidates("compliance_documents")
+@retry_db
 def delete_compliance_document(doc_id):
     supabase.table("compliance_documents").delete().eq("id", doc_id).execute()
 
 # --- Quality ---
+@cached_query("quality_logs")
 @retry_db
-def get_quality_logs(project_id=None):
-    query = supabase.table("quality_logs").select("*").order("date", desc=True)
-    if project_id:
-        query = query.eq("project_id", project_id)
-    response = query.execute()
-    df = pd.DataFrame(response.data)
+def get_quality_logs(project_id=None, page_size=DEFAULT_PAGE_SIZE, columns=None):
+    df = read_paged(
+        "quality_logs", select_columns("quality_logs", columns, required=("id", "date")), page_size,
+        order_by="date", desc=True, project_id=project_id or None
+    )
     if df.empty:
-        return pd.DataFrame(columns=['id', 'project_id', 'title', 'description', 'inspector_name', 'signer_name', 'date'])
-    return df
+        return empty_frame("quality_logs", columns)
+    return apply_dtypes(df, "quality_logs")
 
+@invalidates("quality_logs")
+@retry_db(idempotent=False)
 def create_quality_log(project_id, title, description, inspector, signer_name):
     data = {
         "project_id": project_id, 
@@ -734,6 +1732,8 @@ def create_quality_log(project_id, title, description, inspector, signer_name):
     }
     supabase.table("quality_logs").insert(data).execute()
 
+@invalidates("quality_logs")
+@retry_db
 def update_quality_log(log_id, title, description, inspector, signer_name):
     supabase.table("quality_logs").update({
         "title": title, 
@@ -742,10 +1742,14 @@ def update_quality_log(log_id, title, description, inspector, signer_name):
         "signer_name": signer_name
     }).eq("id", log_id).execute()
 
+@invalidates("quality_logs")
+@retry_db
 def delete_quality_log(log_id):
     supabase.table("quality_logs").delete().eq("id", log_id).execute()
 
 # --- Lab Tests ---
+@patchable("lab_tests", order_by="test_date", desc=True)
+@cached_query("lab_tests")
 @retry_db
 def get_lab_tests(project_id=None):
     query = supabase.table("lab_tests").select("*").order("test_date", desc=True)
@@ -755,8 +1759,10 @@ def get_lab_tests(project_id=None):
     df = pd.DataFrame(response.data)
     if df.empty:
         return pd.DataFrame(columns=['id', 'project_id', 'test_type', 'test_date', 'result', 'observation'])
-    return df
+    return apply_dtypes(df, "lab_tests")
 
+@writes_through("lab_tests")
+@retry_db(idempotent=False)
 def create_lab_test(project_id, test_type, date, result, obs):
     data = {
         "project_id": project_id,
@@ -765,31 +1771,38 @@ def create_lab_test(project_id, test_type, date, result, obs):
         "result": result,
         "observation": obs
     }
-    supabase.table("lab_tests").insert(data).execute()
+    return supabase.table("lab_tests").insert(data, returning="representation").execute().data
 
+@writes_through("lab_tests")
+@retry_db
 def update_lab_test(test_id, test_type, date, result, obs):
-    supabase.table("lab_tests").update({
+    return supabase.table("lab_tests").update({
         "test_type": test_type,
         "test_date": str(date),
         "result": result,
         "observation": obs
-    }).eq("id", test_id).execute()
+    }, returning="representation").eq("id", test_id).execute().data
 
+@writes_through("lab_tests", delete=True)
+@retry_db
 def delete_lab_test(test_id):
-    supabase.table("lab_tests").delete().eq("id", test_id).execute()
+    return supabase.table("lab_tests").delete(returning="representation").eq("id", test_id).execute().data
 
 # --- Lean (Tasks) ---
+@patchable("tasks", order_by="start_date")
+@cached_query("tasks")
 @retry_db
-def get_tasks(project_id=None):
-    query = supabase.table("tasks").select("*").order("start_date")
-    if project_id:
-        query = query.eq("project_id", project_id)
-    response = query.execute()
-    df = pd.DataFrame(response.data)
+def get_tasks(project_id=None, page_size=DEFAULT_PAGE_SIZE, columns=None):
+    df = read_paged(
+        "tasks", select_columns("tasks", columns, required=("id", "start_date")), page_size,
+        order_by="start_date", project_id=project_id or None
+    )
     if df.empty:
-        return pd.DataFrame(columns=['id', 'project_id', 'name', 'start_date', 'end_date', 'status'])
-    return df
+        return empty_frame("tasks", columns)
+    return apply_dtypes(df, "tasks")
 
+@writes_through("tasks")
+@retry_db(idempotent=False)
 def create_task(project_id, name, start, end, status="Por Hacer"):
     data = {
         "project_id": project_id, 
@@ -798,18 +1811,26 @@ def create_task(project_id, name, start, end, status="Por Hacer"):
         "end_date": str(end), 
         "status": status
     }
-    supabase.table("tasks").insert(data).execute()
+    return supabase.table("tasks").insert(data, returning="representation").execute().data
 
+@writes_through("tasks")
+@retry_db
 def update_task_status(task_id, new_status):
-    supabase.table("tasks").update({"status": new_status}).eq("id", task_id).execute()
+    return supabase.table("tasks").update({"status": new_status}, returning="representation").eq("id", task_id).execute().data
 
+@writes_through("tasks")
+@retry_db
 def update_task_details(task_id, name):
-    supabase.table("tasks").update({"name": name}).eq("id", task_id).execute()
+    return supabase.table("tasks").update({"name": name}, returning="representation").eq("id", task_id).execute().data
 
+@writes_through("tasks", delete=True)
+@retry_db
 def delete_task(task_id):
-    supabase.table("tasks").delete().eq("id", task_id).execute()
+    return supabase.table("tasks").delete(returning="representation").eq("id", task_id).execute().data
 
 # --- Tenders ---
+@invalidates("tenders")
+@retry_db(idempotent=False)
 def create_tender(project_id, title, estimated_budget, tender_type, utm_value, status, ssd_code, mercado_publico_id=""):
     data = {
          "project_id": project_id, "title": title, "type": tender_type, 
@@ -818,23 +1839,25 @@ def create_tender(project_id, title, estimated_budget, tender_type, utm_value, s
     }
     supabase.table("tenders").insert(data).execute()
 
+@cached_query("tenders")
 @retry_db
-def get_tenders(project_id=None):
-    query = supabase.table("tenders").select("*")
+def get_tenders(project_id=None, columns=None):
+    query = supabase.table("tenders").select(select_columns("tenders", columns))
     if project_id:
         query = query.eq("project_id", project_id)
     response = query.execute()
     df = pd.DataFrame(response.data)
     if df.empty:
-        return pd.DataFrame(columns=[
-            'id', 'project_id', 'title', 'type', 'budget_estimated', 
-            'utm_value_at_creation', 'status', 'ssd_code', 'mercado_publico_id'
-        ])
-    return df
+        return empty_frame("tenders", columns)
+    return apply_dtypes(df, "tenders")
 
+@invalidates("tenders")
+@retry_db
 def update_tender_status(tender_id, new_status):
     supabase.table("tenders").update({"status": new_status}).eq("id", tender_id).execute()
 
+@invalidates("tenders")
+@retry_db
 def update_tender(tender_id, title, budget, mercado_publico_id, tender_type):
     supabase.table("tenders").update({
         "title": title, 
@@ -843,10 +1866,14 @@ def update_tender(tender_id, title, budget, mercado_publico_id, tender_type):
         "type": tender_type
     }).eq("id", tender_id).execute()
 
+@invalidates("tenders")
+@retry_db
 def delete_tender(tender_id):
     supabase.table("tenders").delete().eq("id", tender_id).execute()
 
 # --- Contracts ---
+@invalidates("contracts")
+@retry_db(idempotent=False)
 def create_contract(tender_id, contractor_name, rut, amount, start, end):
     data = {
         "tender_id": tender_id, "contractor_name": contractor_name, "rut_contractor": rut,
@@ -854,31 +1881,37 @@ def create_contract(tender_id, contractor_name, rut, amount, start, end):
     }
     supabase.table("contracts").insert(data).execute()
 
+@cached_query("contracts")
 @retry_db
-def get_contracts(tender_id=None):
-     query = supabase.table("contracts").select("*")
+def get_contracts(tender_id=None, columns=None):
+     query = supabase.table("contracts").select(select_columns("contracts", columns))
      if tender_id:
          query = query.eq("tender_id", tender_id)
      res = query.execute()
      df = pd.DataFrame(res.data)
      if df.empty:
-         return pd.DataFrame(columns=[
-             'id', 'tender_id', 'contractor_name', 'rut_contractor', 
-             'amount', 'start_date', 'end_date', 'status'
-         ])
-     return df
+         return empty_frame("contracts", columns)
+     return apply_dtypes(df, "contracts")
 
+@invalidates("guarantees")
+@retry_db(idempotent=False)
 def create_guarantee(contract_id, g_type, amount, expiration):
     data = {"contract_id": contract_id, "type": g_type, "amount": amount, "expiration_date": str(expiration)}
     supabase.table("guarantees").insert(data).execute()
 
+@invalidates("guarantees")
+@retry_db
 def update_guarantee(guarantee_id, g_type, amount, expiration, status):
     data = {"type": g_type, "amount": amount, "expiration_date": str(expiration), "status": status}
     supabase.table("guarantees").update(data).eq("id", guarantee_id).execute()
 
+@invalidates("guarantees")
+@retry_db
 def delete_guarantee(guarantee_id):
     supabase.table("guarantees").delete().eq("id", guarantee_id).execute()
 
+@invalidates("contracts")
+@retry_db
 def update_contract(contract_id, contractor_name, rut, amount, start, end, status):
     data = {
         "contractor_name": contractor_name, "rut_contractor": rut,
@@ -887,79 +1920,93 @@ def update_contract(contract_id, contractor_name, rut, amount, start, end, statu
     }
     supabase.table("contracts").update(data).eq("id", contract_id).execute()
 
+@invalidates("guarantees", "contracts")
+@retry_db
 def delete_contract(contract_id):
     # Cascade delete guarantees first
     supabase.table("guarantees").delete().eq("contract_id", contract_id).execute()
     supabase.table("contracts").delete().eq("id", contract_id).execute()
 
 # --- Phases ---
+@cached_query("phases")
 @retry_db
 def get_phases(project_id):
     res = supabase.table("phases").select("*").eq("project_id", project_id).execute()
-    return pd.DataFrame(res.data)
+    return apply_dtypes(pd.DataFrame(res.data), "phases")
 
+@invalidates("phases")
+@retry_db(idempotent=False)
 def add_phase(project_id, name, start, end):
     data = {"project_id": project_id, "name": name, "start_date": str(start), "end_date": str(end)}
     supabase.table("phases").insert(data).execute()
 
+@invalidates("phases")
+@retry_db
 def update_phase(phase_id, name, start, end):
     data = {"name": name, "start_date": str(start), "end_date": str(end)}
     supabase.table("phases").update(data).eq("id", phase_id).execute()
 
+@invalidates("phases")
+@retry_db
 def delete_phase(phase_id):
     supabase.table("phases").delete().eq("id", phase_id).execute()
 
 # --- Comments ---
 # --- Comments ---
+@patchable("comments", order_by="timestamp", desc=True, derived={"username": ("user_id", _usernames, "Unknown")})
+@cached_query("comments", "users")
 @retry_db
 def get_comments(project_id):
     # Select all fields including ID and user_id for permissions
     res = supabase.table("comments").select("id, content, timestamp, user_id, user:users(username)").eq("project_id", project_id).order("timestamp", desc=True).execute()
-    data = res.data
-    flat = []
-    for row in data:
-        new = row.copy()
-        new['username'] = row['user']['username'] if row.get('user') else 'Unknown'
-        flat.append(new)
-    return pd.DataFrame(flat)
+    if not res.data:
+        return pd.DataFrame()
+    df = flatten_relations(res.data, {"user": {"username": "username"}}, {"username": "Unknown"})
+    return apply_dtypes(df, "comments")
 
+@writes_through("comments")
+@retry_db(idempotent=False)
 def add_comment(project_id, user_id, content):
     data = {"project_id": project_id, "user_id": user_id, "content": content}
-    supabase.table("comments").insert(data).execute()
+    return supabase.table("comments").insert(data, returning="representation").execute().data
 
+@writes_through("comments")
+@retry_db
 def update_comment(comment_id, content):
-    supabase.table("comments").update({"content": content}).eq("id", comment_id).execute()
+    return supabase.table("comments").update({"content": content}, returning="representation").eq("id", comment_id).execute().data
 
+@writes_through("comments", delete=True)
+@retry_db
 def delete_comment(comment_id):
-    supabase.table("comments").delete().eq("id", comment_id).execute()
+    return supabase.table("comments").delete(returning="representation").eq("id", comment_id).execute().data
 
+@invalidates("projects")
+@retry_db
 def update_project_config(project_id, status, lat, lon):
      supabase.table("projects").update({
          "status": status, "latitude": lat, "longitude": lon
      }).eq("id", project_id).execute()
 
 # --- Teams & Stats ---
+@cached_query("project_assignments", "projects")
 @retry_db
 def get_global_team_stats():
     # Fetch all assignments with project names
     # Table: project_assignments (id, project_id, user_id, role)
     # Join projects to get name
     res = supabase.table("project_assignments").select("role, project_id, projects(name, status)").execute()
-    data = res.data
+    df = flatten_relations(res.data, {"projects": {"name": "project_name", "status": "project_status"}})
     
     # Filter only active projects if needed, or keeping all
     # Let's keep Active only
-    active_data = [d for d in data if d.get('projects') and d['projects']['status'] == 'Activo']
+    df = df[df['project_status'] == 'Activo'] if not df.empty else df
     
-    if not active_data:
+    if df.empty:
         return {
             "total_personnel": 0,
             "roles_df": pd.DataFrame(columns=['role', 'count']),
             "projects_df": pd.DataFrame(columns=['project_name', 'count'])
         }
-
-    df = pd.DataFrame(active_data)
-    df['project_name'] = df['projects'].apply(lambda x: x['name'])
     
     # 1. Total Personnel
     total = len(df)
@@ -978,96 +2025,333 @@ def get_global_team_stats():
         "projects_df": projs_df
     }
 
+# --- Dashboard Snapshot ---
+# The dashboard's derived data (budget vs spend, deadline risk, status counts, ...) is built
+# once per version of its source tables and served from the shared cache, so widget reruns
+# only draw. as_of is part of the key: days_left is recomputed when the date changes.
+DASHBOARD_TABLES = (
+    "projects", "expenses", "faenas", "units", "purchase_orders", "tasks", "subcontractors",
+    "tenders", "compliance_documents", "lab_tests", "project_assignments"
+)
+
+@cached_query(*DASHBOARD_TABLES)
+def get_dashboard_snapshot(as_of=None):
+    """Dict with the dashboard's KPIs, derived frames, alerts and the build timings."""
+    as_of = pd.Timestamp(as_of or datetime.now().date())
+    # Independent reads run concurrently: the build waits for the slowest one, not the sum
+    results, timings = fetch_concurrently({
+        "kpis": get_kpis,
+        "projects": get_projects,
+        "expenses": get_expenses_df,
+        "alerts": get_dashboard_alerts,
+        "lab_tests": (get_lab_tests, None),
+        "team_stats": get_global_team_stats,
+        "recent_expenses": (get_recent_expenses, 5),
+    })
+    projects = results["projects"]
+    expenses = results["expenses"]
+
+    # Deadlines
+    if not projects.empty:
+        projects["days_left"] = (projects["end_date"] - as_of).dt.days
+        projects["risk_deadline"] = projects["days_left"] < 30
+    deadlines = projects[projects["days_left"] < 60].sort_values("days_left") if not projects.empty else projects
+
+    # Budget vs real
+    if not projects.empty and not expenses.empty:
+        spent = expenses.groupby("project_id")["amount"].sum().rename("amount")
+        budget_analysis = projects[["id", "name", "budget_total", "status"]].merge(spent, left_on="id", right_index=True, how="left")
+        budget_analysis["amount"] = budget_analysis["amount"].fillna(0)
+        budget_analysis["utilization"] = budget_analysis["amount"] / budget_analysis["budget_total"] * 100
+    else:
+        budget_analysis = projects.copy()
+        if not budget_analysis.empty:
+            budget_analysis["amount"] = 0
+            budget_analysis["utilization"] = 0
+
+    kpis = results["kpis"]
+    lab = results["lab_tests"]
+    status_counts = projects["status"].value_counts().reset_index() if not projects.empty else pd.DataFrame(columns=["status", "count"])
+    status_counts.columns = ["status", "count"]
+    return {
+        "as_of": as_of,
+        "built_at": datetime.now(),
+        "kpis": kpis,
+        "projects": projects,
+        "deadlines": deadlines,
+        "budget_analysis": budget_analysis,
+        "status_counts": status_counts,
+        "active_count": int((projects["status"] == "Activo").sum()) if not projects.empty else 0,
+        "utilization": (kpis["total_spent"] / kpis["total_budget"] * 100) if kpis["total_budget"] > 0 else 0,
+        "pass_rate": int((lab["result"] == "Aprobado").mean() * 100) if not lab.empty else 0,
+        "team_total": results["team_stats"].get("total_personnel", 0),
+        "alerts": results["alerts"],
+        "recent_expenses": results["recent_expenses"],
+        "timings": timings,
+    }
+
 # --- Finance (Purchase Orders) ---
+@patchable("purchase_orders", order_by="date", desc=True, derived={"project_name": ("project_id", _project_names, "Sin Proyecto")})
+@cached_query("purchase_orders", "projects")
 @retry_db
-def get_purchase_orders(project_id=None):
-    """Fetches all POs with Project Names."""
+def get_purchase_orders(project_id=None, page_size=DEFAULT_PAGE_SIZE):
+    """Fetches all POs with Project Names, newest first."""
     try:
-        # Join with Projects table to get names
-        query = supabase.table("purchase_orders").select("*, projects(name)").order("date", desc=True)
-        if project_id:
-             query = query.eq("project_id", project_id)
-             
-        response = query.execute()
-        if response.data:
-            df = pd.DataFrame(response.data)
-            # Flatten project name
-            if 'projects' in df.columns:
-                 df['project_name'] = df['projects'].apply(lambda x: x['name'] if x else 'Sin Proyecto')
-            else:
-                 df['project_name'] = "Desconocido"
-            return df
+        df = None if project_id else read_mirrored("purchase_orders")
+        if df is not None:
+            if not df.empty:
+                names = get_projects(("name",)).set_index("id")["name"]
+                df["project_name"] = df["project_id"].map(names).fillna("Sin Proyecto")
+                return _sort_like_postgrest(df, "date", True)
+        else:
+            # Join with Projects table to get names
+            df = read_paged(
+                "purchase_orders", "*, projects(name)", page_size,
+                order_by="date", desc=True, project_id=project_id or None
+            )
+            if not df.empty:
+                # Flatten project name
+                df = flatten_relations(df, {"projects": {"name": "project_name"}}, {"project_name": "Sin Proyecto"})
+                return apply_dtypes(df, "purchase_orders")
         return pd.DataFrame(columns=[
             'id', 'project_id', 'provider_name', 'date', 
             'total_amount', 'description', 'status', 'order_number', 
-            'projects', 'project_name'
+            'project_name'
         ])
     except Exception as e:
+        if is_network_error(e):
+            raise
         print(f"Error fetching POs: {e}")
         return pd.DataFrame(columns=[
             'id', 'project_id', 'provider_name', 'date', 
             'total_amount', 'description', 'status', 'order_number', 
-            'projects', 'project_name'
+            'project_name'
         ])
 
 # --- Admin / Config ---
+# system_config is small and read on every rerun (daily automation, quotas, notification
+# idempotency keys), so the whole table is loaded in one query and served from memory.
+# set_config writes through to the database and the snapshot, so this process never reads
+# its own writes stale; CONFIG_TTL_SECONDS bounds staleness for writes from other processes.
+CONFIG_TTL_SECONDS = 60
+
+class ConfigStore:
+    """
+    In-memory snapshot of system_config, reloaded in bulk when older than the TTL.
+    The reload runs outside the lock by one thread at a time; meanwhile the others keep reading
+    the previous snapshot, so no session waits on another's (possibly retried) request.
+    """
+
+    def __init__(self, ttl=CONFIG_TTL_SECONDS):
+        self.ttl = ttl
+        self._values = None # key -> value, None until the first successful load
+        self._loaded_at = 0.0
+        self._lock = threading.RLock()
+        self._loading = False
+        self._invalidations = 0 # A reload that overlaps one may have read the old values
+        self._written = {} # set() calls since the running reload started, applied over its result
+        self.loads = 0
+        self.load_errors = 0
+        self.reads = 0
+
+    def _snapshot(self):
+        with self._lock:
+            self.reads += 1
+            fresh = self._values is not None and time.monotonic() - self._loaded_at <= self.ttl
+            if fresh or (self._loading and self._values is not None):
+                return self._values
+            # Stale, or nothing to serve yet (then every first reader fetches its own)
+            self._loading = True
+            invalidations = self._invalidations
+            self._written = {}
+        values = None
+        try:
+            values = {}
+            for rows in call_with_retry(lambda: list(iter_records("system_config", "key,value", keyset="key"))):
+                values.update((r['key'], r['value']) for r in rows)
+        except Exception as e:
+            values = None
+            with self._lock:
+                self.load_errors += 1
+                if self._values is None:
+                    raise
+                print(f"Config reload failed ({e}). Serving the previous snapshot.")
+        finally:
+            with self._lock:
+                self._loading = False
+                if values is not None:
+                    values.update(self._written)
+                    self._values = values
+                    self.loads += 1
+                # Also on failure, so a dead network doesn't cost one retry cycle per read.
+                # An invalidation during the fetch leaves it stale for the next read.
+                self._loaded_at = time.monotonic() if self._invalidations == invalidations else 0.0
+        return self._values
+
+    def get(self, key, default=None):
+        value = self._snapshot().get(key)
+        return default if value is None else value
+
+    def get_many(self, keys, defaults=None):
+        snapshot = self._snapshot()
+        defaults = defaults or {}
+        return {k: snapshot[k] if snapshot.get(k) is not None else defaults.get(k) for k in keys}
+
+    def set(self, key, value):
+        call_with_retry(supabase.table("system_config").upsert({"key": key, "value": value}).execute)
+        with self._lock:
+            if self._values is not None:
+                self._values[key] = value
+            self._written[key] = value
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = 0.0
+            self._invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            age = time.monotonic() - self._loaded_at if self._values is not None else None
+            return {
+                "keys": len(self._values or {}),
+                "age_seconds": age,
+                "ttl": self.ttl,
+                "loads": self.loads,
+                "load_errors": self.load_errors,
+                "reads": self.reads
+            }
+
+_config_store = ConfigStore()
+
 def get_config(key, default=None):
     try:
-        response = supabase.table("system_config").select("value").eq("key", key).execute()
-        if response.data:
-            return response.data[0]['value']
-        return default
+        return _config_store.get(key, default)
     except Exception as e:
         # print(f"Error getting config {key}: {e}") # Silent fail default
         return default
 
+def get_config_many(keys, defaults=None):
+    """Several config values at once: {key: value or its default}."""
+    try:
+        return _config_store.get_many(keys, defaults)
+    except Exception as e:
+        defaults = defaults or {}
+        return {k: defaults.get(k) for k in keys}
+
 def set_config(key, value):
     try:
-        data = {"key": key, "value": str(value)}
-        supabase.table("system_config").upsert(data).execute()
+        _config_store.set(key, str(value))
         return True, "Success"
     except Exception as e:
         print(f"Error setting config {key}: {e}")
         return False, str(e)
 
+def reload_config():
+    """Forces the next config read to reload the table (e.g. after editing it by hand)."""
+    _config_store.invalidate()
+
+def get_config_stats():
+    return _config_store.stats()
+
 # --- AI Usage ---
 def log_ai_usage(user_id, tokens):
     try:
-        supabase.table("ai_usage_logs").insert({
+        call_with_retry(supabase.table("ai_usage_logs").insert({
             "user_id": user_id,
             "tokens_used": tokens
-        }).execute()
+        }).execute, idempotent=False)
     except Exception as e:
          print(f"Error logging AI usage: {e}")
 
+# --- Usage Counters ---
+# Quotas live in usage_counters and change through the increment_counter RPC, a single atomic
+# UPDATE in the database, so concurrent sessions can't lose updates and a whole batch is
+# recorded in one round trip. With a limit, the RPC grants only what still fits (possibly 0),
+# which lets callers reserve quota before doing the work and release what they didn't use.
+def increment_counter(key, amount=1, limit=None):
+    """Atomically adds `amount` (may be negative) to a counter. Returns (new_value, granted)."""
+    try:
+        res = call_with_retry(
+            supabase.rpc("increment_counter", {"p_key": key, "p_amount": int(amount), "p_limit": limit}).execute,
+            idempotent=False
+        )
+        row = res.data[0] if res.data else {}
+        return int(row.get('value') or 0), int(row.get('granted') or 0)
+    except Exception as e:
+        if is_network_error(e):
+            raise
+        print(f"Counter RPC unavailable ({e}). Using system_config fallback.")
+        return _increment_config_counter(key, amount, limit)
+
+def _increment_config_counter(key, amount, limit):
+    """Legacy read-modify-write on system_config, only for databases without usage_counters."""
+    current = int(get_config(key, "0") or 0)
+    granted = amount if limit is None else min(amount, max(int(limit) - current, 0))
+    set_config(key, current + granted)
+    return current + granted, granted
+
+def get_counter(key):
+    try:
+        res = call_with_retry(supabase.table("usage_counters").select("value").eq("key", key).execute)
+        return int(res.data[0]['value']) if res.data else 0
+    except Exception as e:
+        if is_network_error(e):
+            raise
+        return int(get_config(key, "0") or 0)
+
+def reset_counter(key):
+    try:
+        call_with_retry(supabase.table("usage_counters").upsert({"key": key, "value": 0}).execute)
+    except Exception as e:
+        if is_network_error(e):
+            raise
+        set_config(key, 0)
+
+def _ai_usage_key():
+    return f"ai_usage_{datetime.now().strftime('%Y-%m-%d')}"
+
+def _notif_usage_key():
+    return f"notif_usage_{datetime.now().strftime('%Y-%m')}"
+
 # --- AI Usage (Global Daily Counter) ---
 def get_daily_ai_usage_count():
     """Returns the total AI calls made today globally."""
     try:
-        from datetime import datetime
-        today_key = f"ai_usage_{datetime.now().strftime('%Y-%m-%d')}"
-        val = get_config(today_key, "0")
-        return int(val)
+        return get_counter(_ai_usage_key())
     except:
         return 0
 
-def increment_daily_ai_usage():
+def increment_daily_ai_usage(n=1):
     """Increments the global counter for today."""
     try:
-        from datetime import datetime
-        today_key = f"ai_usage_{datetime.now().strftime('%Y-%m-%d')}"
-        current = get_daily_ai_usage_count()
-        set_config(today_key, current + 1)
-        return current + 1
+        return increment_counter(_ai_usage_key(), n)[0]
     except Exception as e:
         print(f"Error incrementing AI usage: {e}")
         return 999
 
+def reserve_daily_ai_usage(n=1):
+    """Takes n calls from today's quota before calling the model. Returns True if they fit."""
+    try:
+        granted = increment_counter(_ai_usage_key(), n, limit=get_ai_call_limit())[1]
+        if granted < n:
+            # All or nothing, return a partial grant
+            increment_counter(_ai_usage_key(), -granted)
+            return False
+        return True
+    except Exception as e:
+        print(f"Error reserving AI usage: {e}")
+        return False
+
+def release_daily_ai_usage(n=1):
+    """Gives back reserved calls that were not made (e.g. the model call failed)."""
+    try:
+        increment_counter(_ai_usage_key(), -n)
+    except Exception as e:
+        print(f"Error releasing AI usage: {e}")
+
 def reset_ai_usage():
     try:
-        from datetime import datetime
-        today_key = f"ai_usage_{datetime.now().strftime('%Y-%m-%d')}"
-        set_config(today_key, 0)
+        reset_counter(_ai_usage_key())
         return True
     except Exception as e:
         print(f"Error resetting: {e}")
@@ -1076,23 +2360,33 @@ def reset_ai_usage():
 # --- Notification Usage (Monthly) ---
 def get_monthly_notif_count():
     try:
-        from datetime import datetime
-        month_key = f"notif_usage_{datetime.now().strftime('%Y-%m')}"
-        val = get_config(month_key, "0")
-        return int(val)
+        return get_counter(_notif_usage_key())
     except:
         return 0
 
-def increment_monthly_notif():
+def increment_monthly_notif(n=1):
     try:
-        from datetime import datetime
-        month_key = f"notif_usage_{datetime.now().strftime('%Y-%m')}"
-        current = get_monthly_notif_count()
-        set_config(month_key, current + 1)
-        return current + 1
+        return increment_counter(_notif_usage_key(), n)[0]
     except:
         return 999
 
+def reserve_monthly_notif(n=1):
+    """Takes up to n emails from this month's quota. Returns how many were granted (0 at the limit)."""
+    try:
+        return increment_counter(_notif_usage_key(), n, limit=get_notif_limit())[1]
+    except Exception as e:
+        print(f"Error reserving notifications: {e}")
+        return 0
+
+def release_monthly_notif(n):
+    """Gives back reserved emails that were not sent."""
+    if n <= 0:
+        return
+    try:
+        increment_counter(_notif_usage_key(), -n)
+    except Exception as e:
+        print(f"Error releasing notifications: {e}")
+
 def get_notif_limit():
     val = get_config("notif_monthly_limit", "100")
     try:
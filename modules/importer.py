@@ -0,0 +1,402 @@
+"""
+Bulk import of expenses, purchase orders and budget items from CSV / XLSX.
+
+The file is read in chunks (pandas chunked CSV reader, openpyxl read-only rows), so memory
+stays flat for large month-close spreadsheets. Each chunk is mapped, validated and resolved
+with column operations, never row by row, and its valid rows are inserted with one request
+per data.BULK_INSERT_CHUNK_SIZE rows. Invalid rows are skipped and reported with their
+spreadsheet row number, and so are the rows of a request the database refused: the import
+goes on, and the error table lists exactly the rows to load again.
+"""
+import csv
+import io
+import time
+import unicodedata
+import pandas as pd
+from modules import data
+
+READ_CHUNK_ROWS = 2000
+ERROR_COLUMNS = ["fila", "columna", "valor", "error"] # The error report, in the user's terms
+
+# --- Import Specs ---
+# field -> (kind, required). Kinds: date, money, text, project, faena, unit.
+# Aliases are compared after normalize_header (lowercase, no accents, '_' separators).
+IMPORT_SPECS = {
+    "expenses": {
+        "label": "Gastos",
+        "fields": {
+            "date": ("date", True),
+            "project_id": ("project", True),
+            "faena_id": ("faena", False),
+            "unit_id": ("unit", False),
+            "category": ("text", False),
+            "amount": ("money", True),
+            "description": ("text", False),
+        },
+        "defaults": {"category": "General"},
+    },
+    "purchase_orders": {
+        "label": "Órdenes de Compra",
+        "fields": {
+            "project_id": ("project", True),
+            "order_number": ("text", True),
+            "provider_name": ("text", True),
+            "date": ("date", True),
+            "total_amount": ("money", True),
+            "description": ("text", False),
+            "status": ("text", False),
+        },
+        "defaults": {"status": "Pendiente", "description": ""},
+        "choices": {"status": ["Pendiente", "Aprobada", "Pagada", "Rechazada"]},
+    },
+    "budget_items": {
+        "label": "Partidas de Presupuesto",
+        "fields": {
+            "project_id": ("project", True),
+            "item_name": ("text", True),
+            "category": ("text", False),
+            "estimated_amount": ("money", True),
+        },
+        "defaults": {"category": "General"},
+    },
+}
+
+HEADER_ALIASES = {
+    "date": ["fecha", "fecha_emision", "fecha_gasto", "date"],
+    "project_id": ["proyecto", "obra", "project", "project_name", "project_id", "id_proyecto"],
+    "faena_id": ["faena", "frente", "faena_id"],
+    "unit_id": ["unidad", "equipo", "unit", "unit_id"],
+    "category": ["categoria", "tipo", "category"],
+    "amount": ["monto", "valor", "importe", "amount"],
+    "total_amount": ["monto", "monto_total", "total", "valor", "total_amount"],
+    "estimated_amount": ["monto", "monto_estimado", "presupuesto", "valor", "estimated_amount"],
+    "description": ["descripcion", "detalle", "glosa", "description"],
+    "order_number": ["n_orden", "no_orden", "numero_orden", "orden", "oc", "n_oc", "order_number"],
+    "provider_name": ["proveedor", "razon_social", "provider", "provider_name"],
+    "status": ["estado", "status"],
+    "item_name": ["partida", "item", "nombre", "item_name"],
+}
+
+
+def _strip_accents(text):
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+
+
+def normalize_header(name):
+    text = _strip_accents(str(name)).lower().strip()
+    return "_".join("".join(ch if ch.isalnum() else " " for ch in text).split())
+
+
+def normalize_names(series):
+    """Vectorized name key: trimmed, lowercase, no accents, single spaces."""
+    s = series.astype("string").str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+    return s.str.lower().str.split().str.join(" ")
+
+
+def map_columns(columns, target):
+    """Returns {file column: field} for the target's fields, first alias match wins."""
+    fields = IMPORT_SPECS[target]["fields"]
+    normalized = {normalize_header(c): c for c in columns}
+    mapping = {}
+    for field in fields:
+        for alias in HEADER_ALIASES.get(field, [field]):
+            if alias in normalized and normalized[alias] not in mapping:
+                mapping[normalized[alias]] = field
+                break
+    return mapping
+
+
+def missing_columns(columns, target):
+    """Required fields with no matching column in the file header."""
+    mapped = set(map_columns(columns, target).values())
+    return [f for f, (_, required) in IMPORT_SPECS[target]["fields"].items() if required and f not in mapped]
+
+
+# --- Readers ---
+def _sniff_csv(raw):
+    """Encoding and separator from the first bytes (Excel in es-CL saves ';' and latin-1)."""
+    for encoding in ("utf-8-sig", "latin-1"):
+        try:
+            sample = raw.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    try:
+        sep = csv.Sniffer().sniff(sample.split("\n", 1)[0], delimiters=";,\t|").delimiter
+    except csv.Error:
+        sep = ","
+    return encoding, sep
+
+
+def read_chunks(file, filename=None, chunk_rows=READ_CHUNK_ROWS):
+    """
+    Yields (DataFrame of strings, fraction of the file read) per chunk.
+    file is a path or a binary file object (e.g. a Streamlit UploadedFile).
+    """
+    name = (filename or getattr(file, "name", "") or str(file)).lower()
+    if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__"):
+        with open(file, "rb") as opened:
+            yield from read_chunks(opened, name, chunk_rows)
+        return
+    if name.endswith((".xlsx", ".xlsm")):
+        yield from _read_xlsx_chunks(file, chunk_rows)
+        return
+
+    file.seek(0, io.SEEK_END)
+    size = file.tell() or 1
+    file.seek(0)
+    encoding, sep = _sniff_csv(file.read(4096))
+    file.seek(0)
+    reader = pd.read_csv(file, sep=sep, encoding=encoding, dtype=str, keep_default_na=False,
+                         skipinitialspace=True, chunksize=chunk_rows)
+    for chunk in reader:
+        # The parser reads ahead, so this is an estimate
+        yield chunk, min(file.tell() / size, 1.0)
+
+
+def _read_xlsx_chunks(file, chunk_rows):
+    from openpyxl import load_workbook
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        total = max((ws.max_row or 1) - 1, 1)
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h).strip() if h is not None else f"col_{i}" for i, h in enumerate(header)]
+        buffer, done = [], 0
+        for row in rows:
+            if all(v is None or v == "" for v in row):
+                continue
+            buffer.append(row)
+            if len(buffer) == chunk_rows:
+                done += len(buffer)
+                yield _xlsx_frame(buffer, header), min(done / total, 1.0)
+                buffer = []
+        if buffer:
+            yield _xlsx_frame(buffer, header), 1.0
+    finally:
+        wb.close()
+
+
+def _xlsx_frame(rows, header):
+    width = len(header)
+    df = pd.DataFrame([tuple(r[:width]) + (None,) * (width - len(r)) for r in rows], columns=header, dtype=object)
+    # Numbers and dates keep their cell types, the parsers handle both
+    return df.where(df.notna(), "")
+
+
+# --- Validation ---
+def parse_money(series):
+    """
+    Vectorized amounts: '$ 1.234.567', '1.234,5', '1,234.5', '1234.5', 1234.5.
+    The last of '.' or ',' is the decimal separator when both appear, a lone separator
+    followed by exactly three digits per group is a thousands separator (es-CL).
+    """
+    # Numeric cells (XLSX) are already numbers, '1.234' there means 1.234
+    is_num = series.map(type).isin([int, float])
+    s = series.where(~is_num, "").astype("string").str.replace(r"[\s$]", "", regex=True)
+    has_dot, has_comma = s.str.contains(".", regex=False), s.str.contains(",", regex=False)
+    both = has_dot & has_comma
+    comma_decimal = both & (s.str.rfind(",") > s.str.rfind("."))
+    dot_thousands = ~has_comma & s.str.fullmatch(r"-?\d{1,3}(\.\d{3})+")
+    comma_thousands = ~has_dot & s.str.fullmatch(r"-?\d{1,3}(,\d{3})+")
+
+    out = s.copy()
+    out = out.mask(comma_decimal, s.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    out = out.mask(both & ~comma_decimal, s.str.replace(",", "", regex=False))
+    out = out.mask(dot_thousands.fillna(False), s.str.replace(".", "", regex=False))
+    out = out.mask(comma_thousands.fillna(False), s.str.replace(",", "", regex=False))
+    out = out.mask(~both & has_comma & ~comma_thousands.fillna(False), s.str.replace(",", ".", regex=False))
+    return pd.to_numeric(out, errors="coerce").mask(is_num, pd.to_numeric(series.where(is_num), errors="coerce"))
+
+
+def parse_dates(series):
+    """Vectorized dates: ISO (2024-03-31), dd/mm/yyyy, dd-mm-yyyy, or Excel date cells."""
+    is_ts = series.map(lambda v: hasattr(v, "year")) # datetime / date cells
+    text = series.where(~is_ts, "").astype("string").str.strip()
+    iso = pd.to_datetime(text.where(text.str.match(r"^\d{4}-\d{2}-\d{2}")), format="ISO8601", errors="coerce")
+    local = pd.to_datetime(text.str.replace("-", "/", regex=False), format="%d/%m/%Y", errors="coerce")
+    parsed = iso.fillna(local)
+    if is_ts.any():
+        parsed = parsed.mask(is_ts, pd.to_datetime(series.where(is_ts), errors="coerce"))
+    return parsed
+
+
+class LookupIndex:
+    """Name -> id maps for projects, faenas (per project) and units, built once per import."""
+
+    def __init__(self):
+        projects = data.get_projects(columns=("id", "name")) # A tuple, so the read is cached
+        self.project_ids = set(projects["id"].dropna().astype(int))
+        self.projects = pd.Series(projects["id"].values, index=normalize_names(projects["name"]).values)
+        self.projects = self.projects[~self.projects.index.duplicated()]
+
+        faenas = data.get_faenas()
+        if faenas.empty:
+            self.faenas = pd.Series(dtype="Int64")
+        else:
+            keys = faenas["project_id"].astype("string") + "|" + normalize_names(faenas["name"])
+            self.faenas = pd.Series(faenas["id"].values, index=keys.values)
+            self.faenas = self.faenas[~self.faenas.index.duplicated()]
+
+        units = data.get_units()
+        if units.empty:
+            self.units = pd.Series(dtype="Int64")
+        else:
+            self.units = pd.Series(units["id"].values, index=normalize_names(units["name"]).values)
+            self.units = self.units[~self.units.index.duplicated()]
+
+    def resolve_projects(self, series):
+        ids = normalize_names(series).map(self.projects)
+        # A numeric cell may already be a project id
+        as_id = pd.to_numeric(series, errors="coerce")
+        known = as_id.isin(self.project_ids)
+        return ids.fillna(as_id.where(known)).astype("Int64")
+
+    def resolve_faenas(self, series, project_ids):
+        keys = project_ids.astype("string") + "|" + normalize_names(series)
+        return keys.map(self.faenas).astype("Int64")
+
+    def resolve_units(self, series):
+        return normalize_names(series).map(self.units).astype("Int64")
+
+
+def validate_chunk(df, target, lookups, first_row=2):
+    """
+    Maps, converts and resolves one chunk. Returns (records ready to insert, errors DataFrame).
+    first_row is the spreadsheet row number of the chunk's first line (header is row 1).
+    """
+    spec = IMPORT_SPECS[target]
+    df = df.rename(columns=map_columns(df.columns, target))
+    df.index = pd.RangeIndex(first_row, first_row + len(df))
+    out = pd.DataFrame(index=df.index)
+    errors = []
+
+    def fail(mask, field, message):
+        mask = mask.fillna(False)
+        if mask.any():
+            raw = df[field] if field in df.columns else pd.Series("", index=df.index)
+            errors.append(pd.DataFrame({
+                "fila": df.index[mask], "columna": field,
+                "valor": raw[mask].astype("string").values, "error": message
+            }))
+
+    for field, (kind, required) in spec["fields"].items():
+        raw = df[field] if field in df.columns else pd.Series("", index=df.index, dtype=object)
+        blank = raw.astype("string").str.strip().fillna("").eq("")
+        if required:
+            fail(blank, field, "Campo obligatorio vacío")
+
+        if kind == "date":
+            value = parse_dates(raw)
+            fail(~blank & value.isna(), field, "Fecha inválida (use dd/mm/aaaa o aaaa-mm-dd)")
+            value = value.dt.strftime("%Y-%m-%d")
+        elif kind == "money":
+            value = parse_money(raw)
+            fail(~blank & value.isna(), field, "Monto inválido")
+            fail(value < 0, field, "Monto negativo")
+        elif kind == "project":
+            value = lookups.resolve_projects(raw)
+            fail(~blank & value.isna(), field, "Proyecto no encontrado")
+        elif kind == "faena":
+            value = lookups.resolve_faenas(raw, out["project_id"])
+            fail(~blank & value.isna() & out["project_id"].notna(), field, "Faena no encontrada en el proyecto")
+        elif kind == "unit":
+            value = lookups.resolve_units(raw)
+            fail(~blank & value.isna(), field, "Unidad no encontrada")
+        else:
+            value = raw.astype("string").str.strip().mask(blank)
+            if field in spec.get("choices", {}):
+                fail(~blank & ~value.isin(spec["choices"][field]), field,
+                     f"Valor no permitido ({', '.join(spec['choices'][field])})")
+        if field in spec.get("defaults", {}):
+            value = value.fillna(spec["defaults"][field])
+        out[field] = value
+
+    errors = pd.concat(errors, ignore_index=True) if errors else pd.DataFrame(columns=ERROR_COLUMNS)
+    valid = out.loc[~out.index.isin(errors["fila"])]
+    # JSON-ready: None instead of NA, Python ints and floats
+    records = valid.astype(object).where(valid.notna(), None).to_dict("records")
+    return records, errors
+
+
+# --- Pipeline ---
+
+def _server_message(e):
+    """The database's own message when there is one (postgrest APIError), else the exception text."""
+    return getattr(e, "message", None) or str(e)
+
+
+def insert_records(target, records, rows):
+    """
+    Inserts validated records one request per data.BULK_INSERT_CHUNK_SIZE, going on past a
+    refused request. rows are the records' spreadsheet row numbers.
+    Returns (rows inserted, errors DataFrame with one line per row not inserted).
+    """
+    inserted, errors = 0, []
+    size = data.BULK_INSERT_CHUNK_SIZE
+    for start in range(0, len(records), size):
+        try:
+            inserted += data.bulk_insert(target, records[start:start + size])
+        except Exception as e:
+            failed = rows[start:start + size]
+            errors.append(pd.DataFrame({"fila": failed, "columna": "", "valor": "",
+                                        "error": f"No guardada: {_server_message(e)}"}))
+    return inserted, pd.concat(errors, ignore_index=True) if errors else pd.DataFrame(columns=ERROR_COLUMNS)
+
+
+def run_import(file, target, filename=None, on_progress=None, chunk_rows=READ_CHUNK_ROWS):
+    """
+    Reads, validates and inserts a whole file.
+    on_progress(stats) is called after every chunk with the running counters.
+    Returns the final stats dict, also when the file can't be read to the end (stats['error'],
+    the rows before it stay imported); stats['errors'] is a DataFrame of rejected cells and
+    of the rows the database refused (rows_failed).
+    """
+    if target not in IMPORT_SPECS:
+        raise ValueError(f"Unknown import target: {target}")
+    start = time.perf_counter()
+    lookups = LookupIndex()
+    stats = {"rows_read": 0, "rows_inserted": 0, "rows_rejected": 0, "rows_failed": 0, "fraction": 0.0,
+             "elapsed": 0.0, "rows_per_second": 0.0, "missing_columns": [], "errors": None, "error": None}
+    all_errors = []
+    next_row = 2
+
+    try:
+        for chunk, fraction in read_chunks(file, filename, chunk_rows):
+            if stats["rows_read"] == 0:
+                stats["missing_columns"] = missing_columns(chunk.columns, target)
+                if stats["missing_columns"]:
+                    break
+            records, errors = validate_chunk(chunk, target, lookups, first_row=next_row)
+            invalid = set(errors["fila"])
+            rows = [r for r in range(next_row, next_row + len(chunk)) if r not in invalid]
+            next_row += len(chunk)
+            stats["rows_read"] += len(chunk)
+            inserted, failed = insert_records(target, records, rows)
+            stats["rows_inserted"] += inserted
+            stats["rows_failed"] += len(records) - inserted
+            stats["rows_rejected"] += len(chunk) - len(records)
+            all_errors.extend(e for e in (errors, failed) if not e.empty)
+
+            stats["fraction"] = fraction
+            stats["elapsed"] = time.perf_counter() - start
+            stats["rows_per_second"] = stats["rows_read"] / stats["elapsed"] if stats["elapsed"] else 0.0
+            if on_progress:
+                on_progress(stats)
+    except Exception as e:
+        # A file that breaks halfway (bad encoding, corrupt sheet): keep the counts of what landed
+        stats["error"] = str(e)
+
+    stats["elapsed"] = time.perf_counter() - start
+    stats["rows_per_second"] = stats["rows_read"] / stats["elapsed"] if stats["elapsed"] else 0.0
+    stats["errors"] = pd.concat(all_errors, ignore_index=True) if all_errors else pd.DataFrame(columns=ERROR_COLUMNS)
+    return stats
+
+
+def template_csv(target):
+    """Header-only CSV with the expected column names, for the download button."""
+    headers = [HEADER_ALIASES.get(f, [f])[0] for f in IMPORT_SPECS[target]["fields"]]
+    return (";".join(headers) + "\n").encode("utf-8-sig")
@@ -0,0 +1,128 @@
+"""
+In-process instrumentation: timings of backend queries, data accessors and views.
+
+Events go into a bounded ring buffer (the oldest are dropped), so memory stays flat no matter
+how long the server runs. The admin panel summarizes the buffer per call with percentiles.
+Kinds:
+- query: one backend request (table.operation or rpc:function), with rows and response bytes
+- data: one data.* accessor call (including cache hits, which show up as fast calls)
+- view: one render_* view, end to end
+"""
+import functools
+import threading
+import time
+from collections import deque
+import pandas as pd
+
+RING_SIZE = 5000
+
+_events = deque(maxlen=RING_SIZE)
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def record(kind, name, seconds, rows=None, nbytes=None, ok=True):
+    with _lock:
+        _events.append((time.time(), kind, name, seconds, rows, nbytes, ok))
+
+
+def count_rows(value):
+    """Row count of an accessor result (DataFrame, list or dict), None when not tabular."""
+    if isinstance(value, (pd.DataFrame, list)):
+        return len(value)
+    return None
+
+
+# --- Payload bytes ---
+# The HTTP transport adds the response bytes read on this thread; a query reads the total
+# around its own execute(), so concurrent queries on other threads don't mix.
+def add_payload_bytes(n):
+    _local.nbytes = getattr(_local, "nbytes", 0) + n
+
+
+def take_payload_bytes():
+    n = getattr(_local, "nbytes", 0)
+    _local.nbytes = 0
+    return n
+
+
+class track:
+    """Context manager: times the block and records it, failed if it raised an Exception."""
+
+    def __init__(self, kind, name):
+        self.kind, self.name = kind, name
+        self.rows = None
+        self.nbytes = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Streamlit's rerun/stop are control flow (BaseException), not failures
+        ok = exc_type is None or not issubclass(exc_type, Exception)
+        record(self.kind, self.name, time.perf_counter() - self.start, self.rows, self.nbytes, ok)
+        return False
+
+
+def timed(kind, name=None):
+    """Decorator version of track, named after the function by default."""
+    def decorator(func):
+        label = name or func.__name__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(kind, label) as t:
+                result = func(*args, **kwargs)
+                t.rows = count_rows(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def timed_view(func):
+    """Times a render_* view end to end."""
+    return timed("view", f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}")(func)
+
+
+# --- Reports ---
+COLUMNS = ["at", "kind", "name", "seconds", "rows", "bytes", "ok"]
+
+
+def events(kind=None):
+    """The raw buffer as a DataFrame (newest last)."""
+    with _lock:
+        snapshot = list(_events)
+    df = pd.DataFrame(snapshot, columns=COLUMNS)
+    df["at"] = pd.to_datetime(df["at"], unit="s")
+    if kind:
+        df = df[df["kind"] == kind]
+    return df
+
+
+def summary(kind=None):
+    """Per (kind, name): calls, errors, p50/p95/p99/max ms, mean rows and KB. Slowest p95 first."""
+    df = events(kind)
+    if df.empty:
+        return pd.DataFrame(columns=["kind", "name", "calls", "errors", "p50_ms", "p95_ms", "p99_ms",
+                                     "max_ms", "total_s", "avg_rows", "avg_kb"])
+    df["ms"] = df["seconds"] * 1000
+    df["kb"] = pd.to_numeric(df["bytes"], errors="coerce") / 1024
+    df["rows"] = pd.to_numeric(df["rows"], errors="coerce")
+    g = df.groupby(["kind", "name"])
+    out = pd.DataFrame({
+        "calls": g.size(),
+        "errors": g["ok"].apply(lambda s: int((~s.astype(bool)).sum())),
+        "p50_ms": g["ms"].quantile(0.50),
+        "p95_ms": g["ms"].quantile(0.95),
+        "p99_ms": g["ms"].quantile(0.99),
+        "max_ms": g["ms"].max(),
+        "total_s": g["seconds"].sum(),
+        "avg_rows": g["rows"].mean(),
+        "avg_kb": g["kb"].mean(),
+    }).reset_index()
+    return out.sort_values("p95_ms", ascending=False, ignore_index=True).round(1)
+
+
+def reset():
+    with _lock:
+        _events.clear()
@@ -0,0 +1,151 @@
+"""
+Versioned schema migrations for both backends (run with migrate.py).
+
+supabase_setup.sql / schema.init_schema create the base schema; every later change is a
+numbered migration here. Each database records what it has applied in schema_migrations,
+so a migration runs exactly once per database, in version order, inside one transaction.
+- SQLite: applied automatically when the local backend opens the file.
+- Postgres: `python migrate.py up` with a direct connection (DATABASE_URL, needs psycopg),
+  or `python migrate.py sql` prints the pending SQL for the Supabase SQL editor.
+A migration is a list of statements per dialect ("postgres", "sqlite"); never edit one that
+has shipped, add a new version instead.
+"""
+import sqlite3
+from datetime import datetime, timezone
+
+MIGRATIONS_TABLE = "schema_migrations"
+
+# Tables created by update scripts that may be missing on older Supabase projects
+OPTIONAL_TABLES = ("compliance_documents", "lab_tests", "budget_items")
+
+
+def _index(table, *columns):
+    """CREATE INDEX for both dialects; on Postgres it is skipped if an optional table is missing."""
+    name = f"{table}_{'_'.join(columns)}_idx"
+    stmt = f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+    postgres = stmt
+    if table in OPTIONAL_TABLES:
+        postgres = f"DO $$ BEGIN IF to_regclass('public.{table}') IS NOT NULL THEN {stmt}; END IF; END $$"
+    return postgres, stmt
+
+
+def _migration(version, name, statements):
+    return {
+        "version": version, "name": name,
+        "postgres": [pg for pg, _ in statements], "sqlite": [lite for _, lite in statements],
+    }
+
+
+# --- Migrations ---
+# 1. Postgres does not index foreign keys by itself: every "WHERE project_id = ?" read, the
+#    embedded joins and the ON DELETE checks of delete_project_cascade were sequential scans.
+#    Also the date/status filters of get_*_expiring_soon (status is a neq filter there, so
+#    only the date range can use the index on projects and contracts).
+FK_COLUMNS = {
+    "project_assignments": ["project_id", "user_id"],
+    "tenders": ["project_id"],
+    "contracts": ["tender_id"],
+    "guarantees": ["contract_id"],
+    "purchase_orders": ["project_id", "contract_id"],
+    "budget_items": ["project_id"],
+    "tasks": ["project_id"],
+    "phases": ["project_id"],
+    "subcontractors": ["project_id"],
+    "compliance_documents": ["subcontractor_id"],
+    "quality_logs": ["project_id"],
+    "lab_tests": ["project_id"],
+    "faenas": ["project_id"],
+    "expenses": ["project_id", "faena_id", "unit_id"],
+    "comments": ["project_id", "user_id"],
+    "ai_usage_logs": ["user_id"],
+}
+
+MIGRATIONS = [
+    _migration(1, "fk_and_expiry_indexes", [
+        *[_index(table, col) for table, cols in FK_COLUMNS.items() for col in cols],
+        _index("projects", "end_date"),
+        _index("contracts", "end_date"),
+        _index("guarantees", "status", "expiration_date"),
+    ]),
+]
+
+
+def pending(applied):
+    """Migrations not in the applied version set, in version order."""
+    return [m for m in sorted(MIGRATIONS, key=lambda m: m["version"]) if m["version"] not in applied]
+
+
+def postgres_script(migrations):
+    """SQL for the Supabase SQL editor: one transaction per migration, recorded as applied."""
+    parts = [
+        f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (\n"
+        "  version INTEGER PRIMARY KEY,\n  name TEXT NOT NULL,\n"
+        "  applied_at TIMESTAMP WITH TIME ZONE DEFAULT now()\n);"
+    ]
+    for m in migrations:
+        body = "\n".join(f"{stmt};" for stmt in m["postgres"])
+        parts.append(
+            f"-- {m['version']}: {m['name']}\nBEGIN;\n{body}\n"
+            f"INSERT INTO {MIGRATIONS_TABLE} (version, name) VALUES ({m['version']}, '{m['name']}');\nCOMMIT;"
+        )
+    return "\n\n".join(parts)
+
+
+# --- SQLite ---
+def sqlite_applied(conn):
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    return {r[0] for r in conn.execute(f"SELECT version FROM {MIGRATIONS_TABLE}")}
+
+
+def migrate_sqlite(db_path, target=None):
+    """Applies the pending migrations (up to target) to a SQLite file. Returns the versions applied."""
+    conn = sqlite3.connect(db_path)
+    done = []
+    try:
+        for m in pending(sqlite_applied(conn)):
+            if target is not None and m["version"] > target:
+                break
+            with conn: # One transaction: all statements and the version row, or nothing
+                for stmt in m["sqlite"]:
+                    conn.execute(stmt)
+                conn.execute(f"INSERT INTO {MIGRATIONS_TABLE} (version, name) VALUES (?, ?)", (m["version"], m["name"]))
+            done.append(m["version"])
+    finally:
+        conn.close()
+    return done
+
+
+# --- Postgres ---
+def postgres_applied(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (version INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+            "applied_at TIMESTAMP WITH TIME ZONE DEFAULT now())"
+        )
+        cur.execute(f"SELECT version FROM {MIGRATIONS_TABLE}")
+        applied = {r[0] for r in cur.fetchall()}
+    conn.commit()
+    return applied
+
+
+def migrate_postgres(conn, target=None):
+    """Applies the pending migrations through a psycopg connection. Returns the versions applied."""
+    done = []
+    for m in pending(postgres_applied(conn)):
+        if target is not None and m["version"] > target:
+            break
+        with conn.transaction(), conn.cursor() as cur:
+            for stmt in m["postgres"]:
+                cur.execute(stmt)
+            cur.execute(
+                f"INSERT INTO {MIGRATIONS_TABLE} (version, name, applied_at) VALUES (%s, %s, %s)",
+                (m["version"], m["name"], datetime.now(timezone.utc))
+            )
+        done.append(m["version"])
+    return done
@@ -0,0 +1,232 @@
+"""
+Local columnar mirror of the large tables, kept current with delta syncs.
+
+Each mirrored table lives in <MIRROR_DIR>/<table>.arrow, an uncompressed Arrow IPC file that
+is read through a memory map, so a read costs no network, no JSON decoding and no copy for
+numeric columns. A sync only pulls:
+- rows with id past the last id seen (inserts),
+- rows with updated_at at or past the last updated_at seen, less WATERMARK_MARGIN_SECONDS
+  (updates, see update_row_versions.py),
+- and the id column alone to drop deleted rows, when the table's cache version changed (a delete
+  bumps it like any write) and at least every RECONCILE_SECONDS otherwise.
+Syncs run lazily on read, when the table's cache version changed (a write in this process or a
+change feed event) or the mirror is older than MAX_AGE_SECONDS.
+A table without updated_at (update_row_versions.py not run yet) can't be delta-synced: edits
+would never reach the mirror. It is read over the network instead, and checked again after
+UNMIRRORABLE_RECHECK_SECONDS.
+"""
+import json
+import os
+import threading
+import time
+import pandas as pd
+import pyarrow as pa
+from modules import backend, data, schema
+
+MAX_AGE_SECONDS = 300
+RECONCILE_SECONDS = 600
+UNMIRRORABLE_RECHECK_SECONDS = 600
+# updated_at is now() of the writing transaction, i.e. its start: a row committed after the
+# last sync can carry an older updated_at than rows already pulled. Overlap to catch it.
+WATERMARK_MARGIN_SECONDS = 60
+
+
+def mirror_dir():
+    return os.environ.get("NOVENAPP_MIRROR_DIR") or backend._secret("mirror", "DIR", ".mirror")
+
+
+def enabled():
+    """On for the hosted backend (the local one is already on disk). env NOVENAPP_MIRROR=0/1 or secrets [mirror] ENABLED."""
+    flag = os.environ.get("NOVENAPP_MIRROR") or backend._secret("mirror", "ENABLED")
+    if flag is None:
+        return data.supabase.name == "supabase"
+    return str(flag).lower() in ("1", "true", "yes")
+
+
+class TableMirror:
+    def __init__(self, table, directory=None):
+        self.table = table
+        directory = directory or mirror_dir()
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{table}.arrow")
+        self.meta_path = os.path.join(directory, f"{table}.json")
+        self.lock = threading.Lock()
+        self.seen_version = None
+        self.unmirrorable = None # Why reads go over the network instead, see _disable
+        self.recheck_at = 0.0
+        self.meta = self._load_meta()
+
+    def _load_meta(self):
+        try:
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            if os.path.exists(self.path):
+                return meta
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def _save(self, df):
+        arrow = pa.Table.from_pandas(df, preserve_index=False)
+        tmp = self.path + ".tmp"
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, arrow.schema) as writer:
+            writer.write_table(arrow)
+        # Readers holding the old memory map keep a valid file until they drop it
+        os.replace(tmp, self.path)
+        with open(self.meta_path + ".tmp", "w") as f:
+            json.dump(self.meta, f)
+        os.replace(self.meta_path + ".tmp", self.meta_path)
+
+    def _fetch(self, **kwargs):
+        rows = [r for page in data.iter_records(self.table, **kwargs) for r in page]
+        return data.apply_dtypes(pd.DataFrame(rows), self.table) if rows else pd.DataFrame()
+
+    def _watermarks(self, df):
+        self.meta["max_id"] = int(df["id"].max()) if not df.empty else self.meta.get("max_id", 0)
+        if "updated_at" in df.columns and df["updated_at"].notna().any():
+            self.meta["max_updated_at"] = df["updated_at"].max().isoformat()
+        self.meta["rows"] = len(df)
+
+    def _disable(self, reason):
+        print(f"Mirror {self.table}: {reason}, reading it over the network.")
+        self.unmirrorable = reason
+        self.recheck_at = time.time() + UNMIRRORABLE_RECHECK_SECONDS
+        self.meta = {}
+        for path in (self.meta_path, self.path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return None
+
+    def available(self):
+        """False while the table is known not to be mirrorable (reads go over the network)."""
+        return self.unmirrorable is None or time.time() >= self.recheck_at
+
+    def _check_row_versions(self):
+        """Why the table can't be mirrored (no updated_at column), or None. One single-row query."""
+        try:
+            data.call_with_retry(lambda: data.supabase.table(self.table).select("updated_at").limit(1).execute())
+        except Exception as e:
+            if data.is_network_error(e) or isinstance(e, data.CircuitOpenError):
+                raise
+            return f"no updated_at column ({e})"
+        return None
+
+    # --- Sync ---
+    def sync(self, force_full=False):
+        """
+        Brings the mirror up to date. Returns the number of rows pulled over the network, or None
+        when the table can't be mirrored.
+        """
+        with self.lock:
+            if not force_full and not self.available():
+                return None
+            version = data.table_version(self.table)
+            now = time.time()
+            if force_full or not self.meta.get("max_updated_at"):
+                reason = self._check_row_versions()
+                if reason:
+                    return self._disable(reason)
+                df = data.call_with_retry(self._fetch)
+                self.meta = {"synced_at": now, "reconciled_at": now, "full_syncs": self.meta.get("full_syncs", 0) + 1}
+                self._watermarks(df)
+                if not self.meta.get("max_updated_at"):
+                    return self._disable("no rows with updated_at to sync changes from")
+                self.unmirrorable = None
+                self._save(df)
+                self.seen_version = version
+                return len(df)
+
+            base = self.read_unlocked()
+            fresh = data.call_with_retry(self._fetch, after=self.meta.get("max_id") or 0)
+            since = (pd.Timestamp(self.meta["max_updated_at"]) - pd.Timedelta(seconds=WATERMARK_MARGIN_SECONDS)).isoformat()
+            try:
+                changed = data.call_with_retry(self._fetch, where=lambda q: q.gte("updated_at", since))
+            except Exception as e:
+                if data.is_network_error(e) or isinstance(e, data.CircuitOpenError):
+                    raise
+                # Serving the copy without its updates would be stale, not just slow
+                return self._disable(f"could not read updated rows ({e})")
+
+            deleted = pd.Index([])
+            # A version change may be a delete, and deletes leave no row to pull by id or updated_at
+            if version != self.seen_version or now - self.meta.get("reconciled_at", 0) > RECONCILE_SECONDS:
+                ids = data.call_with_retry(self._fetch, columns="id")
+                live = ids["id"] if not ids.empty else pd.Series(dtype="int64")
+                deleted = base.loc[~base["id"].isin(live), "id"] if not base.empty else deleted
+                self.meta["reconciled_at"] = now
+
+            delta = pd.concat([f for f in (fresh, changed) if not f.empty]) if not (fresh.empty and changed.empty) else pd.DataFrame()
+            if not delta.empty or len(deleted):
+                keep = base[~base["id"].isin(delta["id"] if not delta.empty else []) & ~base["id"].isin(deleted)]
+                merged = pd.concat([keep, delta.drop_duplicates("id", keep="last")], ignore_index=True) if not delta.empty else keep
+                merged = data.apply_dtypes(merged.sort_values("id", ignore_index=True), self.table)
+                self._watermarks(merged)
+                self.meta["synced_at"] = now
+                self._save(merged)
+            else:
+                self.meta["synced_at"] = now
+                with open(self.meta_path, "w") as f:
+                    json.dump(self.meta, f)
+            self.seen_version = version
+            return len(fresh) + len(changed)
+
+    def is_stale(self):
+        return (
+            not self.meta
+            or self.seen_version != data.table_version(self.table)
+            or time.time() - self.meta.get("synced_at", 0) > MAX_AGE_SECONDS
+        )
+
+    # --- Reads ---
+    def read_unlocked(self, columns=None):
+        if not os.path.exists(self.path):
+            return pd.DataFrame()
+        with pa.memory_map(self.path, "r") as source:
+            arrow = pa.ipc.open_file(source).read_all()
+        if columns:
+            arrow = arrow.select([c for c in columns if c in arrow.column_names])
+        return arrow.to_pandas()
+
+    def read(self, columns=None):
+        """
+        The mirrored table (synced first if stale), optionally projected to columns.
+        None when the table can't be mirrored, the caller queries it instead.
+        """
+        if not self.available():
+            return None
+        if self.is_stale():
+            self.sync()
+        with self.lock:
+            return self.read_unlocked(columns) if self.unmirrorable is None else None
+
+    def stats(self):
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return {"table": self.table, "rows": self.meta.get("rows", 0), "size_kb": size / 1024,
+                "max_id": self.meta.get("max_id"), "max_updated_at": self.meta.get("max_updated_at"),
+                "synced_at": self.meta.get("synced_at"), "unmirrorable": self.unmirrorable}
+
+
+_mirrors = {}
+_mirrors_lock = threading.Lock()
+
+
+def get_mirror(table):
+    with _mirrors_lock:
+        if table not in _mirrors:
+            _mirrors[table] = TableMirror(table)
+        return _mirrors[table]
+
+
+def read(table, columns=None):
+    return get_mirror(table).read(columns)
+
+
+def sync_all(force_full=False):
+    """Syncs every mirrored table; returns {table: rows pulled}, None for tables that can't be mirrored."""
+    return {t: get_mirror(t).sync(force_full) for t in schema.UPDATED_AT_TABLES}
+
+
+def get_stats():
+    return [get_mirror(t).stats() for t in schema.UPDATED_AT_TABLES]
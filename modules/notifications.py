@@ -36,36 +36,33 @@ async def _send_async(user_email, subject, message):
         print(f"DEBUG: Async Send Error: {e}")
         return False
 
-def send_notification(user_email, subject, message):
+def send_notification(user_email, subject, message, reserved=False):
     """
     Sends a notification via Email (NotificationAPI). Enforces Monthly Limit.
+    reserved=True means the caller already took this email from the quota (batch sends).
     """
     if not user_email:
         print("ERROR: Email/User ID is empty.")
         return False
 
-    # Check Limit
-    current = data.get_monthly_notif_count()
-    limit = data.get_notif_limit()
-    
-    if current >= limit:
-        print(f"LIMIT REACHED: Monthly notification limit ({limit}) exceeded.")
+    if not _init_api():
+        return False
+
+    # Take one email from the quota atomically (check and count in one step)
+    if not reserved and data.reserve_monthly_notif(1) == 0:
+        print(f"LIMIT REACHED: Monthly notification limit ({data.get_notif_limit()}) exceeded.")
         # Optional: We could trigger a dashboard alert here if we had a mechanism
         return False
-        
-    if _init_api():
-        try:
-            # Send
-            asyncio.run(_send_async(user_email, subject, message))
-            
-            # Increment Usage (Success assumed if no exception)
-            data.increment_monthly_notif()
+
+    try:
+        if asyncio.run(_send_async(user_email, subject, message)):
             return True
-        except Exception as e:
-            print(f"Sync Wrapper Error: {e}")
-            return False
-    else:
-        return False
+    except Exception as e:
+        print(f"Sync Wrapper Error: {e}")
+    # Not sent, give the email back to the quota
+    if not reserved:
+        data.release_monthly_notif(1)
+    return False
 
 # --- Templates ---
 def _tpl_project_alert(name, end_date, days):
@@ -144,6 +141,8 @@ def check_and_notify_deadlines():
         recipients = recipients[recipients['email'].str.contains("@", na=False)]
     else:
         return "Error: Columna email no detectada o vacía."
+    if recipients.empty:
+        return "Sin destinatarios con email válido."
     
     sent_count = 0
     from datetime import datetime
@@ -157,26 +156,34 @@ def check_and_notify_deadlines():
             if data.get_config(notif_key):
                 continue
 
-            end_dt = datetime.strptime(str(item[date_col]), '%Y-%m-%d')
+            end_dt = item[date_col] # Parsed by the data layer
+            end_str = end_dt.strftime('%Y-%m-%d')
             days_left = (end_dt - datetime.now()).days + 1
             
             # Subject
             if type_label == 'Garantía':
                 subject = f"⚠️ Vencimiento Garantía: {item.get('type', 'Doc')} ({days_left} días)"
-                msg = tpl_func(item.get('type', 'Doc'), item.get('amount', 0), item[date_col], days_left)
+                msg = tpl_func(item.get('type', 'Doc'), item.get('amount', 0), end_str, days_left)
             elif type_label == 'Contrato':
                 subject = f"⚠️ Vencimiento Contrato: {item.get('contractor_name', 'Contratista')} ({days_left} días)"
-                msg = tpl_func(item.get('contractor_name', 'Unknown'), item[date_col], days_left)
+                msg = tpl_func(item.get('contractor_name', 'Unknown'), end_str, days_left)
             else:
                 subject = f"⚠️ Vencimiento Proyecto: {item[name_col]} ({days_left} días)"
-                msg = tpl_func(item[name_col], item[date_col], days_left)
+                msg = tpl_func(item[name_col], end_str, days_left)
             
-            # Send to all recipients
-            success_any = False
-            for _, u in recipients.iterrows():
-                if send_notification(u['email'], subject, msg):
-                    success_any = True
-                    count += 1
+            # Reserve the whole batch in one call, then send to as many recipients as fit
+            granted = data.reserve_monthly_notif(len(recipients))
+            if granted == 0:
+                log.append(f"Límite mensual alcanzado, {type_label} ID {item['id']} no notificado.")
+                break
+            sent = 0
+            for _, u in recipients.head(granted).iterrows():
+                if send_notification(u['email'], subject, msg, reserved=True):
+                    sent += 1
+            # Give back the reserved emails that failed to go out
+            data.release_monthly_notif(granted - sent)
+            count += sent
+            success_any = sent > 0
             
             # Mark as notified if at least one email went out (or even if not, to avoid retry loops on errors? Better only on success)
             if success_any:
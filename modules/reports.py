@@ -65,8 +65,8 @@ def generate_project_report(project_id):
         
         for _, row in phases.iterrows():
             pdf.cell(60, 8, str(row['name']), 1)
-            pdf.cell(40, 8, str(row['start_date']), 1)
-            pdf.cell(40, 8, str(row['end_date']), 1)
+            pdf.cell(40, 8, row['start_date'].strftime('%d/%m/%Y') if pd.notna(row['start_date']) else "", 1)
+            pdf.cell(40, 8, row['end_date'].strftime('%d/%m/%Y') if pd.notna(row['end_date']) else "", 1)
             # Handle missing status col if old schema, else use it
             status = row.get('status', 'N/A')
             pdf.cell(40, 8, str(status), 1, 1)
@@ -140,7 +140,10 @@ class NovAPP_PDF(FPDF):
         
         for _, row in df.iterrows():
             for val in row:
-                txt = str(val)
+                if isinstance(val, pd.Timestamp):
+                    txt = val.strftime('%d/%m/%Y')
+                else:
+                    txt = '' if val is pd.NaT else str(val)
                 try: txt = txt.encode('latin-1', 'replace').decode('latin-1')
                 except: pass
                 # Truncate
@@ -3,9 +3,112 @@ import pandas as pd
 
 DB_NAME = "novenapp.db"
 
-def init_schema():
-    """Initializes the extended ERP Database Schema."""
-    conn = sqlite3.connect(DB_NAME)
+# --- Column Registry ---
+# Columns and pandas dtypes of each table, shared by both backends. modules/data.py uses it
+# to build projected selects and to return typed DataFrames (dates as datetime64, amounts as
+# float), so views do not have to re-parse them.
+#   int: numeric id/count (float if it has nulls)   float: amounts, coordinates
+#   str: text, left as is                           category: small fixed set of labels
+#   date: DATE -> datetime64                        datetime: TIMESTAMPTZ -> datetime64 (naive UTC)
+# status/category/type/role columns are categoricals (one int code per row instead of one
+# string object). Their categories are the labels present in the data (apply_dtypes drops
+# unused ones), so a frame can't take a new label (set it on a str copy), value_counts() of a
+# filtered frame also lists the filtered-out labels with 0, and map() returns a categorical
+# (map a str copy to get numbers that sort and fillna as numbers).
+TABLES = {
+    "projects": {
+        "id": "int", "name": "str", "description": "str", "budget_total": "float",
+        "start_date": "date", "end_date": "date", "status": "category",
+        "latitude": "float", "longitude": "float", "updated_at": "datetime"
+    },
+    "users": {
+        "id": "int", "username": "str", "password_hash": "str", "full_name": "str",
+        "role": "str", "email": "str"
+    },
+    "roles": {"id": "int", "name": "str", "description": "str"},
+    "project_assignments": {
+        "id": "int", "project_id": "int", "user_id": "int", "role": "category", "assigned_at": "datetime"
+    },
+    "tenders": {
+        "id": "int", "project_id": "int", "title": "str", "type": "category",
+        "budget_estimated": "float", "utm_value_at_creation": "float", "status": "category",
+        "ssd_code": "str", "mercado_publico_id": "str", "created_at": "datetime"
+    },
+    "contracts": {
+        "id": "int", "tender_id": "int", "contractor_name": "str", "rut_contractor": "str",
+        "amount": "float", "start_date": "date", "end_date": "date", "status": "category"
+    },
+    "guarantees": {
+        "id": "int", "contract_id": "int", "type": "category", "amount": "float",
+        "expiration_date": "date", "status": "category", "scanned_doc_path": "str"
+    },
+    "purchase_orders": {
+        "id": "int", "project_id": "int", "contract_id": "int", "provider_name": "str",
+        "date": "date", "total_amount": "float", "description": "str", "status": "category",
+        "order_number": "str", "updated_at": "datetime"
+    },
+    "budget_items": {
+        "id": "int", "project_id": "int", "item_name": "str", "category": "category",
+        "estimated_amount": "float", "created_at": "datetime", "updated_at": "datetime"
+    },
+    "tasks": {
+        "id": "int", "project_id": "int", "name": "str", "start_date": "date", "end_date": "date",
+        "type": "category", "status": "category", "tags": "str", "updated_at": "datetime"
+    },
+    "phases": {
+        "id": "int", "project_id": "int", "name": "str", "start_date": "date", "end_date": "date",
+        "status": "category"
+    },
+    "subcontractors": {
+        "id": "int", "project_id": "int", "name": "str", "rut": "str", "contact_email": "str",
+        "contact_phone": "str", "specialty": "str", "representative": "str", "status": "category", "updated_at": "datetime"
+    },
+    "compliance_documents": {
+        "id": "int", "subcontractor_id": "int", "document_type": "category", "status": "category",
+        "expiration_date": "date", "last_updated": "datetime"
+    },
+    "quality_logs": {
+        "id": "int", "project_id": "int", "title": "str", "description": "str",
+        "inspector_name": "str", "signer_name": "str", "date": "datetime", "status": "category"
+    },
+    "lab_tests": {
+        "id": "int", "project_id": "int", "test_type": "category", "test_date": "date", "result": "category",
+        "observation": "str", "created_at": "datetime"
+    },
+    "faenas": {"id": "int", "project_id": "int", "name": "str", "supervisor": "str"},
+    "units": {"id": "int", "name": "str", "type": "category", "details": "str"},
+    "expenses": {
+        "id": "int", "date": "date", "project_id": "int", "faena_id": "int", "unit_id": "int",
+        "category": "category", "amount": "float", "description": "str", "evidence_path": "str", "updated_at": "datetime"
+    },
+    "comments": {
+        "id": "int", "project_id": "int", "user_id": "int", "content": "str", "timestamp": "datetime"
+    },
+    "system_config": {"key": "str", "value": "str"},
+    "usage_counters": {"key": "str", "value": "int", "updated_at": "datetime"},
+    "ai_usage_logs": {
+        "id": "int", "user_id": "int", "tokens_used": "int", "usage_date": "date", "timestamp": "datetime"
+    },
+}
+
+# Tables with an updated_at column maintained by a trigger, so the local mirror
+# (modules/mirror.py) can pull just the rows changed since its last sync
+UPDATED_AT_TABLES = ["projects", "purchase_orders", "subcontractors", "expenses", "budget_items", "tasks"]
+
+# Tables whose writes are published to the change feed (cache invalidation). usage_counters
+# changes on every AI call / email and is never cached, so it stays out.
+CHANGE_FEED_TABLES = [t for t in TABLES if t != "usage_counters"]
+
+def _add_column(c, table, column_def):
+    """ALTER TABLE ... ADD COLUMN for databases created before the column existed."""
+    try:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column_def}")
+    except sqlite3.OperationalError:
+        pass # Column already exists
+
+def init_schema(db_path=DB_NAME):
+    """Initializes the extended ERP Database Schema (mirrors supabase_setup.sql)."""
+    conn = sqlite3.connect(db_path)
     c = conn.cursor()
 
     # --- CORE MODULE ---
@@ -54,6 +157,16 @@ def init_schema():
             role TEXT NOT NULL
         )
     ''')
+    _add_column(c, "users", "email TEXT")
+
+    # Roles
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS roles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT
+        )
+    ''')
 
     # --- MODULE 1: LICITACIONES Y CONTRATOS ---
     # Tenders (Licitaciones)
@@ -71,6 +184,7 @@ def init_schema():
             FOREIGN KEY(project_id) REFERENCES projects(id)
         )
     ''')
+    _add_column(c, "tenders", "mercado_publico_id TEXT")
     
     # Contracts
     c.execute('''
@@ -114,6 +228,20 @@ def init_schema():
             FOREIGN KEY(project_id) REFERENCES projects(id)
         )
     ''')
+    _add_column(c, "purchase_orders", "description TEXT")
+    _add_column(c, "purchase_orders", "order_number TEXT")
+
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS budget_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER,
+            item_name TEXT NOT NULL,
+            category TEXT, -- Materiales, Mano de Obra, Subcontratos, Equipos, General
+            estimated_amount REAL NOT NULL DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(project_id) REFERENCES projects(id) ON DELETE CASCADE
+        )
+    ''')
 
     # --- MODULE 4: PRODUCTION (LEAN) ---
     c.execute('''
@@ -129,6 +257,18 @@ def init_schema():
         )
     ''')
 
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS phases (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER,
+            name TEXT,
+            start_date DATE,
+            end_date DATE,
+            status TEXT DEFAULT 'Pendiente',
+            FOREIGN KEY(project_id) REFERENCES projects(id)
+        )
+    ''')
+
     # --- MODULE 5: COMPLIANCE ---
     c.execute('''
         CREATE TABLE IF NOT EXISTS subcontractors (
@@ -139,6 +279,22 @@ def init_schema():
             status TEXT DEFAULT 'Activo'
         )
     ''')
+    _add_column(c, "subcontractors", "project_id INTEGER REFERENCES projects(id)")
+    _add_column(c, "subcontractors", "specialty TEXT")
+    _add_column(c, "subcontractors", "contact_phone TEXT")
+    _add_column(c, "subcontractors", "representative TEXT")
+
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS compliance_documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subcontractor_id INTEGER,
+            document_type TEXT NOT NULL, -- F30, F30-1, Carpeta Arranque
+            status TEXT DEFAULT 'Pendiente', -- Vigente, Vencido, Pendiente
+            expiration_date DATE,
+            last_updated DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(subcontractor_id) REFERENCES subcontractors(id) ON DELETE CASCADE
+        )
+    ''')
 
     # --- MODULE 6: QUALITY ---
     c.execute('''
@@ -153,6 +309,20 @@ def init_schema():
             FOREIGN KEY(project_id) REFERENCES projects(id)
         )
     ''')
+    _add_column(c, "quality_logs", "signer_name TEXT")
+
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS lab_tests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER,
+            test_type TEXT NOT NULL, -- Hormigón, Suelo, Acero
+            test_date DATE,
+            result TEXT, -- Aprobado, Rechazado, Pendiente
+            observation TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(project_id) REFERENCES projects(id) ON DELETE CASCADE
+        )
+    ''')
 
     # Ensure existing legacy tables exist if not covered (Expenses, Faenas, Units)
     # Copied from original data.py to ensure full coverage
@@ -192,6 +362,98 @@ def init_schema():
         )
     ''')
 
+    # --- PROJECT COLLABORATION ---
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS comments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER,
+            user_id INTEGER,
+            content TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(project_id) REFERENCES projects(id),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+
+    # --- ADMIN & CONFIG ---
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS system_config (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+
+    # Atomic quota counters (AI calls per day, emails per month), see increment_counter
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS usage_counters (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS ai_usage_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            tokens_used INTEGER DEFAULT 0,
+            usage_date DATE DEFAULT CURRENT_DATE,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+
+    # --- DASHBOARD KPIs ---
+    # Local equivalent of the get_kpi_summary() Postgres function (one row)
+    c.execute('''
+        CREATE VIEW IF NOT EXISTS kpi_summary AS
+        SELECT
+            (SELECT coalesce(sum(budget_total), 0) FROM projects) AS total_budget,
+            (SELECT coalesce(sum(total_amount), 0) FROM purchase_orders WHERE status IS NOT 'Rechazada') AS total_spent,
+            (SELECT coalesce(sum(total_amount), 0) FROM purchase_orders WHERE status = 'Pendiente') AS pending_po_amount,
+            (SELECT count(*) FROM tasks) AS total_tasks,
+            (SELECT count(*) FROM tasks WHERE status = 'Completado') AS completed_tasks,
+            (SELECT count(*) FROM subcontractors WHERE status = 'Activo') AS active_subs,
+            (SELECT count(*) FROM subcontractors) AS total_subs,
+            (SELECT count(*) FROM tenders WHERE status = 'Publicada') AS open_tenders
+    ''')
+
+    # --- ROW VERSIONS ---
+    # updated_at is stamped on every insert and update (SQLite can't ALTER ADD a column with a
+    # CURRENT_TIMESTAMP default, hence the triggers). ISO text with a 'T', so it compares as a
+    # string against the mirror's watermarks.
+    for table in UPDATED_AT_TABLES:
+        _add_column(c, table, "updated_at DATETIME")
+        c.execute(f"UPDATE {table} SET updated_at = strftime('%Y-%m-%dT%H:%M:%f', 'now') WHERE updated_at IS NULL")
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_stamp_updated_at AFTER INSERT ON {table}
+            WHEN NEW.updated_at IS NULL
+            BEGIN UPDATE {table} SET updated_at = strftime('%Y-%m-%dT%H:%M:%f', 'now') WHERE id = NEW.id; END
+        ''')
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_touch_updated_at AFTER UPDATE ON {table}
+            WHEN NEW.updated_at IS OLD.updated_at
+            BEGIN UPDATE {table} SET updated_at = strftime('%Y-%m-%dT%H:%M:%f', 'now') WHERE id = NEW.id; END
+        ''')
+
+    # --- CHANGE FEED ---
+    # Local stand-in for Supabase Realtime: every write appends a row here, and
+    # backend.PollingChangeFeed reads past its id watermark to invalidate cached reads.
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            op TEXT NOT NULL,
+            changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    for table in CHANGE_FEED_TABLES:
+        for op in ("INSERT", "UPDATE", "DELETE"):
+            c.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_{op.lower()}_changes AFTER {op} ON {table}
+                BEGIN INSERT INTO change_log (table_name, op) VALUES ('{table}', '{op}'); END
+            ''')
+
     conn.commit()
     conn.close()
     print("Database Schema Initialized.")
@@ -1,46 +1,21 @@
 import streamlit as st
 import pandas as pd
-from modules import data, ui
+from modules import data, metrics, ui
 from datetime import datetime, timedelta
 import plotly.graph_objects as go
 import plotly.express as px
 import textwrap
 
+@metrics.timed_view
 def render_dashboard():
-    # --- Data Fetching ---
-    kpis = data.get_kpis()
-    projects_df = data.get_projects()
-    expenses_df = data.get_expenses_df()
-    alerts_data = data.get_dashboard_alerts()
-    
-    # --- Pre-processing for Advanced Analytics ---
-    
-    # 1. Project Deadlines & Timeline
-    if not projects_df.empty:
-        projects_df['start_date'] = pd.to_datetime(projects_df['start_date'])
-        projects_df['end_date'] = pd.to_datetime(projects_df['end_date'])
-        projects_df['days_left'] = (projects_df['end_date'] - datetime.now()).dt.days
-        
-        # Risk flags
-        projects_df['risk_deadline'] = projects_df['days_left'] < 30
-    
-    # 2. Budget vs Real (Merge)
-    if not projects_df.empty and not expenses_df.empty:
-        exp_by_proj = expenses_df.groupby('project_id')['amount'].sum().reset_index()
-        budget_analysis = pd.merge(
-            projects_df[['id', 'name', 'budget_total', 'status']], 
-            exp_by_proj, 
-            left_on='id', 
-            right_on='project_id', 
-            how='left'
-        )
-        budget_analysis['amount'] = budget_analysis['amount'].fillna(0)
-        budget_analysis['utilization'] = (budget_analysis['amount'] / budget_analysis['budget_total']) * 100
-    else:
-        budget_analysis = projects_df.copy() if not projects_df.empty else pd.DataFrame()
-        if not budget_analysis.empty:
-             budget_analysis['amount'] = 0
-             budget_analysis['utilization'] = 0
+    # --- Data ---
+    # Built once per data version (see data.get_dashboard_snapshot); reruns only draw
+    snap = data.get_dashboard_snapshot(datetime.now().date())
+    kpis = snap['kpis']
+    projects_df = snap['projects']
+    budget_analysis = snap['budget_analysis']
+    alerts_data = snap['alerts']
+    timings = snap['timings']
 
     # --- Header ---
     c_title, c_date = st.columns([4, 1])
@@ -54,30 +29,19 @@ def render_dashboard():
     c1, c2, c3, c4, c5 = st.columns(5)
     
     # Active Projects
-    active_count = len(projects_df[projects_df['status'] == 'Activo']) if not projects_df.empty else 0
-    c1.metric("Proyectos Activos", active_count, delta="En ejecución", delta_color="normal")
+    c1.metric("Proyectos Activos", snap['active_count'], delta="En ejecución", delta_color="normal")
     
     # Budget Health
-    total_budget = kpis['total_budget']
-    total_spent = kpis['total_spent']
-    global_utilization = (total_spent / total_budget * 100) if total_budget > 0 else 0
-    c2.metric("Ejecución Presupuestal", f"{global_utilization:.1f}%", delta=f"${total_spent:,.0f} gastado", delta_color="inverse")
+    c2.metric("Ejecución Presupuestal", f"{snap['utilization']:.1f}%", delta=f"${kpis['total_spent']:,.0f} gastado", delta_color="inverse")
     
     # Pending POs
-    c3.metric("Órdenes Pendientes", f"${kpis.get('pending_po_amount', 0):,.0f}", delta=f"{alerts_data[0]['message'] if alerts_data else 'Sin atrasos'}", delta_color="off")
+    c3.metric("Órdenes Pendientes", f"${kpis.get('pending_po_amount', 0):,.0f}", delta=f"{sum(a['scope'] == 'Finanzas' for a in alerts_data)} por aprobar", delta_color="off")
 
     # Quality
-    lab_df = data.get_lab_tests(None)
-    pass_rate = 0
-    if not lab_df.empty:
-         pass_count = len(lab_df[lab_df['result'] == 'Aprobado'])
-         pass_rate = int((pass_count/len(lab_df))*100)
-    c4.metric("Calidad Global", f"{pass_rate}%", delta="Tasa Aprobación")
+    c4.metric("Calidad Global", f"{snap['pass_rate']}%", delta="Tasa Aprobación")
     
     # Team
-    t_stats = data.get_global_team_stats() # Assuming enhanced data function or reusing existing
-    # Fallback if get_global_team_stats isn't ready, use placeholder or kpis
-    c5.metric("Fuerza Laboral", t_stats.get('total_personnel', 0), delta="En terreno")
+    c5.metric("Fuerza Laboral", snap['team_total'], delta="En terreno")
 
     st.divider()
 
@@ -110,8 +74,7 @@ def render_dashboard():
         with st.container(border=True):
             st.markdown("##### 🚨 Próximos Vencimientos (< 60 días)")
             if not projects_df.empty:
-                # Filter risks
-                risks = projects_df[projects_df['days_left'] < 60].sort_values('days_left')
+                risks = snap['deadlines']
                 if not risks.empty:
                     st.dataframe(
                         risks[['name', 'end_date', 'days_left']],
@@ -162,8 +125,7 @@ def render_dashboard():
         with st.container(border=True):
             st.markdown("##### 🏗️ Distribución de Cartera")
             if not projects_df.empty:
-                status_counts = projects_df['status'].value_counts().reset_index()
-                status_counts.columns = ['status', 'count']
+                status_counts = snap['status_counts']
                 fig_pie = px.pie(
                     status_counts, 
                     values='count', 
@@ -183,7 +145,7 @@ def render_dashboard():
     
     with c_exp:
         st.subheader("📉 Últimos Movimientos")
-        recent_exp = data.get_recent_expenses(5)
+        recent_exp = snap['recent_expenses']
         if not recent_exp.empty:
             st.dataframe(
                 recent_exp[['date', 'category', 'amount', 'description']],
@@ -268,7 +230,6 @@ def render_dashboard():
                      
                      # Prep projects data for report
                      if not rp_projs.empty:
-                         rp_projs['end_date'] = pd.to_datetime(rp_projs['end_date'])
                          rp_projs['days_left'] = (rp_projs['end_date'] - datetime.now()).dt.days
                      
                      sections = []
@@ -309,7 +270,7 @@ def render_dashboard():
                           else:
                                exp_by_proj = pd.DataFrame(columns=['project_id', 'amount'])
                                
-                          merged = pd.merge(rp_projs, exp_by_proj, left_on='id', right_on='project_id', how='left').fillna(0)
+                          merged = pd.merge(rp_projs, exp_by_proj, left_on='id', right_on='project_id', how='left').fillna({'amount': 0})
                           merged = merged.sort_values('budget_total', ascending=True).tail(8) # Top 8
                           
                           fig1, ax1 = plt.subplots(figsize=(10, 5))
@@ -340,7 +301,6 @@ def render_dashboard():
 
                      # Chart 2: Time Series
                      if not rp_exp.empty:
-                         rp_exp['date'] = pd.to_datetime(rp_exp['date'])
                          m_exp = rp_exp.groupby(pd.Grouper(key='date', freq='ME'))['amount'].sum().reset_index()
                          
                          fig2, ax2 = plt.subplots(figsize=(10, 4))
@@ -392,8 +352,29 @@ def render_dashboard():
              if 'last_dash_pdf' in st.session_state:
                  st.download_button("📥 Descargar Reporte PDF", st.session_state['last_dash_pdf'], file_name="Reporte_Directorio.pdf", mime="application/pdf")
 
+    # --- Load Timings ---
+    with st.expander("⏱️ Tiempos de Carga"):
+        query_times = {k: v for k, v in timings.items() if k != 'total'}
+        slowest = max(query_times, key=query_times.get)
+        age = (datetime.now() - snap['built_at']).total_seconds()
+        st.caption(f"Resumen calculado hace {age:.0f} s; se recalcula cuando cambian sus tablas de origen.")
+        st.caption(
+            f"Carga del resumen: {timings['total'] * 1000:.0f} ms · consulta más lenta: {slowest} "
+            f"({query_times[slowest] * 1000:.0f} ms) · suma secuencial: {sum(query_times.values()) * 1000:.0f} ms"
+        )
+        flight = data.get_single_flight_stats()['run']
+        st.caption(
+            f"Lecturas en esta ejecución: {flight['fetches']} · duplicadas evitadas: {flight['duplicates_avoided']} "
+            f"({flight['waited_in_flight']} esperando una consulta en curso)"
+        )
+        st.dataframe(
+            pd.DataFrame({"Consulta": list(query_times), "ms": [round(v * 1000, 1) for v in query_times.values()]}),
+            hide_index=True, width='stretch'
+        )
+
 
 
+@metrics.timed_view
 def render_config():
     st.title("Configuración & Presupuestos")
     
@@ -465,6 +446,7 @@ def render_config():
                     st.success("Unidad creada.")
                     st.rerun()
 
+@metrics.timed_view
 def render_user_management():
     from modules import auth  
     st.title("Gestión de Usuarios y Roles")
@@ -1,12 +1,13 @@
 import streamlit as st
 import pandas as pd
-from modules import data, notifications
+from modules import data, metrics, mirror, notifications
 
+@metrics.timed_view
 def render_admin_panel():
     st.title("🛡️ Panel de Administración")
     st.caption("Zona Exclusiva para Rol: Programador")
     
-    tab_ai, tab_notif = st.tabs(["🤖 Gestión IA (Groq)", "🔔 Notificaciones"])
+    tab_ai, tab_notif, tab_db, tab_perf = st.tabs(["🤖 Gestión IA (Groq)", "🔔 Notificaciones", "🗄️ Base de Datos", "📈 Rendimiento"])
     
     # --- Tab 1: AI Management ---
     with tab_ai:
@@ -67,8 +68,9 @@ def render_admin_panel():
                 # Credentials are hardcoded now
                 st.info("Credenciales de API: Configuradas en servidor.")
                 
-                monthly_limit = st.number_input("Límite de Notificaciones Mensuales", value=int(data.get_config("notif_monthly_limit", 100)))
-                days_alert = st.number_input("Días de Aviso Prematuro (Plazo)", value=int(data.get_config("alert_days", 15)))
+                cfg = data.get_config_many(["notif_monthly_limit", "alert_days"], {"notif_monthly_limit": 100, "alert_days": 15})
+                monthly_limit = st.number_input("Límite de Notificaciones Mensuales", value=int(cfg["notif_monthly_limit"]))
+                days_alert = st.number_input("Días de Aviso Prematuro (Plazo)", value=int(cfg["alert_days"]))
                 
                 if st.form_submit_button("Guardar Configuración"):
                     s1, m1 = data.set_config("notif_monthly_limit", monthly_limit)
@@ -112,3 +114,120 @@ def render_admin_panel():
                 with st.spinner("Revisando BD..."):
                     result_log = notifications.check_and_notify_deadlines()
                     st.success(result_log)
+
+    # --- Tab 3: Database Connection ---
+    with tab_db:
+        render_db_health()
+
+    # --- Tab 4: Performance ---
+    with tab_perf:
+        render_performance()
+
+@metrics.timed_view
+def render_db_health():
+    """Connection pool, circuit breaker and query cache counters for this server process."""
+    st.subheader("Conexión a Base de Datos")
+    pool = data.get_pool_stats()
+    st.caption(f"Motor: {pool['engine']}")
+
+    if 'connections' in pool:
+        with st.container(border=True):
+            st.write("**Pool de Conexiones HTTP**")
+            c1, c2, c3, c4 = st.columns(4)
+            c1.metric("Conexiones", f"{pool['connections']} / {pool['setting_max_connections']}", delta=f"{pool['idle']} inactivas", delta_color="off")
+            c2.metric("En Curso", pool['in_flight'], delta=f"máx. {pool['peak_in_flight']}", delta_color="off")
+            c3.metric("Peticiones", f"{pool['requests']:,}", delta=f"{pool['errors']} errores", delta_color="inverse")
+            c4.metric("Latencia Media", f"{pool['avg_ms']:.0f} ms")
+            st.caption(
+                f"HTTP/2: {'Sí' if pool['setting_http2'] else 'No'} ({pool['http2_connections']} conexiones) · "
+                f"Keep-alive: {pool['setting_max_keepalive']} conexiones, {pool['setting_keepalive_expiry']:.0f}s · "
+                f"Timeouts: conexión {pool['setting_connect_timeout']:.0f}s, lectura {pool['setting_read_timeout']:.0f}s, "
+                f"pool {pool['setting_pool_timeout']:.0f}s"
+            )
+    else:
+        st.info(f"Base de datos local: {pool.get('database', '')}")
+
+    breaker = data.get_breaker_stats()
+    cache = data.get_cache_stats()
+    with st.container(border=True):
+        st.write("**Resiliencia y Caché**")
+        c1, c2, c3, c4 = st.columns(4)
+        state_label = {"closed": "🟢 Normal", "open": "🔴 Abierto", "half_open": "🟡 Probando"}
+        c1.metric("Circuit Breaker", state_label.get(breaker['state'], breaker['state']), delta=f"{breaker['trips']} aperturas", delta_color="off")
+        c2.metric("Llamadas Rechazadas", breaker['rejected_calls'])
+        c3.metric("Aciertos Caché", f"{cache['hit_rate']:.0f}%", delta=f"{cache['hits']} / {cache['hits'] + cache['misses']}", delta_color="off")
+        c4.metric("Entradas Caché", f"{cache['entries']} / {cache['max_entries']}")
+        feed = data.get_change_feed_stats()
+        if feed is not None:
+            status = "🟢 activo" if feed['live'] else f"🔴 detenido ({feed['error'] or 'conectando'})"
+            st.caption(f"Feed de cambios ({feed['kind']}): {status} · {feed['events']:,} eventos ({feed['echoes']:,} propios ignorados) · TTL caché {cache['ttl']}s")
+        st.caption(
+            f"Escrituras en caché: {cache['patches']:,} lecturas actualizadas en memoria · "
+            f"{cache['invalidations']:,} descartadas"
+        )
+        config = data.get_config_stats()
+        if config['age_seconds'] is not None:
+            st.caption(
+                f"Configuración en memoria: {config['keys']} claves, cargada hace {config['age_seconds']:.0f}s "
+                f"(TTL {config['ttl']}s) · {config['loads']} cargas, {config['reads']:,} lecturas"
+            )
+        if mirror.enabled():
+            mirror_stats = mirror.get_stats()
+            mirrored = [m for m in mirror_stats if m['synced_at']]
+            if mirrored:
+                st.caption("Espejo local: " + " · ".join(
+                    f"{m['table']} {m['rows']:,} filas ({m['size_kb']:,.0f} KB)" for m in mirrored
+                ))
+            unmirrored = [m['table'] for m in mirror_stats if m['unmirrorable']]
+            if unmirrored:
+                st.caption(f"Sin espejo (falta updated_at, ver update_row_versions.py): {', '.join(unmirrored)}")
+        flight = data.get_single_flight_stats()['totals']
+        st.caption(
+            f"Lecturas compartidas por ejecución: {flight['duplicates_avoided']:,} duplicadas evitadas "
+            f"de {flight['fetches'] + flight['duplicates_avoided']:,} en {flight['runs']:,} ejecuciones"
+        )
+        memory = data.get_cache_memory()
+        with st.expander(f"🧠 Memoria de caché: {memory['kb'].sum() / 1024:,.1f} MB"):
+            st.dataframe(memory, hide_index=True, width='stretch', column_config={
+                "accessor": "Función", "entries": "Entradas", "rows": "Filas",
+                "kb": st.column_config.NumberColumn("KB", format="%.1f")
+            })
+
+
+PERF_KINDS = {"query": "Consultas BD", "data": "Funciones data.*", "view": "Vistas"}
+
+def render_performance():
+    """Slowest backend queries, data accessors and views from the metrics ring buffer."""
+    st.subheader("Rendimiento")
+    st.caption(f"Últimos {metrics.RING_SIZE:,} eventos de este servidor (todas las sesiones). Tiempos en ms.")
+    c1, c2, c3 = st.columns([2, 1, 1])
+    kinds = c1.multiselect("Tipo", list(PERF_KINDS), default=["query", "view"], format_func=PERF_KINDS.get)
+    live = c2.toggle("En vivo (5 s)")
+    if c3.button("🧹 Reiniciar"):
+        metrics.reset()
+
+    def table():
+        summary = metrics.summary()
+        summary = summary[summary["kind"].isin(kinds)]
+        if summary.empty:
+            st.info("Sin mediciones todavía.")
+            return
+        st.dataframe(
+            summary,
+            column_config={
+                "kind": st.column_config.TextColumn("Tipo", width="small"),
+                "name": "Nombre",
+                "calls": "Llamadas",
+                "errors": "Errores",
+                "p50_ms": "p50", "p95_ms": "p95", "p99_ms": "p99", "max_ms": "Máx",
+                "total_s": st.column_config.NumberColumn("Total (s)", format="%.1f"),
+                "avg_rows": "Filas (prom.)",
+                "avg_kb": "KB (prom.)"
+            },
+            hide_index=True, width='stretch'
+        )
+        d1, d2 = st.columns(2)
+        d1.download_button("⬇️ Resumen CSV", summary.to_csv(index=False).encode("utf-8"), file_name="rendimiento_resumen.csv", mime="text/csv")
+        d2.download_button("⬇️ Eventos CSV", metrics.events().to_csv(index=False).encode("utf-8"), file_name="rendimiento_eventos.csv", mime="text/csv")
+
+    st.fragment(table, run_every=5 if live else None)()
@@ -3,7 +3,7 @@ import json
 import os
 import re
 from datetime import datetime
-from modules import ai_analysis, data
+from modules import ai_analysis, data, metrics
 # Import shared PDF class for consistency (Logo, Footer, etc.)
 from modules.reports_gen import NovAPP_PDF
 
@@ -154,6 +154,7 @@ def create_pdf_report_v2(report_text, stats):
     return pdf.output(dest='S').encode('latin-1')
 
 # --- Main View ---
+@metrics.timed_view
 def render_ai_view():
     st.caption("Inteligencia Artificial")
     col_head, col_logo = st.columns([4, 1])
@@ -202,17 +203,21 @@ def render_ai_view():
             st.error("🚫 Límite diario alcanzado.")
         
         if st.button("✨ Generar Análisis Ejecutivo", type="primary", disabled=btn_disabled, use_container_width=True):
-            with st.spinner("🤖 Analizando millones de datos..."):
-                try:
-                    stats = ai_analysis.gather_global_stats()
-                    report = ai_analysis.generate_executive_report(api_key, stats)
-                    increment_usage()
-                    
-                    st.session_state['ai_last_report'] = report
-                    st.session_state['ai_last_stats'] = stats
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"Error: {e}")
+            # Take the call from today's quota first, so concurrent sessions can't overshoot it
+            if not data.reserve_daily_ai_usage():
+                st.error("🚫 Límite diario alcanzado.")
+            else:
+                with st.spinner("🤖 Analizando millones de datos..."):
+                    try:
+                        stats = ai_analysis.gather_global_stats()
+                        report = ai_analysis.generate_executive_report(api_key, stats)
+                        
+                        st.session_state['ai_last_report'] = report
+                        st.session_state['ai_last_stats'] = stats
+                        st.rerun()
+                    except Exception as e:
+                        data.release_daily_ai_usage()
+                        st.error(f"Error: {e}")
 
     with col_output:
         if 'ai_last_report' in st.session_state:
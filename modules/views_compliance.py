@@ -1,6 +1,8 @@
 import streamlit as st
 import textwrap
+from modules import metrics
 
+@metrics.timed_view
 def render_compliance():
     # --- Backend & Imports ---
     from modules import compliance, data
@@ -20,7 +22,7 @@ def render_compliance():
            st.write("**Empresas Colaboradoras**")
            if st.button("Generar Reporte PDF"):
                import matplotlib.pyplot as plt
-               from modules import reports_gen, compliance
+               from modules import reports_gen
                
                # Fetch Current Data
                pid = st.session_state.get('comp_project_id')
@@ -254,10 +256,7 @@ def render_compliance():
                     
                     docs_df = compliance.get_documents(sub_id)
                     if not docs_df.empty:
-                        # Ensure columns are datetime
-                        docs_df['expiration_date'] = pd.to_datetime(docs_df['expiration_date'])
                         if 'last_updated' in docs_df.columns:
-                            docs_df['last_updated'] = pd.to_datetime(docs_df['last_updated'])
                             disp_cols = ['document_type', 'expiration_date', 'status', 'last_updated']
                             col_conf = {
                                 "document_type": "Tipo Doc",
@@ -1,8 +1,9 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from modules import finance, data
+from modules import finance, data, importer, metrics
 
+@metrics.timed_view
 def render_finance():
     # --- Header (Native) ---
     st.caption("ERP / Tesorería")
@@ -77,7 +78,7 @@ def render_finance():
                    disp_df = orders_df[['order_number', 'provider_name', 'total_amount', 'status', 'date']].head(20).copy()
                    disp_df.columns = ['N° Orden', 'Proveedor', 'Monto', 'Estado', 'Fecha']
                    disp_df['Monto'] = disp_df['Monto'].apply(lambda x: f"${x:,.0f}")
-                   disp_df['Fecha'] = pd.to_datetime(disp_df['Fecha']).dt.strftime('%d/%m/%Y')
+                   disp_df['Fecha'] = disp_df['Fecha'].dt.strftime('%d/%m/%Y')
                    
                    sections.append({
                        "type": "table",
@@ -133,6 +134,9 @@ def render_finance():
                     else:
                         st.error("Datos incompletos. Revisa Proyecto, N° Orden, Proveedor y Monto.")
 
+    with st.expander("📥 Importación Masiva (CSV / Excel)", expanded=False):
+        render_bulk_import()
+
     # Fetch Data
     stats = finance.get_financial_summary()
     orders_df = finance.get_purchase_orders()
@@ -243,3 +247,51 @@ def render_finance():
                      finance.delete_purchase_order(po_id)
                      st.toast("Orden eliminada", icon="🗑️")
                      st.rerun()
+
+
+@metrics.timed_view
+def render_bulk_import():
+    """Month-close loads of OC lines, expenses and budget items from a spreadsheet."""
+    targets = {k: spec["label"] for k, spec in importer.IMPORT_SPECS.items()}
+    c1, c2 = st.columns([2, 1])
+    target = c1.selectbox("Tipo de Registro", list(targets), format_func=targets.get, index=1)
+    c2.download_button("📄 Plantilla CSV", importer.template_csv(target), file_name=f"plantilla_{target}.csv", mime="text/csv")
+    st.caption("Proyecto, faena y unidad se buscan por nombre (sin distinguir mayúsculas ni tildes). Fechas dd/mm/aaaa o aaaa-mm-dd.")
+
+    uploaded = st.file_uploader("Archivo", type=["csv", "xlsx"], key=f"import_file_{target}")
+    if uploaded is None or not st.button("Importar", type="primary"):
+        return
+
+    bar = st.progress(0.0, text="Leyendo archivo...")
+    def on_progress(stats):
+        bar.progress(stats["fraction"], text=f"{stats['rows_read']:,} filas leídas · {stats['rows_inserted']:,} importadas · {stats['rows_per_second']:,.0f} filas/s")
+
+    try:
+        result = importer.run_import(uploaded, target, filename=uploaded.name, on_progress=on_progress)
+    except Exception as e:
+        st.error(f"Error durante la importación: {e}")
+        return
+    bar.progress(1.0, text="Importación finalizada" if not result["error"] else "Importación interrumpida")
+
+    if result["missing_columns"]:
+        st.error(f"Faltan columnas obligatorias: {', '.join(result['missing_columns'])}")
+        return
+    if result["error"]:
+        st.error(f"La lectura del archivo se detuvo después de la fila {result['rows_read'] + 1:,}: {result['error']}. "
+                 f"Las {result['rows_inserted']:,} filas importadas hasta ahí quedaron guardadas.")
+
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Filas Leídas", f"{result['rows_read']:,}")
+    m2.metric("Importadas", f"{result['rows_inserted']:,}")
+    m3.metric("Rechazadas", f"{result['rows_rejected'] + result['rows_failed']:,}",
+              delta=f"{result['rows_failed']:,} no guardadas" if result['rows_failed'] else None, delta_color="off")
+    m4.metric("Velocidad", f"{result['rows_per_second']:,.0f} filas/s", delta=f"{result['elapsed']:.1f} s", delta_color="off")
+
+    errors = result["errors"]
+    if not errors.empty:
+        st.warning(f"{len(errors):,} errores en {result['rows_rejected'] + result['rows_failed']:,} filas. "
+                   "Corrija el archivo y vuelva a importar solo esas filas (las importadas no se repiten).")
+        st.dataframe(errors.head(500), hide_index=True, width='stretch')
+        st.download_button("⬇️ Descargar Errores", errors.to_csv(index=False, sep=";").encode("utf-8-sig"), file_name=f"errores_{target}.csv", mime="text/csv")
+    else:
+        st.success("Todas las filas fueron importadas.")
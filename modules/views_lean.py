@@ -1,12 +1,171 @@
 import streamlit as st
-from modules import ui
+import pandas as pd
+from datetime import datetime
+from modules import data, lean, metrics, ui
 import textwrap
 
+KANBAN_STATUSES = {"Por Hacer": "gray", "En Curso": "blue", "Bloqueado": "red", "Completado": "green"}
+KANBAN_PAGE = 15 # Cards per column before "Mostrar más"
+
+def _split_tasks(tasks_df):
+    """(active, history). Active: not done, or done this month. History: done before this month."""
+    if tasks_df.empty:
+        return pd.DataFrame(), pd.DataFrame()
+    now = datetime.now()
+    is_done = tasks_df['status'] == 'Completado'
+    in_current_month = (tasks_df['end_date'].dt.month == now.month) & (tasks_df['end_date'].dt.year == now.year)
+    return tasks_df[(~is_done) | (is_done & in_current_month)].copy(), tasks_df[is_done & ~in_current_month].copy()
+
+# --- Kanban Board ---
+# The board is a fragment over a per-session working copy of the active tasks. A move, rename
+# or delete patches that copy and sends the single update: no refetch of the tasks, no rerun
+# of the rest of the page or of app.py. The copy is reloaded only when the tasks table changed
+# for another reason (a write from elsewhere, a new task).
+def _board(project_id):
+    version = data.table_version("tasks")
+    board = st.session_state.get('lean_board')
+    if board is None or board['project_id'] != project_id or board['version'] != version:
+        active, _ = _split_tasks(lean.get_tasks(project_id))
+        board = {"project_id": project_id, "version": version, "tasks": active}
+        st.session_state['lean_board'] = board
+    return board
+
+def _set_task_value(df, task_id, column, value):
+    if isinstance(df[column].dtype, pd.CategoricalDtype) and value not in df[column].cat.categories:
+        df[column] = df[column].cat.add_categories([value])
+    df.loc[df['id'] == task_id, column] = value
+    return df
+
+def _write_through(write, args, patch):
+    """Applies patch to the board copy, then the write; rolls the copy back if the write fails."""
+    board = st.session_state['lean_board']
+    before = board['tasks']
+    generation, seen = board['version']
+    board['tasks'] = patch(before.copy())
+    try:
+        write(*args)
+    except Exception as e:
+        board['tasks'] = before
+        st.session_state['lean_board_notice'] = ("warning", f"No se pudo guardar el cambio: {e}")
+        return
+    # Adopt the version bump of our own write (its change feed event isn't reported back to this
+    # process, so there is no second bump); any other change in between forces a reload
+    if data.table_version("tasks") == (generation, seen + 1):
+        board['version'] = (generation, seen + 1)
+
+def _on_move(task_id):
+    new_status = st.session_state[f"mv_{task_id}"]
+    _write_through(lean.update_task_status, (task_id, new_status), lambda df: _set_task_value(df, task_id, 'status', new_status))
+
+def _on_rename(task_id):
+    name = st.session_state[f"edit_task_name_{task_id}"]
+    _write_through(lean.update_task_details, (task_id, name), lambda df: _set_task_value(df, task_id, 'name', name))
+    _set_editing(None)
+
+def _on_delete(task_id):
+    _write_through(lean.delete_task, (task_id,), lambda df: df[df['id'] != task_id])
+    _set_editing(None)
+
+def _set_editing(task_id):
+    st.session_state['lean_edit_task'] = task_id
+
+def _on_create(project_id):
+    name = st.session_state['new_task_name']
+    if not name:
+        st.session_state['lean_board_notice'] = ("warning", "El nombre es obligatorio.")
+        return
+    lean.create_task(project_id, name, st.session_state['new_task_start'], st.session_state['new_task_end'], st.session_state['new_task_status'])
+    st.session_state['lean_board_notice'] = ("toast", "Tarea creada.")
+
+def _show_more():
+    st.session_state['lean_board_limit'] = st.session_state.get('lean_board_limit', KANBAN_PAGE) + KANBAN_PAGE
+
+@st.fragment
+def _active_plan(project_id):
+    board = _board(project_id)
+    active_df = board['tasks']
+    # Messages from the callbacks (elements can't be drawn from a callback in a fragment rerun)
+    notice = st.session_state.pop('lean_board_notice', None)
+    if notice and notice[0] == "toast":
+        st.toast(notice[1], icon="📌")
+    elif notice:
+        st.warning(notice[1])
+
+    # KPI Calculation (Based on Active Plan)
+    ppc = lean.get_ppc(active_df)
+
+    # Header Metrics
+    c_ppc, c_total = st.columns(2)
+    with c_ppc:
+        with st.container(border=True):
+            st.metric("PPC Semanal (Proyectado)", f"{ppc}%", delta="Meta: 85%")
+            st.progress(ppc / 100 if ppc <= 100 else 1.0)
+    with c_total:
+         with st.container(border=True):
+            st.metric("Tareas Activas", len(active_df), help="Pendientes + Terminadas este mes")
+
+    # Create Task Form
+    with st.expander("➕ Nueva Tarea de Planificación", expanded=False):
+        with st.form("new_task_form"):
+            st.write("**Agregar actvidad al plan**")
+            c1, c2 = st.columns(2)
+            c1.text_input("Nombre de la Tarea / Partida", key="new_task_name")
+            c2.selectbox("Estado Inicial", list(KANBAN_STATUSES), key="new_task_status")
+            c1.date_input("Inicio", key="new_task_start")
+            c2.date_input("Fin", key="new_task_end")
+            st.form_submit_button("Crear Tarea", type="primary", on_click=_on_create, args=(project_id,))
+
+    st.markdown("### Tablero Kanban")
+
+    if active_df.empty:
+        st.info("No hay tareas activas en este periodo.")
+        return
+
+    # Edit panel of the card whose ⚙️ was clicked: one form for the board instead of one per card
+    # (every keyed input scans the whole session state, so per-card forms made runs quadratic)
+    editing = active_df[active_df['id'] == st.session_state.get('lean_edit_task')]
+    if not editing.empty:
+        task = editing.iloc[0]
+        with st.container(border=True):
+            with st.form("edit_task_form"):
+                st.text_input("Editar Nombre", value=task['name'], key=f"edit_task_name_{task['id']}")
+                c_save, c_del, c_close = st.columns(3)
+                c_save.form_submit_button("Guardar", type="primary", on_click=_on_rename, args=(task['id'],))
+                c_del.form_submit_button("Eliminar", on_click=_on_delete, args=(task['id'],))
+                c_close.form_submit_button("Cerrar", on_click=_set_editing, args=(None,))
+
+    limit = st.session_state.get('lean_board_limit', KANBAN_PAGE)
+    statuses = list(KANBAN_STATUSES)
+    for col, (s_key, color) in zip(st.columns(4), KANBAN_STATUSES.items()):
+        with col:
+            filtered = active_df[active_df['status'] == s_key]
+            st.markdown(f":{color}[**{s_key}**] ({len(filtered)})")
+            
+            for _, row in filtered.head(limit).iterrows():
+                with st.container(border=True):
+                    st.write(f"**{row['name']}**")
+                    # Format date nicely
+                    d_str = row['end_date'].strftime('%d/%m')
+                    st.caption(f"🏁 {d_str}")
+                    
+                    # Move Logic
+                    st.selectbox(
+                        "Mover", 
+                        statuses,
+                        key=f"mv_{row['id']}",
+                        index=statuses.index(s_key),
+                        label_visibility="collapsed",
+                        on_change=_on_move, args=(row['id'],)
+                    )
+                        
+                    st.button("⚙️", key=f"ed_{row['id']}", on_click=_set_editing, args=(row['id'],))
+
+            if len(filtered) > limit:
+                st.button(f"Mostrar más ({len(filtered) - limit})", key=f"more_{s_key}", on_click=_show_more, width='stretch')
+
+@metrics.timed_view
 def render_lean():
     # --- Backend & Imports ---
-    from modules import lean, data
-    import pandas as pd
-    from datetime import datetime
     import plotly.express as px
 
     st.caption("Planificación y Control de Producción")
@@ -19,7 +178,7 @@ def render_lean():
            st.write("**Planificación Semanal**")
            if st.button("Generar Reporte de Planificación"):
                import matplotlib.pyplot as plt
-               from modules import reports_gen, lean
+               from modules import reports_gen
                
                # Fetch Data (re-fetch inside to ensure clean context if needed, though we have tasks_df outside scope?)
                # Accessing tasks_df from outer scope might be risky if not defined yet.
@@ -31,7 +190,7 @@ def render_lean():
                    # Calculate PPC
                    from datetime import datetime
                    now = datetime.now()
-                   active = tasks[~((tasks['status'] == 'Completado') & ( pd.to_datetime(tasks['end_date']) < pd.to_datetime(f"{now.year}-{now.month}-01") ))]
+                   active = tasks[~((tasks['status'] == 'Completado') & ( tasks['end_date'] < pd.Timestamp(now.year, now.month, 1) ))]
                    ppc_val = lean.get_ppc(active)
                    
                    sections = []
@@ -42,7 +201,7 @@ def render_lean():
                    })
                    
                    # Chart: Kanban Status
-                   status_counts = active['status'].value_counts()
+                   status_counts = active['status'].cat.remove_unused_categories().value_counts()
                    fig1, ax1 = plt.subplots(figsize=(6, 4))
                    status_counts.plot(kind='bar', color=['#9ca3af', '#3b82f6', '#ef4444', '#22c55e'], ax=ax1)
                    ax1.set_title("Estado de Tareas Activas")
@@ -101,113 +260,14 @@ def render_lean():
     tasks_df = lean.get_tasks(project_id)
     
     # 3. Filtering Logic
-    if not tasks_df.empty:
-        # Ensure date columns are datetime
-        tasks_df['end_date'] = pd.to_datetime(tasks_df['end_date'])
-        tasks_df['start_date'] = pd.to_datetime(tasks_df['start_date'])
-        
-        now = datetime.now()
-        current_month = now.month
-        current_year = now.year
-        
-        # ACTIVE: Not Done OR (Done AND Finished in Current Month)
-        # Using boolean indexing
-        is_done = tasks_df['status'] == 'Completado'
-        in_current_month = (tasks_df['end_date'].dt.month == current_month) & (tasks_df['end_date'].dt.year == current_year)
-        
-        active_df = tasks_df[(~is_done) | (is_done & in_current_month)].copy()
-        
-        # HISTORICAL: Done AND Finished BEFORE Current Month
-        history_df = tasks_df[is_done & ~in_current_month].copy()
-    else:
-        active_df = pd.DataFrame()
-        history_df = pd.DataFrame()
-
-    # 4. KPI Calculation (Based on Active Plan)
-    ppc = lean.get_ppc(active_df)
+    _, history_df = _split_tasks(tasks_df)
     
     # --- UI Layout ---
     tabs = st.tabs(["🚀 Planificación Activa", "📜 Historial & Métricas"])
 
     # --- TAB 1: ACTIVE PLAN ---
     with tabs[0]:
-        # Header Metrics
-        c_ppc, c_total = st.columns(2)
-        with c_ppc:
-            with st.container(border=True):
-                st.metric("PPC Semanal (Proyectado)", f"{ppc}%", delta="Meta: 85%")
-                st.progress(ppc / 100 if ppc <= 100 else 1.0)
-        with c_total:
-             with st.container(border=True):
-                st.metric("Tareas Activas", len(active_df), help="Pendientes + Terminadas este mes")
-
-        # Create Task Form
-        with st.expander("➕ Nueva Tarea de Planificación", expanded=False):
-            with st.form("new_task_form"):
-                st.write("**Agregar actvidad al plan**")
-                c1, c2 = st.columns(2)
-                name = c1.text_input("Nombre de la Tarea / Partida")
-                status = c2.selectbox("Estado Inicial", ["Por Hacer", "En Curso", "Bloqueado", "Completado"])
-                start = c1.date_input("Inicio")
-                end = c2.date_input("Fin")
-                
-                if st.form_submit_button("Crear Tarea", type="primary"):
-                    if name:
-                        lean.create_task(project_id, name, start, end, status)
-                        st.toast("Tarea creada.", icon="📌")
-                        st.rerun()
-                    else:
-                        st.warning("El nombre es obligatorio.")
-
-        st.markdown("### Tablero Kanban")
-        c_todo, c_prog, c_block, c_done = st.columns(4)
-        
-        stat_cols = {
-            "Por Hacer": (c_todo, "gray"),
-            "En Curso": (c_prog, "blue"),
-            "Bloqueado": (c_block, "red"),
-            "Completado": (c_done, "green")
-        }
-
-        if not active_df.empty:
-            for s_key, (col, color) in stat_cols.items():
-                with col:
-                    st.markdown(f":{color}[**{s_key}**]")
-                    filtered = active_df[active_df['status'] == s_key]
-                    
-                    for _, row in filtered.iterrows():
-                        with st.container(border=True):
-                            st.write(f"**{row['name']}**")
-                            # Format date nicely
-                            d_str = row['end_date'].strftime('%d/%m')
-                            st.caption(f"🏁 {d_str}")
-                            
-                            # Move Logic
-                            curr_idx = ["Por Hacer", "En Curso", "Bloqueado", "Completado"].index(s_key)
-                            new_st = st.selectbox(
-                                "Mover", 
-                                ["Por Hacer", "En Curso", "Bloqueado", "Completado"],
-                                key=f"mv_{row['id']}",
-                                index=curr_idx,
-                                label_visibility="collapsed"
-                            )
-                            
-                            if new_st != row['status']:
-                                lean.update_task_status(row['id'], new_st)
-                                st.rerun()
-                                
-                            with st.popover("⚙️"):
-                                with st.form(f"ed_{row['id']}"):
-                                    n_name = st.text_input("Editar Nombre", value=row['name'])
-                                    if st.form_submit_button("Guardar"):
-                                        lean.update_task_details(row['id'], n_name)
-                                        st.rerun()
-                                if st.button("Eliminar", key=f"dl_{row['id']}"):
-                                    lean.delete_task(row['id'])
-                                    st.rerun()
-                                    
-        else:
-            st.info("No hay tareas activas en este periodo.")
+        _active_plan(project_id)
 
     # --- TAB 2: HISTORY ---
     with tabs[1]:
@@ -1,7 +1,7 @@
 import streamlit as st
-import pandas as pd
-from modules import teams, data
+from modules import teams, data, metrics
 
+@metrics.timed_view
 def render_maps():
     p_col, _ = st.columns([1, 2]) # Keeping layout consistency if needed, but here we modify the header directly.
     
@@ -67,7 +67,7 @@ def render_maps():
                          # Prepare table for this project
                          disp_df = group[['full_name', 'username', 'role', 'assigned_at']].copy()
                          disp_df.columns = ['Colaborador', 'Usuario', 'Cargo / Rol', 'Fecha Ingreso']
-                         disp_df['Fecha Ingreso'] = pd.to_datetime(disp_df['Fecha Ingreso']).dt.strftime('%d/%m/%Y')
+                         disp_df['Fecha Ingreso'] = disp_df['Fecha Ingreso'].dt.strftime('%d/%m/%Y')
                          disp_df['Usuario'] = disp_df['Usuario'].apply(lambda x: f"@{x}")
                          
                          sections.append({
@@ -203,6 +203,7 @@ def render_maps():
         st.divider()
         render_project_map()
 
+@metrics.timed_view
 def render_project_map():
     df_projects = teams.get_project_locations()
     stats = teams.get_stats()
@@ -264,6 +265,7 @@ def render_project_map():
             }
         )
 
+@metrics.timed_view
 def render_team_management():
     # Select Project Card
     with st.container(border=True):
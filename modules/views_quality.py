@@ -1,6 +1,8 @@
 import streamlit as st
 import textwrap
+from modules import metrics
 
+@metrics.timed_view
 def render_quality():
     # --- Backend & Imports ---
     from modules import quality, data
@@ -94,8 +96,7 @@ def render_quality():
                if not lab_pdf.empty:
                    lab_disp = lab_pdf[['test_date', 'test_type', 'result', 'observation']].head(15).copy()
                    lab_disp.columns = ['Fecha Muestreo', 'Ensayo', 'Resultado', 'Obs.']
-                   # Ensure date format
-                   lab_disp['Fecha Muestreo'] = pd.to_datetime(lab_disp['Fecha Muestreo']).dt.strftime('%d/%m/%Y')
+                   lab_disp['Fecha Muestreo'] = lab_disp['Fecha Muestreo'].dt.strftime('%d/%m/%Y')
                    sections.append({
                        "type": "table",
                        "title": "Últimos Ensayos",
@@ -155,7 +156,7 @@ def render_quality():
                     with c_head:
                         st.markdown(f"**{row['title']}**")
                         signer_display = f"{row['signer_name']} ({row['inspector_name']})" if row.get('signer_name') else row['inspector_name']
-                        st.caption(f"{role_icon} {signer_display} • Folio #{row['id']} • {row['date']}")
+                        st.caption(f"{role_icon} {signer_display} • Folio #{row['id']} • {row['date'].strftime('%d/%m/%Y %H:%M') if pd.notna(row['date']) else ''}")
                     with c_act:
                         # Actions Popover
                         with st.popover("⚙️"):
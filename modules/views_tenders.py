@@ -1,7 +1,8 @@
 import streamlit as st
 import pandas as pd
-from modules import licitaciones, data
+from modules import licitaciones, data, metrics
 
+@metrics.timed_view
 def render_tenders():
     # --- Backend Integration ---
     tenders_df = licitaciones.get_tenders()
@@ -130,7 +131,8 @@ def render_tenders():
          if not tenders_df.empty:
              val_counts = tenders_df['status'].value_counts().reset_index()
              val_counts.columns = ['status', 'count']
-             # Order logic
+             # Order logic (on str: map() of a categorical returns a categorical, sorted by its categories)
+             val_counts['status'] = val_counts['status'].astype(str)
              order_map = {"Borrador": 1, "Activa": 2, "Evaluacion": 3, "Adjudicada": 4, "Desierta": 5}
              val_counts['order'] = val_counts['status'].map(order_map).fillna(6)
              val_counts = val_counts.sort_values('order')
@@ -176,3 +176,147 @@ CREATE TABLE IF NOT EXISTS ai_usage_logs (
   usage_date DATE DEFAULT CURRENT_DATE,
   timestamp TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now())
 );
+
+-- KPI Summary (data.get_kpis): all dashboard numbers in one RPC round trip
+CREATE OR REPLACE FUNCTION get_kpi_summary()
+RETURNS TABLE (
+    total_budget numeric,
+    total_spent numeric,
+    pending_po_amount numeric,
+    total_tasks bigint,
+    completed_tasks bigint,
+    active_subs bigint,
+    total_subs bigint,
+    open_tenders bigint
+)
+LANGUAGE sql STABLE AS $$
+    SELECT
+        (SELECT coalesce(sum(budget_total), 0) FROM projects),
+        (SELECT coalesce(sum(total_amount), 0) FROM purchase_orders WHERE status IS DISTINCT FROM 'Rechazada'),
+        (SELECT coalesce(sum(total_amount), 0) FROM purchase_orders WHERE status = 'Pendiente'),
+        (SELECT count(*) FROM tasks),
+        (SELECT count(*) FROM tasks WHERE status = 'Completado'),
+        (SELECT count(*) FROM subcontractors WHERE status = 'Activo'),
+        (SELECT count(*) FROM subcontractors),
+        (SELECT count(*) FROM tenders WHERE status = 'Publicada');
+$$;
+
+-- Cascade delete of a project (data.delete_project): one transaction, row counts per table
+CREATE OR REPLACE FUNCTION delete_project_cascade(p_project_id bigint)
+RETURNS TABLE (table_name text, deleted_count bigint)
+LANGUAGE plpgsql AS $$
+DECLARE
+    n bigint;
+BEGIN
+    DELETE FROM project_assignments WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'project_assignments'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM tasks WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'tasks'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM quality_logs WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'quality_logs'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM phases WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'phases'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM compliance_documents
+    WHERE subcontractor_id IN (SELECT id FROM subcontractors WHERE project_id = p_project_id);
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'compliance_documents'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM subcontractors WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'subcontractors'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM lab_tests WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'lab_tests'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM expenses WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'expenses'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM faenas WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'faenas'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM purchase_orders WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'purchase_orders'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM guarantees
+    WHERE contract_id IN (
+        SELECT c.id FROM contracts c JOIN tenders t ON t.id = c.tender_id WHERE t.project_id = p_project_id
+    );
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'guarantees'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM contracts
+    WHERE tender_id IN (SELECT id FROM tenders WHERE project_id = p_project_id);
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'contracts'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM tenders WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'tenders'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM budget_items WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'budget_items'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM comments WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'comments'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM projects WHERE id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'projects'; deleted_count := n; RETURN NEXT;
+END;
+$$;
+
+-- Usage counters (data.increment_counter): atomic quota increments, a whole batch per round trip
+CREATE TABLE IF NOT EXISTS usage_counters (
+  key TEXT PRIMARY KEY,
+  value BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now())
+);
+
+-- Adds p_amount (negative to release) and returns the new value and how much was granted.
+-- With p_limit, only what still fits under the limit is added (possibly 0).
+CREATE OR REPLACE FUNCTION increment_counter(p_key text, p_amount bigint DEFAULT 1, p_limit bigint DEFAULT NULL)
+RETURNS TABLE (value bigint, granted bigint)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_current bigint;
+    v_granted bigint;
+BEGIN
+    INSERT INTO usage_counters (key, value) VALUES (p_key, 0) ON CONFLICT (key) DO NOTHING;
+    -- Row lock: concurrent increments of the same key queue here instead of losing updates
+    SELECT c.value INTO v_current FROM usage_counters c WHERE c.key = p_key FOR UPDATE;
+    v_granted := CASE WHEN p_limit IS NULL THEN p_amount
+                      ELSE LEAST(p_amount, GREATEST(p_limit - v_current, 0)) END;
+    UPDATE usage_counters c SET value = c.value + v_granted, updated_at = now() WHERE c.key = p_key;
+    value := v_current + v_granted;
+    granted := v_granted;
+    RETURN NEXT;
+END;
+$$;
+
+-- Change feed (data.start_change_feed): Realtime events invalidate only the cached reads of the changed table
+ALTER PUBLICATION supabase_realtime ADD TABLE
+  projects, users, roles, project_assignments, tenders, contracts, guarantees, purchase_orders,
+  budget_items, tasks, phases, subcontractors, compliance_documents, quality_logs, lab_tests,
+  faenas, units, expenses, comments, system_config, ai_usage_logs;
+
+-- Row versions (modules/mirror.py): updated_at on the mirrored tables, so a sync pulls only changed rows
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$;
+
+DO $$
+DECLARE t text;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['projects', 'purchase_orders', 'subcontractors', 'expenses', 'budget_items', 'tasks'] LOOP
+        EXECUTE format('ALTER TABLE public.%I ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()', t);
+        EXECUTE format('CREATE INDEX IF NOT EXISTS %I ON public.%I (updated_at)', t || '_updated_at_idx', t);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON public.%I', t || '_touch_updated_at', t);
+        EXECUTE format('CREATE TRIGGER %I BEFORE UPDATE ON public.%I FOR EACH ROW EXECUTE FUNCTION set_updated_at()', t || '_touch_updated_at', t);
+    END LOOP;
+END;
+$$;
+
+-- Later schema changes (indexes, ...) are versioned migrations: python migrate.py status | up | sql
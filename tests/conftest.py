@@ -0,0 +1,33 @@
+"""
+The suite runs against a throwaway local database: the backend is chosen when modules.data is
+first imported, so the environment is set here, before any test module imports it.
+Run with: python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_tmp = tempfile.mkdtemp(prefix="novenapp_tests_")
+os.environ["NOVENAPP_BACKEND"] = "sqlite"
+os.environ["NOVENAPP_DB_PATH"] = os.path.join(_tmp, "tests.db")
+os.environ["NOVENAPP_MIRROR"] = "0"
+os.environ["NOVENAPP_MIRROR_DIR"] = os.path.join(_tmp, "mirror")
+
+
+@pytest.fixture
+def db_path():
+    return os.environ["NOVENAPP_DB_PATH"]
+
+
+@pytest.fixture
+def project_id():
+    """A fresh project to hang a test's rows from."""
+    from modules import data
+    before = data.supabase.table("projects").select("id").execute().data
+    data.bulk_insert("projects", [{"name": f"Obra Test {len(before) + 1}", "budget_total": 1e9, "status": "Activo"}])
+    return max(r["id"] for r in data.supabase.table("projects").select("id").execute().data)
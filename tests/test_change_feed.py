@@ -0,0 +1,72 @@
+import sqlite3
+import time
+
+import pytest
+
+from modules import data, metrics
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def feed(db_path):
+    feed = data.start_change_feed()
+    assert feed is not None
+    def drained():
+        """Waits until the feed has polled every change_log row written so far."""
+        conn = sqlite3.connect(db_path)
+        try:
+            last = conn.execute("SELECT coalesce(max(id), 0) FROM change_log").fetchone()[0]
+        finally:
+            conn.close()
+        wait_for(lambda: feed.watermark >= last)
+    feed.drained = drained
+    return feed
+
+
+def queries():
+    return list(metrics.events("query")["name"])
+
+
+def test_write_through_survives_its_own_change_event(feed, project_id):
+    today = time.strftime("%Y-%m-%d")
+    data.bulk_insert("tasks", [{"project_id": project_id, "name": f"Partida {i}", "status": "Por Hacer",
+                                "start_date": today, "end_date": today} for i in range(5)])
+    feed.drained()
+    task_id = int(data.get_tasks(project_id)["id"].iloc[0])
+
+    echoes = feed.stats()["echoes"]
+    data.update_task_status(task_id, "En Curso")
+    version = data.table_version("tasks")
+    feed.drained()
+    assert feed.stats()["echoes"] > echoes
+    assert data.table_version("tasks") == version # Own event ignored, the patched entry stays
+
+    metrics.reset()
+    tasks = data.get_tasks(project_id)
+    assert queries() == []
+    assert tasks.set_index("id").loc[task_id, "status"] == "En Curso"
+
+
+def test_foreign_write_refetches(feed, db_path, project_id):
+    today = time.strftime("%Y-%m-%d")
+    data.create_task(project_id, "Partida externa", today, today)
+    task_id = int(data.get_tasks(project_id)["id"].iloc[0])
+    feed.drained()
+    version = data.table_version("tasks")
+
+    conn = sqlite3.connect(db_path) # Another process, e.g. the SQL editor
+    with conn:
+        conn.execute("UPDATE tasks SET status = 'Bloqueado' WHERE id = ?", (task_id,))
+    conn.close()
+    wait_for(lambda: data.table_version("tasks") != version)
+
+    metrics.reset()
+    tasks = data.get_tasks(project_id)
+    assert queries() == ["tasks.select"]
+    assert tasks.set_index("id").loc[task_id, "status"] == "Bloqueado"
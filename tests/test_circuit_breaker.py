@@ -0,0 +1,187 @@
+import time
+
+import httpx
+import pytest
+
+from modules import data
+from modules.data import CircuitBreaker, CircuitOpenError
+
+
+def tripped(**kwargs):
+    breaker = CircuitBreaker(failure_threshold=2, **kwargs)
+    for _ in range(2):
+        assert breaker.before_call() is False
+        breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_success() # A success resets the count
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == "open" and breaker.trips == 1
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.rejected == 1
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = tripped(reset_timeout=0)
+    assert breaker.before_call() is True
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call() # Only the trial reaches the database
+    breaker.settle(True, True)
+    assert breaker.state == "closed" and breaker.failures == 0
+    assert breaker.before_call() is False
+
+
+def test_failed_trial_reopens():
+    breaker = tripped(reset_timeout=0)
+    assert breaker.before_call() is True
+    breaker.settle(True, False)
+    assert breaker.state == "open" and breaker.trips == 2
+
+
+def test_lost_trial_is_replaced_after_probe_timeout():
+    breaker = tripped(reset_timeout=0, probe_timeout=0.05)
+    assert breaker.before_call() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    time.sleep(0.06)
+    assert breaker.before_call() is True # Takes over the silent trial
+    breaker.settle(True, True)
+    assert breaker.state == "closed"
+
+
+def test_unknown_trial_outcome_reopens_without_cooldown():
+    breaker = tripped(reset_timeout=30)
+    breaker.opened_at -= 60 # Cooldown over
+    assert breaker.before_call() is True
+    breaker.settle(True, None)
+    assert breaker.state == "open" and breaker.trips == 1
+    assert breaker.before_call() is True # The next call probes again right away
+
+
+def test_unknown_outcome_of_a_normal_call_changes_nothing():
+    breaker = CircuitBreaker()
+    breaker.before_call()
+    breaker.settle(False, None)
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    """A fresh process breaker, opened with its cooldown over: the next guarded call is the trial."""
+    breaker = tripped(reset_timeout=60)
+    breaker.opened_at -= 120
+    monkeypatch.setattr(data, "_breaker", breaker)
+    return breaker
+
+
+def test_call_with_retry_trial_with_nested_calls_closes(breaker):
+    inner = lambda: data.call_with_retry(lambda: 1)
+    assert data.call_with_retry(lambda: inner() + inner()) == 2
+    assert breaker.state == "closed"
+
+
+def test_call_with_retry_interrupted_trial_reopens(breaker):
+    def interrupted():
+        raise KeyboardInterrupt
+    with pytest.raises(KeyboardInterrupt):
+        data.call_with_retry(interrupted)
+    assert breaker.state == "open"
+    assert data.call_with_retry(lambda: "ok") == "ok" # Probes again, no new cooldown
+    assert breaker.state == "closed"
+
+
+def test_call_with_retry_server_error_closes(breaker):
+    def refused():
+        raise ValueError("duplicate key")
+    with pytest.raises(ValueError):
+        data.call_with_retry(refused)
+    assert breaker.state == "closed" # The server answered
+
+
+def test_call_with_retry_network_failure_counts(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    monkeypatch.setattr(data, "_breaker", breaker)
+    def down():
+        raise httpx.ConnectError("connection refused")
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            data.call_with_retry(down, attempts=1)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        data.call_with_retry(lambda: "ok")
+
+
+@pytest.mark.parametrize("error", [
+    httpx.ConnectTimeout("connect timed out"), httpx.ReadTimeout("read timed out"),
+    httpx.PoolTimeout("no free connection"), httpx.RemoteProtocolError("server disconnected"),
+    httpx.ReadError("[Errno 11] Resource temporarily unavailable"),
+])
+def test_transport_failures_are_network_errors(error):
+    assert data.is_network_error(error)
+    assert not data.is_network_error(ValueError("ConnectError in a message"))
+
+
+def failing(error, times):
+    calls = []
+    def func():
+        calls.append(1)
+        if len(calls) <= times:
+            raise error
+        return "ok"
+    return func, calls
+
+
+def test_timeouts_are_retried_and_trip_the_breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    monkeypatch.setattr(data, "_breaker", breaker)
+    monkeypatch.setattr(data, "RETRY_BASE_DELAY", 0.0)
+    func, calls = failing(httpx.ReadTimeout("read timed out"), 1)
+    assert data.call_with_retry(func) == "ok" and len(calls) == 2
+    for _ in range(3):
+        with pytest.raises(httpx.ConnectTimeout):
+            data.call_with_retry(failing(httpx.ConnectTimeout("connect timed out"), 99)[0], attempts=1)
+    assert breaker.state == "open"
+
+
+def test_inserts_retry_only_requests_that_never_left(monkeypatch):
+    monkeypatch.setattr(data, "_breaker", CircuitBreaker())
+    monkeypatch.setattr(data, "RETRY_BASE_DELAY", 0.0)
+    func, calls = failing(httpx.ConnectTimeout("connect timed out"), 1)
+    assert data.call_with_retry(func, idempotent=False) == "ok" and len(calls) == 2
+    func, calls = failing(httpx.ReadTimeout("read timed out"), 1) # May have been written
+    with pytest.raises(httpx.ReadTimeout):
+        data.call_with_retry(func, idempotent=False)
+    assert len(calls) == 1
+
+
+def test_breaker_counts_calls_not_attempts(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    monkeypatch.setattr(data, "_breaker", breaker)
+    monkeypatch.setattr(data, "RETRY_BASE_DELAY", 0.0)
+    func, calls = failing(httpx.ConnectError("connection refused"), 99)
+    with pytest.raises(httpx.ConnectError):
+        data.call_with_retry(func, attempts=4)
+    assert len(calls) == 4
+    assert breaker.failures == 1 and breaker.state == "closed"
+    func, _ = failing(httpx.ReadTimeout("read timed out"), 2) # A blip the retries get through
+    assert data.call_with_retry(func, attempts=4) == "ok"
+    assert breaker.failures == 0
+
+
+def test_trial_call_is_not_retried(breaker, monkeypatch):
+    monkeypatch.setattr(data, "RETRY_BASE_DELAY", 0.0)
+    func, calls = failing(httpx.ConnectError("connection refused"), 99)
+    with pytest.raises(httpx.ConnectError):
+        data.call_with_retry(func, attempts=4)
+    assert len(calls) == 1 and breaker.state == "open"
@@ -0,0 +1,22 @@
+import inspect
+
+import pandas as pd
+
+from modules import data
+
+
+def test_categories_are_the_labels_present():
+    df = data.apply_dtypes(pd.DataFrame({"status": ["Activa", "Borrador", "Desierta"]}), "tenders")
+    assert isinstance(df["status"].dtype, pd.CategoricalDtype)
+    kept = data.apply_dtypes(df[df["status"] != "Desierta"].copy(), "tenders")
+    assert list(kept["status"].cat.categories) == ["Activa", "Borrador"]
+    assert set(kept["status"].value_counts().index) == {"Activa", "Borrador"}
+
+
+def test_write_through_delete_drops_the_label():
+    spec = {"table": "tasks", "signature": inspect.signature(lambda project_id=None: None),
+            "order_by": None, "desc": False, "derived": {}}
+    df = data.apply_dtypes(pd.DataFrame({"id": [1, 2], "project_id": [1, 1], "status": ["Por Hacer", "Bloqueado"]}), "tasks")
+    out = data._patch_frame(df, spec, ("get_tasks", (0,), (), ()), [{"id": 2}], delete=True)
+    assert list(out["id"]) == [1]
+    assert list(out["status"].cat.categories) == ["Por Hacer"]
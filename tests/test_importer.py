@@ -0,0 +1,71 @@
+import io
+
+from modules import data, importer, metrics
+
+
+def budget_csv(project_name, names):
+    lines = ["proyecto;partida;categoria;monto"]
+    lines += [f"{project_name};{name};General;{'abc' if name == 'Sin monto' else '1.500'}" for name in names]
+    return io.BytesIO("\n".join(lines).encode("utf-8"))
+
+
+def project_name(project_id):
+    return data.supabase.table("projects").select("name").eq("id", project_id).execute().data[0]["name"]
+
+
+def imported(project_id):
+    return data.supabase.table("budget_items").select("item_name").eq("project_id", project_id).execute().data
+
+
+def test_refused_request_does_not_stop_the_import(project_id, monkeypatch):
+    size = data.BULK_INSERT_CHUNK_SIZE
+    names = [f"Partida {i}" for i in range(2 * size + 10)]
+    names[size + 3] = "Rechazada" # Refused by the database, with the rest of its request
+    names[7] = "Sin monto" # Rejected by validation, never sent
+
+    bulk_insert = data.bulk_insert
+    def refusing(table, records, **kwargs):
+        if any(r["item_name"] == "Rechazada" for r in records):
+            raise ValueError("violates check constraint")
+        return bulk_insert(table, records, **kwargs)
+    monkeypatch.setattr(data, "bulk_insert", refusing)
+
+    stats = importer.run_import(budget_csv(project_name(project_id), names), "budget_items", filename="p.csv")
+    assert stats["error"] is None
+    assert stats["rows_read"] == len(names)
+    assert stats["rows_rejected"] == 1
+    assert stats["rows_failed"] == size
+    assert stats["rows_inserted"] == len(names) - 1 - size
+    assert len(imported(project_id)) == stats["rows_inserted"]
+
+    errors = stats["errors"]
+    failed = errors[errors["error"].str.startswith("No guardada")]
+    assert len(failed) == size
+    assert "violates check constraint" in failed["error"].iloc[0]
+    assert names.index("Rechazada") + 2 in set(failed["fila"]) # Spreadsheet rows, header is row 1
+    assert 7 + 2 in set(errors["fila"])
+
+
+def test_file_breaking_halfway_keeps_the_counts(project_id, monkeypatch):
+    read_chunks = importer.read_chunks
+    def breaking(*args, **kwargs):
+        chunks = read_chunks(*args, **kwargs)
+        yield next(chunks)
+        raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte")
+    monkeypatch.setattr(importer, "read_chunks", breaking)
+
+    names = [f"Partida {i}" for i in range(30)]
+    stats = importer.run_import(budget_csv(project_name(project_id), names), "budget_items",
+                                filename="p.csv", chunk_rows=10)
+    assert "invalid start byte" in stats["error"]
+    assert stats["rows_read"] == stats["rows_inserted"] == 10
+    assert len(imported(project_id)) == 10
+    assert stats["errors"].empty and list(stats["errors"].columns) == importer.ERROR_COLUMNS
+
+
+def test_lookups_are_served_from_the_cache(project_id):
+    importer.LookupIndex()
+    metrics.reset()
+    lookups = importer.LookupIndex()
+    assert metrics.events("query").empty
+    assert project_id in lookups.project_ids
@@ -0,0 +1,25 @@
+import sqlite3
+
+from modules import data, metrics
+
+
+def test_fallback_sums_every_page(db_path, project_id, monkeypatch):
+    data.bulk_insert("purchase_orders", [{
+        "project_id": project_id, "provider_name": "Proveedor", "date": "2024-01-01",
+        "total_amount": 100.0 + i, "status": ["Pendiente", "Aprobada", "Rechazada"][i % 3]
+    } for i in range(10)])
+    monkeypatch.setattr(data, "POSTGREST_MAX_ROWS", 3) # Pages as short as the server would cut them
+
+    conn = sqlite3.connect(db_path)
+    try:
+        spent, pending = conn.execute(
+            "SELECT sum(CASE WHEN status != 'Rechazada' THEN total_amount END), "
+            "sum(CASE WHEN status = 'Pendiente' THEN total_amount END) FROM purchase_orders"
+        ).fetchone()
+    finally:
+        conn.close()
+    metrics.reset()
+    kpis = data._get_kpi_summary_fallback()
+    assert list(metrics.events("query")["name"]).count("purchase_orders.select") > 1 # Read in pages
+    assert kpis["total_spent"] == spent
+    assert kpis["pending_po_amount"] == pending
@@ -0,0 +1,69 @@
+import pytest
+
+from modules import data, mirror
+
+
+def seed_orders(project_id, n):
+    data.bulk_insert("purchase_orders", [{
+        "project_id": project_id, "provider_name": f"Proveedor {i}", "date": "2024-01-01",
+        "total_amount": float(i), "status": "Pendiente", "order_number": f"OC-{i}"
+    } for i in range(n)])
+
+
+def network_copy():
+    return data.read_paged("purchase_orders").sort_values("id", ignore_index=True)
+
+
+@pytest.fixture
+def orders_mirror(tmp_path, project_id):
+    seed_orders(project_id, 20)
+    m = mirror.TableMirror("purchase_orders", str(tmp_path))
+    assert m.sync() == len(network_copy()) # First sync is a full one
+    return m
+
+
+def test_full_sync_matches_the_table(orders_mirror):
+    mirrored = orders_mirror.read_unlocked()
+    assert list(mirrored["id"]) == list(network_copy()["id"])
+    assert orders_mirror.meta["full_syncs"] == 1
+
+
+def test_delta_sync_applies_updates_inserts_and_deletes(orders_mirror, project_id):
+    ids = list(network_copy()["id"])
+    data.update_po_status(ids[0], "Aprobada") # Bumps the table version like any write
+    seed_orders(project_id, 3)
+    # A delete from another process: no row left to pull, only the feed's version bump
+    data.supabase.table("purchase_orders").delete().eq("id", ids[1]).execute()
+    data.invalidate_cache("purchase_orders")
+
+    assert orders_mirror.is_stale()
+    mirrored = orders_mirror.read()
+    expected = network_copy()
+    assert list(mirrored["id"]) == list(expected["id"])
+    assert ids[1] not in set(mirrored["id"])
+    assert mirrored.set_index("id").loc[ids[0], "status"] == "Aprobada"
+    assert orders_mirror.meta["full_syncs"] == 1 # Still the first full sync, the rest were deltas
+
+
+def test_deletes_are_reconciled_on_every_version_change(orders_mirror):
+    ids = list(network_copy()["id"])
+    for deleted in ids[-2:]:
+        data.supabase.table("purchase_orders").delete().eq("id", deleted).execute()
+        data.invalidate_cache("purchase_orders")
+        assert deleted not in set(orders_mirror.read()["id"])
+    assert not orders_mirror.is_stale()
+
+
+def test_table_without_rows_to_track_is_not_mirrored(tmp_path, project_id, monkeypatch):
+    data.supabase.table("subcontractors").delete().gte("id", 0).execute()
+    m = mirror.TableMirror("subcontractors", str(tmp_path))
+    assert m.sync() is None
+    assert m.unmirrorable and not m.available()
+    assert m.read() is None # The caller queries the table instead
+
+    data.bulk_insert("subcontractors", [{"project_id": project_id, "name": "Contratista", "rut": "1-9"}])
+    assert m.sync() is None # Not checked again before the recheck time
+    monkeypatch.setattr(m, "recheck_at", 0.0)
+    assert m.sync() == 1
+    assert m.unmirrorable is None
+    assert list(m.read()["name"]) == ["Contratista"]
@@ -0,0 +1,15 @@
+from modules import data
+
+
+def names(search):
+    df, total = data.get_projects_page(search=search, page_size=100)
+    return set(df["name"]) if total else set()
+
+
+def test_search_matches_wildcards_literally():
+    data.bulk_insert("projects", [{"name": n, "status": "Activo"} for n in ("Obra_Norte", "Obra 100% Sur", r"Obra C:\Este", "ObraXNorte")])
+    assert names("Obra_N") == {"Obra_Norte"}
+    assert names("100%") == {"Obra 100% Sur"}
+    assert names("\\") == {r"Obra C:\Este"}
+    assert names("_") == {"Obra_Norte"}
+    assert "ObraXNorte" in names("obraxn") # Still case insensitive
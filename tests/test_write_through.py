@@ -0,0 +1,22 @@
+from modules.data import QueryCache
+
+
+def test_patch_keeps_entries_under_the_new_version():
+    cache = QueryCache()
+    key = cache.make_key("get", ("tasks",), (), {})
+    cache.put(key, ("tasks",), "old")
+    other = cache.make_key("get_all", ("tasks",), (), {})
+    cache.put(other, ("tasks",), "other")
+    cache.patch("tasks", {key: "new"})
+    assert cache.get(cache.make_key("get", ("tasks",), (), {})) == (True, "new")
+    assert cache.get(cache.make_key("get_all", ("tasks",), (), {})) == (False, None) # Not patched, dropped
+    assert cache.patches == 1 and cache.invalidations == 1
+
+
+def test_patch_drops_an_entry_read_before_a_bump():
+    cache = QueryCache()
+    key = cache.make_key("get", ("tasks",), (), {})
+    cache.bump("tasks") # A write lands while the read is in flight
+    cache.put(key, ("tasks",), "read before the write")
+    cache.patch("tasks", {key: "patched"})
+    assert cache.get(cache.make_key("get", ("tasks",), (), {})) == (False, None)
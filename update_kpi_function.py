@@ -0,0 +1,28 @@
+print("COPIA Y EJECUTA EL SIGUIENTE SQL EN EL EDITOR SQL DE SUPABASE:")
+print("-" * 50)
+print("""
+-- KPI Summary for the Dashboard (one RPC instead of downloading POs, tasks and subcontractors)
+CREATE OR REPLACE FUNCTION get_kpi_summary()
+RETURNS TABLE (
+    total_budget numeric,
+    total_spent numeric,
+    pending_po_amount numeric,
+    total_tasks bigint,
+    completed_tasks bigint,
+    active_subs bigint,
+    total_subs bigint,
+    open_tenders bigint
+)
+LANGUAGE sql STABLE AS $$
+    SELECT
+        (SELECT coalesce(sum(budget_total), 0) FROM projects),
+        (SELECT coalesce(sum(total_amount), 0) FROM purchase_orders WHERE status IS DISTINCT FROM 'Rechazada'),
+        (SELECT coalesce(sum(total_amount), 0) FROM purchase_orders WHERE status = 'Pendiente'),
+        (SELECT count(*) FROM tasks),
+        (SELECT count(*) FROM tasks WHERE status = 'Completado'),
+        (SELECT count(*) FROM subcontractors WHERE status = 'Activo'),
+        (SELECT count(*) FROM subcontractors),
+        (SELECT count(*) FROM tenders WHERE status = 'Publicada');
+$$;
+""")
+print("-" * 50)
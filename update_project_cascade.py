@@ -0,0 +1,66 @@
+print("COPIA Y EJECUTA EL SIGUIENTE SQL EN EL EDITOR SQL DE SUPABASE:")
+print("-" * 50)
+print("""
+-- Cascade delete of a project (data.delete_project): one transaction, row counts per table
+CREATE OR REPLACE FUNCTION delete_project_cascade(p_project_id bigint)
+RETURNS TABLE (table_name text, deleted_count bigint)
+LANGUAGE plpgsql AS $$
+DECLARE
+    n bigint;
+BEGIN
+    DELETE FROM project_assignments WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'project_assignments'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM tasks WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'tasks'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM quality_logs WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'quality_logs'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM phases WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'phases'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM compliance_documents
+    WHERE subcontractor_id IN (SELECT id FROM subcontractors WHERE project_id = p_project_id);
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'compliance_documents'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM subcontractors WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'subcontractors'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM lab_tests WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'lab_tests'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM expenses WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'expenses'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM faenas WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'faenas'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM purchase_orders WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'purchase_orders'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM guarantees
+    WHERE contract_id IN (
+        SELECT c.id FROM contracts c JOIN tenders t ON t.id = c.tender_id WHERE t.project_id = p_project_id
+    );
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'guarantees'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM contracts
+    WHERE tender_id IN (SELECT id FROM tenders WHERE project_id = p_project_id);
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'contracts'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM tenders WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'tenders'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM budget_items WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'budget_items'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM comments WHERE project_id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'comments'; deleted_count := n; RETURN NEXT;
+
+    DELETE FROM projects WHERE id = p_project_id;
+    GET DIAGNOSTICS n = ROW_COUNT; table_name := 'projects'; deleted_count := n; RETURN NEXT;
+END;
+$$;
+""")
+print("-" * 50)
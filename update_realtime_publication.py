@@ -0,0 +1,19 @@
+from modules import schema
+
+# Realtime only streams tables that belong to the supabase_realtime publication.
+# Tables already in it make the ALTER fail, so each one is added separately.
+print("COPIA Y EJECUTA EL SIGUIENTE SQL EN EL EDITOR SQL DE SUPABASE:")
+print("-" * 50)
+print("-- Change feed for cache invalidation (data.start_change_feed)")
+print("DO $$")
+print("DECLARE t text;")
+print("BEGIN")
+print(f"    FOREACH t IN ARRAY ARRAY[{', '.join(repr(t) for t in schema.CHANGE_FEED_TABLES)}] LOOP")
+print("        IF NOT EXISTS (SELECT 1 FROM pg_publication_tables")
+print("                       WHERE pubname = 'supabase_realtime' AND schemaname = 'public' AND tablename = t) THEN")
+print("            EXECUTE format('ALTER PUBLICATION supabase_realtime ADD TABLE public.%I', t);")
+print("        END IF;")
+print("    END LOOP;")
+print("END;")
+print("$$;")
+print("-" * 50)
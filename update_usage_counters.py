@@ -0,0 +1,39 @@
+print("COPIA Y EJECUTA EL SIGUIENTE SQL EN EL EDITOR SQL DE SUPABASE:")
+print("-" * 50)
+print("""
+-- Usage counters (data.increment_counter): atomic quota increments, a whole batch per round trip
+CREATE TABLE IF NOT EXISTS usage_counters (
+  key TEXT PRIMARY KEY,
+  value BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now())
+);
+
+-- Adds p_amount (negative to release) and returns the new value and how much was granted.
+-- With p_limit, only what still fits under the limit is added (possibly 0).
+CREATE OR REPLACE FUNCTION increment_counter(p_key text, p_amount bigint DEFAULT 1, p_limit bigint DEFAULT NULL)
+RETURNS TABLE (value bigint, granted bigint)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_current bigint;
+    v_granted bigint;
+BEGIN
+    INSERT INTO usage_counters (key, value) VALUES (p_key, 0) ON CONFLICT (key) DO NOTHING;
+    -- Row lock: concurrent increments of the same key queue here instead of losing updates
+    SELECT c.value INTO v_current FROM usage_counters c WHERE c.key = p_key FOR UPDATE;
+    v_granted := CASE WHEN p_limit IS NULL THEN p_amount
+                      ELSE LEAST(p_amount, GREATEST(p_limit - v_current, 0)) END;
+    UPDATE usage_counters c SET value = c.value + v_granted, updated_at = now() WHERE c.key = p_key;
+    value := v_current + v_granted;
+    granted := v_granted;
+    RETURN NEXT;
+END;
+$$;
+
+-- Carry over this period's counters from system_config
+INSERT INTO usage_counters (key, value)
+SELECT key, value::bigint FROM system_config
+WHERE (key LIKE 'ai_usage_%' OR key LIKE 'notif_usage_%') AND value ~ '^[0-9]+$'
+ON CONFLICT (key) DO NOTHING;
+""")
+print("-" * 50)